@@ -0,0 +1,107 @@
+# =============================================================
+# /chat Load Test (benchmarks/bench_chat_load.py)
+# -------------------------------------------------------------
+# Measures how /chat throughput scales with concurrent requests.
+#
+# The FastAPI app runs in-process (httpx ASGI transport) and the Azure
+# OpenAI client is replaced by a fake whose chat completion waits
+# --llm-latency seconds. Because /chat awaits the async client, throughput
+# should grow almost linearly with concurrency until the connection pool
+# (OPENAI_MAX_CONNECTIONS) is full. For comparison, the same load is sent to
+# an `async def` endpoint that calls a blocking client, which is how /chat
+# used to work: it holds the event loop, so it stays at one request per
+# LLM latency whatever the concurrency.
+#
+# Usage:
+#   python backend/benchmarks/bench_chat_load.py [--concurrency 1,10,100,500] [--llm-latency 0.5]
+# =============================================================
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# The real client is swapped for a fake below; these only let the modules import
+for name, value in {
+    "AZURE_OPENAI_API_KEY": "bench",
+    "AZURE_OPENAI_API_BASE": "https://example.invalid",
+    "AZURE_OPENAI_API_VERSION": "2024-02-01",
+    "AZURE_OPENAI_DEPLOYMENT": "bench",
+}.items():
+    os.environ.setdefault(name, value)
+
+import httpx
+from fastapi import FastAPI
+
+import main as api
+import openai_client
+
+
+def fake_client(latency):
+    async def create(**kwargs):
+        await asyncio.sleep(latency)
+        message = SimpleNamespace(content="Hello!", function_call=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+
+def blocking_app(latency):
+    # The old /chat: an async endpoint making a synchronous LLM call
+    app = FastAPI()
+
+    @app.post("/chat")
+    async def chat(request: api.ChatRequest):
+        time.sleep(latency)
+        return {"response": "Hello!", "function_call": None, "error": None}
+
+    return app
+
+
+async def load(app, requests, concurrency, timeout):
+    transport = httpx.ASGITransport(app=app)
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=timeout) as client:
+        async def one(i):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post("/chat", json={"message": f"hello {i}"})
+                response.raise_for_status()
+                return time.perf_counter() - start
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(one(i) for i in range(requests)))
+        return time.perf_counter() - start, sorted(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", default="1,10,100,500", help="comma-separated concurrency levels")
+    parser.add_argument("--rounds", type=int, default=4, help="requests per level = rounds x concurrency")
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--blocking-max", type=int, default=10,
+                        help="highest concurrency sent to the blocking endpoint (it is slow)")
+    args = parser.parse_args()
+
+    openai_client.client = fake_client(args.llm_latency)
+    print(f"simulated LLM latency {args.llm_latency:.2f}s, {args.rounds} requests per concurrent slot")
+    print(f"{'path':<10} {'concurrency':>11} {'requests':>8} {'seconds':>8} {'req/s':>8} {'p50 s':>7} {'p99 s':>7}")
+    for concurrency in (int(level) for level in args.concurrency.split(",")):
+        requests = args.rounds * concurrency
+        timeout = args.llm_latency * requests + 60
+        paths = [("async", api.app)]
+        if concurrency <= args.blocking_max:
+            paths.append(("blocking", blocking_app(args.llm_latency)))
+        for name, app in paths:
+            elapsed, latencies = asyncio.run(load(app, requests, concurrency, timeout))
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            print(f"{name:<10} {concurrency:>11} {requests:>8} {elapsed:>8.2f} {requests / elapsed:>8.1f} "
+                  f"{statistics.median(latencies):>7.2f} {p99:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
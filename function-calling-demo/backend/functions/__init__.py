@@ -1,10 +1,10 @@
 # Function registry
+# Each module registers its functions with @register when imported, and the
+# registry builds their OpenAI schemas from type hints (see registry.py).
+# To add a function: decorate it with @register and import its module here.
+from .registry import ArgumentError, current_user, registry
 from .weather import get_weather
 from .calendar import get_events
 from .translation import translate
 
-FUNCTIONS = {
-    "get_weather": get_weather,
-    "get_events": get_events,
-    "translate": translate
-}
+FUNCTIONS = registry
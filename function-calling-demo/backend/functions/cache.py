@@ -0,0 +1,144 @@
+# =============================================================
+# Function Result Cache (functions/cache.py)
+# -------------------------------------------------------------
+# Registered functions can opt in to caching their results:
+#
+#     @register(cache_ttl=600)
+#     def get_weather(location: str): ...
+#
+# Calls with the same (normalized) arguments within `cache_ttl` seconds
+# return the stored result instead of hitting the slow upstream API again.
+#
+# Key Concepts for Beginners:
+# - TTL: each result expires `ttl` seconds after it was fetched
+# - LRU: when `maxsize` results are stored, the least recently used goes
+# - Single flight: if a call is already fetching a result, identical calls
+#   wait for that fetch instead of starting their own ("stampede" protection)
+# - Errors are never cached; every waiter of a failed fetch sees the error.
+#   If the fetching call is cancelled (e.g. it timed out), its waiters
+#   don't inherit the cancellation: one of them starts a new fetch
+# =============================================================
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class _FetchAbandoned(Exception):
+    """Set on the shared future when the fetching call was cancelled."""
+
+
+class ResultCache:
+    def __init__(self, ttl, maxsize=1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        # key -> (expires at, result), least recently used first
+        self._data = OrderedDict()
+        # key -> Future of the fetch in progress
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # Calls that waited on another call's fetch instead of fetching
+        self.coalesced = 0
+
+    def _lookup(self, key):
+        """(True, result) for a fresh entry, else (False, None). Call with the lock held."""
+        entry = self._data.get(key)
+        if entry is None:
+            return False, None
+        if entry[0] <= time.monotonic():
+            del self._data[key]
+            return False, None
+        self._data.move_to_end(key)
+        return True, entry[1]
+
+    def _store(self, key, result):
+        """Call with the lock held."""
+        self._data[key] = (time.monotonic() + self.ttl, result)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def _claim(self, key, new_future):
+        """
+        Under the lock: return ("hit", result), ("wait", future) or
+        ("fetch", future) where the caller must fetch and resolve the future.
+        """
+        with self._lock:
+            found, result = self._lookup(key)
+            if found:
+                self.hits += 1
+                return "hit", result
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return "wait", future
+            self.misses += 1
+            future = self._inflight[key] = new_future()
+            return "fetch", future
+
+    def _finish(self, key, result=None, failed=False):
+        with self._lock:
+            if not failed:
+                self._store(key, result)
+            return self._inflight.pop(key)
+
+    def call(self, key, fetch):
+        """Cached result of `fetch()` (a sync function) for `key`."""
+        state, value = self._claim(key, Future)
+        if state == "hit":
+            return value
+        if state == "wait":
+            return value.result()
+        try:
+            result = fetch()
+        except BaseException as e:
+            self._finish(key, failed=True).set_exception(e)
+            raise
+        self._finish(key, result).set_result(result)
+        return result
+
+    async def acall(self, key, fetch):
+        """Cached result of `await fetch()` (an async function) for `key`."""
+        while True:
+            state, value = self._claim(key, lambda: asyncio.get_running_loop().create_future())
+            if state == "hit":
+                return value
+            if state == "fetch":
+                break
+            try:
+                # shield: one waiter timing out must not cancel the fetch for the others
+                return await asyncio.shield(value)
+            except _FetchAbandoned:
+                # The fetching call was cancelled; claim again (and maybe fetch)
+                continue
+        future = value
+        try:
+            result = await fetch()
+        except BaseException as e:
+            self._finish(key, failed=True)
+            # Cancellation belongs to the fetching call only, never to its waiters
+            future.set_exception(_FetchAbandoned() if isinstance(e, asyncio.CancelledError) else e)
+            # Mark the exception as seen so asyncio doesn't warn when nobody waited
+            future.exception()
+            raise
+        self._finish(key, result).set_result(result)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+                "size": len(self._data),
+            }
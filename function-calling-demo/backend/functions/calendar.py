@@ -1,4 +1,14 @@
 # Calendar function (stub)
 # In production, replace this stub with a real calendar API integration.
-def get_events(date: str):
+from typing import Annotated
+
+from .registry import register
+
+
+# Calendars change: reuse results for 1 minute only.
+# Events belong to a user, so results are cached per user (and not at all
+# for requests without a user_id).
+@register(cache_ttl=60, cache_per_user=True)
+def get_events(date: Annotated[str, "Date in YYYY-MM-DD format"]):
+    """Get calendar events for a date."""
     return {"date": date, "events": ["Meeting at 10am", "Lunch at 12pm"]}
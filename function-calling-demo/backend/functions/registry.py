@@ -0,0 +1,287 @@
+# =============================================================
+# Function Registry (functions/registry.py)
+# -------------------------------------------------------------
+# One decorator makes a Python function callable by the LLM:
+#
+#     @register
+#     def get_weather(location: Annotated[str, "Location name"]):
+#         """Get weather forecast for a location."""
+#
+# At import time the registry reads the function's signature, type hints
+# and docstring and builds:
+# - the JSON schema OpenAI needs (name, description, parameters)
+# - a precompiled argument validator (required names, types, defaults)
+# Nothing is rebuilt per request: schema lists for the full tool set, or
+# any subset a request asks for, are cached the first time they are used.
+#
+# Key Concepts for Beginners:
+# - Type hints map to JSON schema types (str -> "string", int -> "integer", ...)
+# - Annotated[type, "text"] adds a parameter description
+# - Parameters with defaults are not required; Optional[...] also accepts null
+# - The first docstring line becomes the function description
+# - @register(cache_ttl=seconds) caches results per argument set (see cache.py);
+#   add cache_per_user=True when results depend on who is asking
+# =============================================================
+
+import inspect
+import json
+import threading
+import typing
+from contextvars import ContextVar
+from typing import Annotated, Any, Callable, Dict, Iterable, List, Literal, Optional, Tuple, Union
+
+from .cache import ResultCache
+
+
+# Distinct tool subsets whose schema lists are kept; the cache is reset beyond this
+MAX_CACHED_SUBSETS = 256
+# Results kept per cached function
+DEFAULT_CACHE_SIZE = 1024
+
+# The user tool calls are made for; /chat sets it from the request's user_id.
+# Functions registered with cache_per_user=True cache results per user.
+current_user: ContextVar[Optional[str]] = ContextVar("current_user", default=None)
+
+
+class ArgumentError(ValueError):
+    """Arguments from the LLM that don't match the function's signature."""
+
+
+# Python type -> (JSON schema type, isinstance check)
+_SIMPLE_TYPES = {
+    str: ("string", (str,)),
+    int: ("integer", (int,)),
+    float: ("number", (int, float)),
+    bool: ("boolean", (bool,)),
+    dict: ("object", (dict,)),
+    list: ("array", (list,)),
+}
+
+
+def _normalize(value):
+    """Argument value as used in cache keys: strings with whitespace collapsed."""
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in value.items()}
+    return value
+
+
+def _compile(annotation) -> Tuple[dict, Callable[[Any], bool]]:
+    """JSON schema and a value checker for one type hint."""
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+    if annotation is inspect.Parameter.empty or annotation is Any:
+        return {}, lambda value: True
+    if origin is Annotated:
+        schema, check = _compile(args[0])
+        descriptions = [meta for meta in args[1:] if isinstance(meta, str)]
+        if descriptions:
+            schema = {**schema, "description": descriptions[0]}
+        return schema, check
+    if origin is Union:
+        options = [_compile(option) for option in args if option is not type(None)]
+        if len(options) == 1:
+            schema, check = options[0]
+        else:
+            schema = {"anyOf": [option_schema for option_schema, _ in options]}
+            checks = [option_check for _, option_check in options]
+            check = lambda value: any(option_check(value) for option_check in checks)
+        return schema, (lambda value: value is None or check(value)) if type(None) in args else check
+    if origin is Literal:
+        choices = frozenset(args)
+        return {"enum": list(args)}, lambda value: value in choices
+    if origin in (list, List):
+        item_schema, item_check = _compile(args[0]) if args else ({}, lambda value: True)
+        schema = {"type": "array", "items": item_schema} if item_schema else {"type": "array"}
+        return schema, lambda value: isinstance(value, list) and all(item_check(item) for item in value)
+    if origin in (dict, Dict):
+        return {"type": "object"}, lambda value: isinstance(value, dict)
+    if annotation in _SIMPLE_TYPES:
+        json_type, python_types = _SIMPLE_TYPES[annotation]
+        if annotation in (int, float):
+            # JSON has no separate booleans-as-numbers; reject True/False for numbers
+            return {"type": json_type}, lambda value: isinstance(value, python_types) and not isinstance(value, bool)
+        return {"type": json_type}, lambda value: isinstance(value, python_types)
+    raise TypeError(f"Unsupported parameter type {annotation!r}")
+
+
+class RegisteredFunction:
+    """A registered callable with its schema and precompiled argument checks."""
+
+    def __init__(self, func: Callable, name: Optional[str] = None, description: Optional[str] = None,
+                 timeout: Optional[float] = None, cache_ttl: Optional[float] = None,
+                 cache_size: int = DEFAULT_CACHE_SIZE, cache_per_user: bool = False):
+        self.func = func
+        self.name = name or func.__name__
+        # Seconds a call may take; None uses the executor's default (see tool_calls.py)
+        self.timeout = timeout
+        # Results cached per normalized arguments, if the function opted in
+        self.cache = ResultCache(cache_ttl, cache_size) if cache_ttl else None
+        # Results depend on the user as well as the arguments
+        self.cache_per_user = cache_per_user
+        self.description = description or (inspect.getdoc(func) or "").split("\n")[0]
+        self.is_async = inspect.iscoroutinefunction(func)
+        hints = typing.get_type_hints(func, include_extras=True)
+        self._signature = inspect.signature(func)
+        properties, required, self._checks = {}, [], []
+        for parameter in self._signature.parameters.values():
+            annotation = hints.get(parameter.name, inspect.Parameter.empty)
+            schema, check = _compile(annotation)
+            properties[parameter.name] = schema
+            optional = parameter.default is not inspect.Parameter.empty
+            if not optional:
+                required.append(parameter.name)
+            self._checks.append((parameter.name, check, not optional))
+        self._names = frozenset(properties)
+        self.schema = {
+            "name": self.name,
+            "description": self.description,
+            "parameters": {"type": "object", "properties": properties, "required": required},
+        }
+        # The same schema in the tools API format
+        self.tool = {"type": "function", "function": self.schema}
+
+    def validate(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the arguments if they fit the signature, else raise ArgumentError."""
+        if not isinstance(arguments, dict):
+            raise ArgumentError(f"Arguments for '{self.name}' must be an object")
+        unknown = arguments.keys() - self._names
+        if unknown:
+            raise ArgumentError(f"Unexpected arguments for '{self.name}': {', '.join(sorted(unknown))}")
+        for name, check, required in self._checks:
+            if name not in arguments:
+                if required:
+                    raise ArgumentError(f"Missing argument '{name}' for '{self.name}'")
+            elif not check(arguments[name]):
+                raise ArgumentError(f"Invalid value for '{name}' in '{self.name}': {arguments[name]!r}")
+        return arguments
+
+    def cache_key(self, *args, **kwargs) -> str:
+        """
+        The same key for calls that bind to the same arguments (defaults filled
+        in), made for the same user if the function caches per user.
+        """
+        bound = self._signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = _normalize(bound.arguments)
+        if self.cache_per_user:
+            key = {"user": current_user.get(), "arguments": key}
+        return json.dumps(key, sort_keys=True, default=str)
+
+    def __call__(self, *args, **kwargs):
+        if self.cache is None or (self.cache_per_user and current_user.get() is None):
+            # Without a user, a per-user result could be served to someone else
+            return self.func(*args, **kwargs)
+        key = self.cache_key(*args, **kwargs)
+        if self.is_async:
+            # Returns a coroutine, like calling the async function itself
+            return self.cache.acall(key, lambda: self.func(*args, **kwargs))
+        return self.cache.call(key, lambda: self.func(*args, **kwargs))
+
+
+class FunctionRegistry:
+    """
+    Name -> RegisteredFunction. Behaves like the plain dict it replaces
+    (FUNCTIONS.get(name) returns something you can call), plus cached
+    schema lists for OpenAI.
+    """
+
+    def __init__(self):
+        self._functions: Dict[str, RegisteredFunction] = {}
+        # (format, tuple of names or None for all) -> schema list / JSON text, built on first use
+        self._definitions: Dict[Tuple[str, Optional[Tuple[str, ...]]], List[dict]] = {}
+        self._payloads: Dict[Optional[Tuple[str, ...]], str] = {}
+        self._lock = threading.Lock()
+
+    def register(self, func: Optional[Callable] = None, *, name: Optional[str] = None,
+                 description: Optional[str] = None, timeout: Optional[float] = None,
+                 cache_ttl: Optional[float] = None, cache_size: int = DEFAULT_CACHE_SIZE,
+                 cache_per_user: bool = False):
+        """Decorator: `@register` or `@register(name=..., timeout=..., cache_ttl=..., ...)`."""
+        def decorator(func):
+            registered = RegisteredFunction(func, name=name, description=description, timeout=timeout,
+                                            cache_ttl=cache_ttl, cache_size=cache_size,
+                                            cache_per_user=cache_per_user)
+            with self._lock:
+                if registered.name in self._functions:
+                    raise ValueError(f"Function '{registered.name}' is already registered")
+                self._functions[registered.name] = registered
+                self._definitions.clear()
+                self._payloads.clear()
+            return registered
+        return decorator(func) if func is not None else decorator
+
+    def _key(self, names: Optional[Iterable[str]]) -> Optional[Tuple[str, ...]]:
+        if names is None:
+            return None
+        key = tuple(dict.fromkeys(names))
+        unknown = [name for name in key if name not in self._functions]
+        if unknown:
+            raise KeyError(f"Unknown functions: {', '.join(unknown)}")
+        return key
+
+    def _cached(self, format: str, names: Optional[Iterable[str]]) -> List[dict]:
+        key = (format, self._key(names))
+        definitions = self._definitions.get(key)
+        if definitions is None:
+            if len(self._definitions) >= MAX_CACHED_SUBSETS:
+                self._definitions.clear()
+                self._payloads.clear()
+            selected = self._functions.values() if key[1] is None else (self._functions[name] for name in key[1])
+            definitions = self._definitions.setdefault(key, [getattr(function, format) for function in selected])
+        return definitions
+
+    def definitions(self, names: Optional[Iterable[str]] = None) -> List[dict]:
+        """
+        Schemas for all functions, or only `names`, in the `functions=` format.
+        The same list object is returned on every call; treat it as read-only.
+        """
+        return self._cached("schema", names)
+
+    def tools(self, names: Optional[Iterable[str]] = None) -> List[dict]:
+        """Like definitions(), in the `tools=` format ({"type": "function", "function": schema})."""
+        return self._cached("tool", names)
+
+    def payload(self, names: Optional[Iterable[str]] = None) -> str:
+        """definitions() serialized to JSON once, e.g. for GET /functions."""
+        key = self._key(names)
+        payload = self._payloads.get(key)
+        if payload is None:
+            payload = self._payloads.setdefault(key, json.dumps(self.definitions(key)))
+        return payload
+
+    def validate(self, name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        return self._functions[name].validate(arguments)
+
+    def cache_stats(self) -> Dict[str, dict]:
+        """Hit/miss counts of every function with a result cache."""
+        return {name: function.cache.stats() for name, function in self._functions.items() if function.cache}
+
+    def get(self, name: str, default=None):
+        return self._functions.get(name, default)
+
+    def __getitem__(self, name: str) -> RegisteredFunction:
+        return self._functions[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._functions
+
+    def __iter__(self):
+        return iter(self._functions)
+
+    def __len__(self) -> int:
+        return len(self._functions)
+
+    def keys(self):
+        return self._functions.keys()
+
+    def items(self):
+        return self._functions.items()
+
+
+# The registry used by the app; decorate functions with @register
+registry = FunctionRegistry()
+register = registry.register
@@ -1,4 +1,11 @@
 # Translation function (stub)
 # In production, replace this stub with a real translation API integration.
-def translate(text: str, target_lang: str):
+from typing import Annotated
+
+from .registry import register
+
+
+@register
+def translate(text: Annotated[str, "Text to translate"], target_lang: Annotated[str, "Target language code"]):
+    """Translate text to a target language."""
     return {"original": text, "translated": f"{text} (translated to {target_lang})"}
@@ -1,4 +1,12 @@
 # Weather function (stub)
 # In production, replace this stub with a real weather API integration.
-def get_weather(location: str):
+from typing import Annotated
+
+from .registry import register
+
+
+# Forecasts change slowly: reuse results for 10 minutes
+@register(cache_ttl=600)
+def get_weather(location: Annotated[str, "Location name"]):
+    """Get weather forecast for a location."""
     return {"location": location, "forecast": "Sunny", "temperature": "25°C"}
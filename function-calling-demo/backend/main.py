@@ -17,17 +17,26 @@
 # and see how the backend responds!
 # =============================================================
 
-from fastapi import FastAPI, Request
+from fastapi import Body, FastAPI, Response
 from pydantic import BaseModel
-from typing import Optional
-from functions import FUNCTIONS
+from typing import List, Optional
+from functions import FUNCTIONS, current_user
 from openai_client import call_openai_api
+from sessions import SessionStore, load_encoding_in_background
+from tool_calls import execute_tool_calls, tool_result_message
 from utils import log_request, log_response, log_error
 from fastapi.middleware.cors import CORSMiddleware
-import json
+from contextlib import asynccontextmanager
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    # Load the tokenizer off the event loop; sessions estimate tokens until it is ready
+    load_encoding_in_background()
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Enable CORS for frontend integration
 # This allows the React frontend to communicate with the backend during development.
@@ -40,65 +49,53 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Conversations of users who send a user_id, kept in memory (see sessions.py)
+SESSIONS = SessionStore()
+
 # This model defines what a chat request looks like
 class ChatRequest(BaseModel):
     message: str
+    # Continues this user's conversation; without it every message stands alone
     user_id: Optional[str] = None
+    # Names of the functions the LLM may call for this message; None offers all of them
+    tools: Optional[List[str]] = None
 
 # This model defines what a chat response looks like
 class ChatResponse(BaseModel):
     response: str
+    # The first function called, kept for clients that show a single call
     function_call: Optional[dict] = None
+    # Every call made for this message: {"id", "name", "arguments", "result" or "error"}
+    tool_calls: Optional[List[dict]] = None
     error: Optional[str] = None
 
-# This function tells OpenAI what backend functions are available to call
-def get_function_definitions():
-    # Each function has a name, description, and parameters
-    return [
-        {
-            "name": "get_weather",
-            "description": "Get weather forecast for a location.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "location": {"type": "string", "description": "Location name"}
-                },
-                "required": ["location"]
-            }
-        },
-        {
-            "name": "get_events",
-            "description": "Get calendar events for a date.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "date": {"type": "string", "description": "Date in YYYY-MM-DD format"}
-                },
-                "required": ["date"]
-            }
-        },
-        {
-            "name": "translate",
-            "description": "Translate text to a target language.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "text": {"type": "string", "description": "Text to translate"},
-                    "target_lang": {"type": "string", "description": "Target language code"}
-                },
-                "required": ["text", "target_lang"]
-            }
-        }
-    ]
-
 # Simple health check endpoint
 @app.get("/")
 def read_root():
     return {"message": "Function Calling Demo Backend"}
 
+# The schemas of every registered function, as sent to OpenAI
+# (serialized once and reused for every request)
+@app.get("/functions")
+def list_functions():
+    return Response(content=FUNCTIONS.payload(), media_type="application/json")
+
+# Hit/miss counts of the functions that cache their results
+@app.get("/functions/cache")
+def function_cache_stats():
+    return FUNCTIONS.cache_stats()
+
+# Number of sessions, their token totals, and how many were dropped or compacted
+@app.get("/sessions/stats")
+def session_stats():
+    return SESSIONS.stats()
+
+# Start the user's next message with a fresh conversation
+@app.delete("/sessions/{user_id}")
+def reset_session(user_id: str):
+    return {"user_id": user_id, "reset": SESSIONS.reset(user_id)}
+
 # This is the main endpoint for chat and function calling
-from fastapi import Body
-from fastapi import APIRouter
 
 # Add an OpenAPI example for the /chat endpoint to help developers in Swagger UI
 @app.post(
@@ -124,11 +121,17 @@ from fastapi import APIRouter
                 "content": {
                     "application/json": {
                         "example": {
-                            "response": "Function 'get_weather' called. Result: Sunny in Paris.",
+                            "response": "It's sunny and 25°C in Paris.",
                             "function_call": {
                                 "name": "get_weather",
                                 "arguments": {"location": "Paris"}
                             },
+                            "tool_calls": [{
+                                "id": "call_1",
+                                "name": "get_weather",
+                                "arguments": {"location": "Paris"},
+                                "result": {"location": "Paris", "forecast": "Sunny", "temperature": "25°C"}
+                            }],
                             "error": None
                         }
                     }
@@ -141,37 +144,59 @@ async def chat_endpoint(request: ChatRequest = Body(..., example={"message": "Wh
     # Log the incoming request for debugging and monitoring
     log_request(request)
     try:
-        # 1. Send the user's message and available functions to OpenAI
-        openai_result = call_openai_api({
-            "message": request.message,
-            "functions": get_function_definitions()
-        })
-        # 2. See if OpenAI wants to call a function
-        function_call = openai_result.get("function_call") if openai_result else None
+        # 1. Send the user's message and available tools to OpenAI.
+        # The registry built each function's schema from its type hints at import
+        # time, so this is a cached lookup (a subset if the request names tools).
+        try:
+            tools = FUNCTIONS.tools(request.tools)
+        except KeyError as e:
+            return ChatResponse(response="", function_call=None, error=str(e.args[0]))
+        # Earlier turns (trimmed to a token budget) come before the new message
+        history = SESSIONS.history(request.user_id) if request.user_id else []
+        messages = history + [{"role": "user", "content": request.message}]
+        # The call is awaited, so other chats keep running while this one waits on the LLM
+        openai_result = await call_openai_api({"messages": messages, "tools": tools})
+        # 2. See if OpenAI wants to call tools (possibly several at once)
+        tool_calls = openai_result.get("tool_calls") if openai_result else None
         response_text = openai_result.get("response") if openai_result else ""
-        result = None
-        if function_call:
-            # 3. If a function call is requested, get the function name and arguments
-            func_name = function_call.get("name")
-            args = function_call.get("arguments", {})
-            # Arguments may be a JSON string, so parse if needed
-            if isinstance(args, str):
-                try:
-                    args = json.loads(args)
-                except Exception:
-                    args = {}
-            # 4. Look up the Python function in our registry
-            # To add new functions, simply define them in the functions/ directory
-            # and register them in FUNCTIONS (see functions/__init__.py)
-            func = FUNCTIONS.get(func_name)
-            if func:
-                # 5. Call the function with the provided arguments
-                result = func(**args)
-                response_text = f"Function '{func_name}' called. Result: {result}"
-            else:
-                response_text = f"Function '{func_name}' not found."
+        # A failed LLM call returns its error message as the response
+        llm_error = openai_result.get("error") if openai_result else None
+        function_call = None
+        outcomes = None
+        if tool_calls:
+            # 3. Run every requested call at the same time: async functions on the
+            # event loop, sync ones on a thread pool, each with a timeout.
+            # To add new functions, define them in the functions/ directory with
+            # the @register decorator (see functions/registry.py)
+            # Functions that cache per user (e.g. get_events) key results by it
+            current_user.set(request.user_id)
+            outcomes = await execute_tool_calls(tool_calls, FUNCTIONS)
+            # 4. Send all results back in one follow-up request so the LLM can
+            # write the final answer
+            messages.append({
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [
+                    {"id": call["id"], "type": "function",
+                     "function": {"name": call["name"], "arguments": call["arguments"]}}
+                    for call in tool_calls
+                ],
+            })
+            messages.extend(tool_result_message(outcome) for outcome in outcomes)
+            final = await call_openai_api({"messages": messages, "tools": tools, "tool_choice": "none"})
+            response_text = final.get("response") or ""
+            llm_error = final.get("error")
+            first = outcomes[0]
+            function_call = {"name": first["name"], "arguments": first["arguments"]}
+        # 5. Remember the turn for the user's next message (never an error message)
+        if request.user_id and response_text and not llm_error:
+            # Retries a failed tokenizer load in the background (at most every few minutes)
+            load_encoding_in_background()
+            SESSIONS.append(request.user_id, request.message, response_text)
         # 6. Build the response object
-        chat_response = ChatResponse(response=response_text, function_call=function_call, error=None)
+        chat_response = ChatResponse(
+            response=response_text, function_call=function_call, tool_calls=outcomes, error=llm_error
+        )
         # Log the response for debugging
         log_response(chat_response)
         return chat_response
@@ -1,11 +1,12 @@
 # Pydantic models for requests/responses
 # Pydantic models provide validation, serialization, and automatic API documentation.
 from pydantic import BaseModel
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 
 class ChatRequest(BaseModel):
     message: str
     user_id: Optional[str] = None
+    tools: Optional[List[str]] = None
 
 class FunctionCall(BaseModel):
     name: str
@@ -14,4 +15,5 @@ class FunctionCall(BaseModel):
 class ChatResponse(BaseModel):
     response: str
     function_call: Optional[FunctionCall] = None
+    tool_calls: Optional[List[Dict]] = None
     error: Optional[str] = None
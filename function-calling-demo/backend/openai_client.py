@@ -7,14 +7,16 @@
 #
 # Key Concepts for Beginners:
 # - How to securely load API keys and endpoints
-# - How to use the AzureOpenAI client (SDK >=1.0.0)
+# - How to use the AsyncAzureOpenAI client (SDK >=1.0.0)
+# - How to share one tuned connection pool across concurrent requests
 # - How to send chat requests with function definitions
 # - How to parse and return function call results
 # =============================================================
 
 import os
+import httpx
 from dotenv import load_dotenv
-from openai import AzureOpenAI
+from openai import AsyncAzureOpenAI, DefaultAsyncHttpxClient
 
 load_dotenv()
 
@@ -24,62 +26,89 @@ AZURE_OPENAI_API_BASE = os.getenv("AZURE_OPENAI_API_BASE")
 AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION")
 AZURE_OPENAI_DEPLOYMENT = os.getenv("AZURE_OPENAI_DEPLOYMENT")
 
+# Connection pool shared by all in-flight chats. Requests beyond this many
+# wait for a free connection instead of opening new ones.
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "500"))
+# Seconds idle connections are kept open for reuse
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "60"))
+# Seconds a whole LLM call may take, and seconds to establish a connection
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+# Retries on connection errors, 429s and 5xx (the SDK backs off between attempts)
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
 
-# Create AzureOpenAI client (SDK >=1.0.0)
+
+# Create the AsyncAzureOpenAI client (SDK >=1.0.0) once, at import.
+# Awaiting the LLM releases the event loop, so one worker can serve hundreds
+# of chats at once; each holds only a pooled connection while it waits.
 # For robust developer experience, handle API errors and rate limits gracefully.
-client = AzureOpenAI(
+client = AsyncAzureOpenAI(
     api_key=AZURE_OPENAI_API_KEY,
     api_version=AZURE_OPENAI_API_VERSION,
-    azure_endpoint=AZURE_OPENAI_API_BASE
+    azure_endpoint=AZURE_OPENAI_API_BASE,
+    max_retries=OPENAI_MAX_RETRIES,
+    http_client=DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_CONNECTIONS,
+            keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+    ),
 )
 
-def call_openai_api(payload):
+async def call_openai_api(payload):
     """
-    Send a chat request to Azure OpenAI with optional function definitions.
+    Send a chat request to Azure OpenAI with optional tool (function) definitions.
+    This is a coroutine: await it from async code such as a FastAPI endpoint.
     This function demonstrates how to:
-    - Accept a payload containing a user message and a list of function schemas
-    - Call the Azure OpenAI ChatCompletion API (SDK >=1.0.0)
-    - Automatically trigger function calls if the LLM decides one is needed
-    - Parse and return the function call details or the model's response
+    - Accept a payload containing a user message (or a whole conversation)
+      and a list of tool schemas
+    - Call the Azure OpenAI ChatCompletion API (SDK >=1.0.0) with tools
+    - Let the LLM request several tool calls in one response
+    - Parse and return the tool call details or the model's response
     - Handle errors gracefully for robust developer experience
 
     Args:
         payload (dict): {
-            "message": str,  # The user's message to the LLM
-            "functions": list # List of function definitions (OpenAI schema)
+            "message": str,        # The user's message to the LLM, or
+            "messages": list,      # the full conversation (e.g. with tool results)
+            "tools": list,         # Tool definitions (see FUNCTIONS.tools())
+            "tool_choice": str     # Optional: "auto" (default) or "none"
         }
 
     Returns:
         dict: {
-            "function_call": dict or None, # Details if a function call is triggered
-            "response": str or None        # LLM response if no function call
+            "tool_calls": list or None,    # [{"id", "name", "arguments"}] if tools were called
+            "function_call": dict or None, # The first tool call, for older clients
+            "response": str or None,       # LLM response if no tool call
+            "error": str or None           # Set if the call failed (then "response" repeats it)
         }
     """
-    message = payload.get("message", "")
-    functions = payload.get("functions", [])
+    messages = payload.get("messages") or [{"role": "user", "content": payload.get("message", "")}]
+    tools = payload.get("tools") or []
+    options = {}
+    if tools:
+        # Pass tool definitions for the LLM to choose from; it may pick several at once
+        options = {"tools": tools, "tool_choice": payload.get("tool_choice", "auto")}
     try:
         # Send the chat request to Azure OpenAI
-        response = client.chat.completions.create(
+        response = await client.chat.completions.create(
             model=AZURE_OPENAI_DEPLOYMENT,
-            messages=[{"role": "user", "content": message}],
-            functions=functions,           # Pass function definitions for LLM to choose from
-            function_call="auto"          # Let LLM decide if/which function to call
+            messages=messages,
+            **options
         )
         choice = response.choices[0]
-        # If the LLM triggers a function call, extract its name and arguments
-        if hasattr(choice.message, "function_call") and choice.message.function_call:
-            return {
-                "function_call": {
-                    "name": choice.message.function_call.name,
-                    "arguments": choice.message.function_call.arguments
-                },
-                "response": None
-            }
+        # If the LLM calls tools, extract each call's id, name and arguments (a JSON string)
+        if getattr(choice.message, "tool_calls", None):
+            tool_calls = [
+                {"id": call.id, "name": call.function.name, "arguments": call.function.arguments}
+                for call in choice.message.tool_calls
+            ]
+            first = {"name": tool_calls[0]["name"], "arguments": tool_calls[0]["arguments"]}
+            return {"tool_calls": tool_calls, "function_call": first, "response": None, "error": None}
         # Otherwise, return the LLM's direct response
-        return {"function_call": None, "response": choice.message.content}
+        return {"tool_calls": None, "function_call": None, "response": choice.message.content, "error": None}
     except Exception as e:
         # On error, return the error message for debugging or user feedback
-        return {"function_call": None, "response": str(e)}
-        return {"function_call": None, "response": choice.message.content}
-    except Exception as e:
-        return {"function_call": None, "response": str(e)}
+        return {"tool_calls": None, "function_call": None, "response": str(e), "error": str(e)}
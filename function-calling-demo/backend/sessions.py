@@ -0,0 +1,221 @@
+# =============================================================
+# Chat Sessions (sessions.py)
+# -------------------------------------------------------------
+# Requests that carry a `user_id` continue that user's conversation:
+# the earlier turns are sent to the LLM before the new message, so a
+# follow-up like "and tomorrow?" needs no restated context.
+#
+# Sessions live in server memory and are kept small:
+# - Each session's history is trimmed to SESSION_HISTORY_TOKENS tokens
+#   (counted with tiktoken). The oldest turns that no longer fit are
+#   compacted into a short summary line sent as a system message.
+# - The summary itself is capped at SESSION_SUMMARY_TOKENS tokens.
+# - At most SESSION_MAX_SESSIONS sessions are kept; the least recently
+#   used one is dropped to make room (LRU).
+# - A session unused for SESSION_IDLE_SECONDS is dropped.
+# So the prompt size (and latency and cost) stays bounded however long
+# a conversation runs.
+#
+# Key Concepts for Beginners:
+# - A "turn" is one user message plus the assistant's final answer
+# - Tool calls and their results are not stored; the answer already uses them
+# - Compaction needs no extra LLM call: each old message is shortened
+#   to its first SUMMARY_LINE_CHARS characters
+# - The tiktoken encoding may need a download, so it is loaded on a worker
+#   thread at startup (load_encoding_in_background), never inside a request.
+#   Until it is loaded, tokens are estimated from the text length, and a
+#   failed load is retried after ENCODING_RETRY_SECONDS
+# =============================================================
+
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from utils import logger
+
+try:
+    import tiktoken
+except ImportError:  # tokens are estimated from the text length instead
+    tiktoken = None
+
+# Most sessions kept in memory
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+# Seconds of inactivity after which a session is dropped
+SESSION_IDLE_SECONDS = float(os.getenv("SESSION_IDLE_SECONDS", "1800"))
+# Most tokens of earlier turns sent with each message
+SESSION_HISTORY_TOKENS = int(os.getenv("SESSION_HISTORY_TOKENS", "2000"))
+# Most tokens of the summary of compacted turns
+SESSION_SUMMARY_TOKENS = int(os.getenv("SESSION_SUMMARY_TOKENS", "300"))
+# Tokenizer of gpt-4 and gpt-3.5 deployments
+SESSION_ENCODING = os.getenv("SESSION_ENCODING", "cl100k_base")
+# Characters of each compacted message kept in the summary
+SUMMARY_LINE_CHARS = 200
+# Tokens OpenAI adds around every message (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+# Seconds to wait before trying again to load an encoding that failed to load
+ENCODING_RETRY_SECONDS = 300
+
+# The tiktoken encoding once loaded
+_encoding = None
+# time.monotonic() before which no new load is started (one in flight, or a recent failure)
+_next_load = 0.0
+_load_lock = threading.Lock()
+
+
+def load_encoding():
+    """
+    Load the tiktoken encoding. Blocking: it downloads the encoding file the
+    first time unless it is cached, so run it on a worker thread.
+    Returns whether the encoding is available.
+    """
+    global _encoding, _next_load
+    if _encoding is not None:
+        return True
+    if tiktoken is None:
+        return False
+    try:
+        _encoding = tiktoken.get_encoding(SESSION_ENCODING)
+        return True
+    except Exception as e:
+        logger.warning(f"tiktoken encoding unavailable, estimating tokens for now: {e}")
+        with _load_lock:
+            _next_load = time.monotonic() + ENCODING_RETRY_SECONDS
+        return False
+
+
+def load_encoding_in_background():
+    """Start load_encoding() on a worker thread unless it is loaded, loading, or failed recently."""
+    global _next_load
+    if _encoding is not None or tiktoken is None:
+        return None
+    with _load_lock:
+        now = time.monotonic()
+        if now < _next_load:
+            return None
+        # Blocks other attempts until this one finishes (a failure sets the retry time)
+        _next_load = float("inf")
+    return asyncio.get_running_loop().run_in_executor(None, load_encoding)
+
+
+def count_tokens(text):
+    """Tokens in text, or an estimate (4 characters per token) until the encoding is loaded."""
+    if _encoding is not None:
+        return len(_encoding.encode_ordinary(text))
+    return len(text) // 4 + 1
+
+
+class Session:
+    def __init__(self, user_id):
+        self.user_id = user_id
+        # [(message, tokens)], oldest first
+        self.turns = []
+        self.tokens = 0
+        # [("User: ...", tokens)] lines of compacted turns, oldest first
+        self.summary = []
+        self.summary_tokens = 0
+        self.last_used = time.monotonic()
+
+    def messages(self):
+        """History to send before the new user message."""
+        messages = []
+        if self.summary:
+            messages.append({
+                "role": "system",
+                "content": "Summary of the earlier conversation:\n" + "\n".join(line for line, _ in self.summary),
+            })
+        messages.extend(message for message, _ in self.turns)
+        return messages
+
+
+class SessionStore:
+    def __init__(self, max_sessions=SESSION_MAX_SESSIONS, idle_seconds=SESSION_IDLE_SECONDS,
+                 history_tokens=SESSION_HISTORY_TOKENS, summary_tokens=SESSION_SUMMARY_TOKENS,
+                 count_tokens=count_tokens):
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self.history_tokens = history_tokens
+        self.summary_tokens = summary_tokens
+        self.count_tokens = count_tokens
+        # user_id -> Session, least recently used first
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted = 0
+        self.expired = 0
+        self.compacted = 0
+
+    def _expire(self, now):
+        """Drop idle sessions. Call with the lock held."""
+        # Sessions are in last-used order, so the idle ones are at the front
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_used < self.idle_seconds:
+                break
+            self._sessions.popitem(last=False)
+            self.expired += 1
+
+    def history(self, user_id):
+        """Messages of the user's conversation so far (empty for a new or expired session)."""
+        with self._lock:
+            self._expire(time.monotonic())
+            session = self._sessions.get(user_id)
+            return session.messages() if session else []
+
+    def append(self, user_id, user_message, assistant_message):
+        """Add a finished turn and trim the session to its token budget."""
+        turn = [{"role": "user", "content": user_message}, {"role": "assistant", "content": assistant_message}]
+        # Count outside the lock; tokenizing is the slow part
+        counted = [(message, self.count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS) for message in turn]
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.get(user_id)
+            if session is None:
+                session = self._sessions[user_id] = Session(user_id)
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.evicted += 1
+            self._sessions.move_to_end(user_id)
+            session.last_used = now
+            session.turns.extend(counted)
+            session.tokens += sum(tokens for _, tokens in counted)
+            # Always keep the latest turn, even if it alone is over budget
+            while session.tokens > self.history_tokens and len(session.turns) > 2:
+                for _ in range(2):
+                    message, tokens = session.turns.pop(0)
+                    session.tokens -= tokens
+                    self._compact(session, message)
+                self.compacted += 1
+
+    def _compact(self, session, message):
+        """Add a shortened message to the summary, dropping its oldest lines beyond the budget. Lock held."""
+        text = " ".join(message["content"].split())
+        if len(text) > SUMMARY_LINE_CHARS:
+            text = text[:SUMMARY_LINE_CHARS].rstrip() + "..."
+        line = f"{message['role'].capitalize()}: {text}"
+        tokens = self.count_tokens(line)
+        session.summary.append((line, tokens))
+        session.summary_tokens += tokens
+        while session.summary_tokens > self.summary_tokens and len(session.summary) > 1:
+            session.summary_tokens -= session.summary.pop(0)[1]
+
+    def reset(self, user_id):
+        """Forget the user's conversation. Returns whether there was one."""
+        with self._lock:
+            return self._sessions.pop(user_id, None) is not None
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def stats(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            return {
+                "sessions": len(sessions),
+                "history_tokens": sum(session.tokens for session in sessions),
+                "summary_tokens": sum(session.summary_tokens for session in sessions),
+                "evicted": self.evicted,
+                "expired": self.expired,
+                "compacted_turns": self.compacted,
+            }
@@ -0,0 +1,173 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from functions.cache import ResultCache
+from functions.registry import FunctionRegistry
+
+
+def test_sync_calls_share_one_fetch():
+    registry = FunctionRegistry()
+    calls = []
+    started = threading.Event()
+    release = threading.Event()
+
+    @registry.register(cache_ttl=60)
+    def get_weather(location: str):
+        calls.append(location)
+        started.set()
+        release.wait(5)
+        return {"location": location}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(get_weather("Paris"))) for _ in range(5)]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert calls == ["Paris"]
+    assert results == [{"location": "Paris"}] * 5
+    assert get_weather("Paris") == {"location": "Paris"}
+    stats = registry.cache_stats()["get_weather"]
+    assert (stats["misses"], stats["coalesced"], stats["hits"], stats["size"]) == (1, 4, 1, 1)
+
+
+def test_async_calls_share_one_fetch():
+    registry = FunctionRegistry()
+    calls = []
+
+    @registry.register(cache_ttl=60)
+    async def get_events(date: str):
+        calls.append(date)
+        await asyncio.sleep(0.01)
+        return [date]
+
+    async def run():
+        return await asyncio.gather(*(get_events("2024-01-01") for _ in range(10)), get_events("2024-01-02"))
+
+    results = asyncio.run(run())
+    assert calls == ["2024-01-01", "2024-01-02"]
+    assert results == [["2024-01-01"]] * 10 + [["2024-01-02"]]
+
+
+def test_arguments_are_normalized_into_one_key():
+    registry = FunctionRegistry()
+    calls = []
+
+    @registry.register(cache_ttl=60)
+    def translate(text: str, target_language: str = "fr"):
+        calls.append(text)
+        return text
+
+    translate("hello  world")
+    translate(text=" hello world ")
+    translate("hello world", target_language="fr")
+    translate("hello world", "de")
+    assert calls == ["hello  world", "hello world"]
+
+
+def test_entries_expire_and_least_recently_used_is_evicted(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = ResultCache(ttl=10, maxsize=2)
+    fetches = []
+    fetch = lambda key: cache.call(key, lambda: fetches.append(key) or key)
+
+    fetch("a"), fetch("b"), fetch("a"), fetch("c")
+    assert fetches == ["a", "b", "c"]
+    fetch("b")
+    assert fetches == ["a", "b", "c", "b"]
+    now[0] = 11
+    fetch("b")
+    assert fetches == ["a", "b", "c", "b", "b"]
+
+
+def test_errors_are_not_cached():
+    cache = ResultCache(ttl=60)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("upstream down")
+        return "ok"
+
+    with pytest.raises(RuntimeError):
+        cache.call("key", flaky)
+    assert cache.call("key", flaky) == "ok"
+    assert cache.call("key", flaky) == "ok"
+    assert len(attempts) == 2
+
+    async def failing():
+        raise RuntimeError("upstream down")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(cache.acall("other", failing))
+    assert cache.stats()["size"] == 1
+
+
+def test_uncached_functions_are_called_directly():
+    registry = FunctionRegistry()
+
+    @registry.register
+    def ping():
+        return "pong"
+
+    assert ping.cache is None
+    assert ping() == "pong"
+    assert registry.cache_stats() == {}
+
+
+def test_waiters_fetch_again_when_the_fetching_call_times_out():
+    registry = FunctionRegistry()
+    calls = []
+
+    @registry.register(cache_ttl=60)
+    async def get_weather(location: str):
+        calls.append(location)
+        await asyncio.sleep(0.1)
+        return {"location": location}
+
+    async def run():
+        first = asyncio.ensure_future(asyncio.wait_for(get_weather("Paris"), 0.03))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(asyncio.wait_for(get_weather("Paris"), 1))
+        return await asyncio.gather(first, second, return_exceptions=True)
+
+    first, second = asyncio.run(run())
+    assert isinstance(first, asyncio.TimeoutError)
+    assert second == {"location": "Paris"}
+    assert calls == ["Paris", "Paris"]
+    assert get_weather.cache.stats()["size"] == 1
+
+
+def test_per_user_results_are_not_shared_between_users():
+    from functions.registry import current_user
+    from tool_calls import execute_tool_call
+    registry = FunctionRegistry()
+    calls = []
+
+    @registry.register(cache_ttl=60, cache_per_user=True)
+    def get_events(date: str):
+        calls.append((current_user.get(), date))
+        return {"owner": current_user.get()}
+
+    async def events_for(user):
+        current_user.set(user)
+        outcome = await execute_tool_call({"id": "1", "name": "get_events", "arguments": '{"date": "2024-05-01"}'},
+                                          registry)
+        return outcome["result"]
+
+    assert asyncio.run(events_for("ana")) == {"owner": "ana"}
+    assert asyncio.run(events_for("bob")) == {"owner": "bob"}
+    assert asyncio.run(events_for("ana")) == {"owner": "ana"}
+    assert asyncio.run(events_for(None)) == {"owner": None}
+    assert asyncio.run(events_for(None)) == {"owner": None}
+    assert calls == [("ana", "2024-05-01"), ("bob", "2024-05-01"), (None, "2024-05-01"), (None, "2024-05-01")]
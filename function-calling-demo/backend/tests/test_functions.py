@@ -0,0 +1,53 @@
+from typing import Annotated, List, Literal, Optional
+
+import pytest
+
+from functions import FUNCTIONS
+from functions.registry import ArgumentError, FunctionRegistry
+
+
+def test_registry_builds_schemas_from_type_hints():
+    registry = FunctionRegistry()
+
+    @registry.register
+    def book(room: Annotated[str, "Room name"], people: int, tags: List[str],
+             size: Literal["small", "large"] = "small", note: Optional[str] = None):
+        """Book a meeting room.
+
+        Longer explanation that stays out of the schema.
+        """
+        return room
+
+    assert registry.definitions() == [{
+        "name": "book",
+        "description": "Book a meeting room.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "room": {"type": "string", "description": "Room name"},
+                "people": {"type": "integer"},
+                "tags": {"type": "array", "items": {"type": "string"}},
+                "size": {"enum": ["small", "large"]},
+                "note": {"type": "string"},
+            },
+            "required": ["room", "people", "tags"],
+        },
+    }]
+    assert book("A", 3, []) == "A"
+    assert book.validate({"room": "A", "people": 3, "tags": [], "note": None})
+    for bad in ({"room": "A", "tags": []}, {"room": "A", "people": "3", "tags": []},
+                {"room": "A", "people": True, "tags": []}, {"room": "A", "people": 3, "tags": [], "size": "huge"},
+                {"room": "A", "people": 3, "tags": [], "floor": 2}):
+        with pytest.raises(ArgumentError):
+            book.validate(bad)
+
+
+def test_app_registry_caches_definitions_and_subsets():
+    assert set(FUNCTIONS) == {"get_weather", "get_events", "translate"}
+    assert FUNCTIONS.definitions() is FUNCTIONS.definitions()
+    subset = FUNCTIONS.definitions(["translate", "get_weather"])
+    assert [schema["name"] for schema in subset] == ["translate", "get_weather"]
+    assert FUNCTIONS.definitions(["translate", "get_weather"]) is subset
+    assert FUNCTIONS.payload() is FUNCTIONS.payload()
+    with pytest.raises(KeyError):
+        FUNCTIONS.definitions(["launch_rocket"])
@@ -8,3 +8,30 @@ def test_health_check():
     response = client.get("/health")
     assert response.status_code == 200
     assert response.json() == {"status": "ok"}
+
+def test_chat_requests_wait_on_the_llm_concurrently(monkeypatch):
+    import asyncio
+    import time
+    from types import SimpleNamespace
+    import httpx
+    # main.py imports the module as `openai_client` (backend/ is on the path)
+    import openai_client
+
+    async def create(**kwargs):
+        await asyncio.sleep(0.2)
+        message = SimpleNamespace(content="Hi!", function_call=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    fake = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(openai_client, "client", fake)
+
+    async def chat_many(count):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            return await asyncio.gather(*(http.post("/chat", json={"message": f"hello {i}"}) for i in range(count)))
+
+    start = time.perf_counter()
+    responses = asyncio.run(chat_many(20))
+    assert all(response.json()["response"] == "Hi!" for response in responses)
+    # 20 sequential calls would take 4 seconds
+    assert time.perf_counter() - start < 2
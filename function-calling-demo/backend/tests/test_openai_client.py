@@ -1,8 +1,9 @@
+import asyncio
 import pytest
 from backend import openai_client
 
 def test_call_openai_api_no_functions():
-    payload = {"message": "Hello", "functions": []}
-    result = openai_client.call_openai_api(payload)
+    payload = {"message": "Hello", "tools": []}
+    result = asyncio.run(openai_client.call_openai_api(payload))
     assert "function_call" in result
     assert "response" in result
@@ -0,0 +1,146 @@
+import time
+from types import SimpleNamespace
+
+from sessions import MESSAGE_OVERHEAD_TOKENS, SessionStore
+
+
+def count_words(text):
+    return len(text.split())
+
+
+def test_history_is_kept_per_user():
+    store = SessionStore(count_tokens=count_words)
+    store.append("ana", "Weather in Paris?", "Sunny, 25°C.")
+    assert store.history("ana") == [
+        {"role": "user", "content": "Weather in Paris?"},
+        {"role": "assistant", "content": "Sunny, 25°C."},
+    ]
+    assert store.history("bob") == []
+    assert store.reset("ana") and store.history("ana") == []
+
+
+def test_old_turns_are_compacted_into_a_bounded_summary():
+    # Each turn is 2 words + 2 words plus overhead: three turns fit the history budget
+    turn_tokens = 4 + 2 * MESSAGE_OVERHEAD_TOKENS
+    store = SessionStore(history_tokens=3 * turn_tokens, summary_tokens=12, count_tokens=count_words)
+    for i in range(10):
+        store.append("ana", f"question {i}", f"answer {i}")
+
+    history = store.history("ana")
+    summary, turns = history[0], history[1:]
+    assert summary["role"] == "system"
+    assert [message["content"] for message in turns] == [
+        "question 7", "answer 7", "question 8", "answer 8", "question 9", "answer 9",
+    ]
+    # Only the newest compacted lines fit the summary budget
+    assert summary["content"].splitlines()[1:] == [
+        "User: question 5", "Assistant: answer 5", "User: question 6", "Assistant: answer 6",
+    ]
+    stats = store.stats()
+    assert stats["compacted_turns"] == 7
+    assert stats["history_tokens"] <= 3 * turn_tokens and stats["summary_tokens"] <= 12
+
+
+def test_latest_turn_is_kept_even_over_budget():
+    store = SessionStore(history_tokens=5, count_tokens=count_words)
+    store.append("ana", "a long question " * 10, "a long answer " * 10)
+    assert len(store.history("ana")) == 2
+
+
+def test_least_recently_used_and_idle_sessions_are_dropped(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    store = SessionStore(max_sessions=2, idle_seconds=60, count_tokens=count_words)
+    store.append("ana", "hi", "hello")
+    store.append("bob", "hi", "hello")
+    store.append("ana", "again", "hello again")
+    store.append("cy", "hi", "hello")
+    assert store.history("bob") == [] and len(store.history("ana")) == 4
+    now[0] = 61
+    assert store.history("cy") == []
+    assert len(store) == 0
+    assert store.stats()["evicted"] == 1 and store.stats()["expired"] == 2
+
+
+def test_chat_sends_the_users_earlier_turns(monkeypatch):
+    from fastapi.testclient import TestClient
+    import main
+    import openai_client
+    requests = []
+
+    async def create(**kwargs):
+        requests.append(kwargs["messages"])
+        message = SimpleNamespace(content=f"Answer {len(requests)}", tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    monkeypatch.setattr(openai_client, "client", SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=create))
+    ))
+    monkeypatch.setattr(main, "SESSIONS", SessionStore(count_tokens=count_words))
+    client = TestClient(main.app)
+    client.post("/chat", json={"message": "Weather in Paris?", "user_id": "ana"})
+    client.post("/chat", json={"message": "And tomorrow?", "user_id": "ana"})
+    client.post("/chat", json={"message": "Hello", "user_id": "bob"})
+    client.post("/chat", json={"message": "No session"})
+
+    assert [message["content"] for message in requests[1]] == ["Weather in Paris?", "Answer 1", "And tomorrow?"]
+    assert [message["content"] for message in requests[2]] == ["Hello"]
+    assert [message["content"] for message in requests[3]] == ["No session"]
+    assert client.get("/sessions/stats").json()["sessions"] == 2
+    assert client.delete("/sessions/ana").json() == {"user_id": "ana", "reset": True}
+
+
+def test_failed_completions_are_not_saved_as_turns(monkeypatch):
+    from fastapi.testclient import TestClient
+    import main
+    import openai_client
+    requests = []
+
+    async def create(**kwargs):
+        requests.append(kwargs["messages"])
+        if len(requests) == 1:
+            raise RuntimeError("429 Too Many Requests")
+        message = SimpleNamespace(content="Hello!", tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    monkeypatch.setattr(openai_client, "client", SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=create))
+    ))
+    monkeypatch.setattr(main, "SESSIONS", SessionStore(count_tokens=count_words))
+    client = TestClient(main.app)
+    body = client.post("/chat", json={"message": "hi", "user_id": "ana"}).json()
+    assert body["error"] == "429 Too Many Requests"
+    assert main.SESSIONS.history("ana") == []
+    client.post("/chat", json={"message": "hi again", "user_id": "ana"})
+    assert [message["content"] for message in requests[1]] == ["hi again"]
+    assert [message["content"] for message in main.SESSIONS.history("ana")] == ["hi again", "Hello!"]
+
+
+def test_encoding_loads_off_the_event_loop_and_retries_after_a_failure(monkeypatch):
+    import asyncio
+    import sessions
+    attempts = []
+
+    def get_encoding(name):
+        attempts.append(name)
+        if len(attempts) == 1:
+            raise OSError("download failed")
+        return SimpleNamespace(encode_ordinary=lambda text: text.split())
+
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(sessions, "tiktoken", SimpleNamespace(get_encoding=get_encoding))
+    monkeypatch.setattr(sessions, "_encoding", None)
+    monkeypatch.setattr(sessions, "_next_load", 0.0)
+
+    async def load():
+        task = sessions.load_encoding_in_background()
+        return await task if task else None
+
+    # Counting never loads the encoding itself
+    assert sessions.count_tokens("one two three") == 4 and attempts == []
+    assert asyncio.run(load()) is False
+    assert asyncio.run(load()) is None and len(attempts) == 1
+    now[0] += sessions.ENCODING_RETRY_SECONDS
+    assert asyncio.run(load()) is True
+    assert sessions.count_tokens("one two three") == 3
@@ -0,0 +1,84 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+from functions.registry import FunctionRegistry
+from tool_calls import execute_tool_calls
+
+
+def test_tool_calls_run_concurrently_with_timeouts_and_errors():
+    registry = FunctionRegistry()
+
+    @registry.register
+    async def slow_async(city: str):
+        await asyncio.sleep(0.3)
+        return {"city": city}
+
+    @registry.register
+    def slow_sync(date: str):
+        time.sleep(0.3)
+        return {"date": date}
+
+    @registry.register(timeout=0.1)
+    async def hangs():
+        await asyncio.sleep(5)
+
+    @registry.register
+    def broken():
+        raise RuntimeError("upstream down")
+
+    calls = [
+        {"id": "1", "name": "slow_async", "arguments": '{"city": "Paris"}'},
+        {"id": "2", "name": "slow_sync", "arguments": '{"date": "2024-05-01"}'},
+        {"id": "3", "name": "slow_async", "arguments": '{"city": "Tokyo"}'},
+        {"id": "4", "name": "hangs", "arguments": ""},
+        {"id": "5", "name": "broken", "arguments": "{}"},
+        {"id": "6", "name": "slow_sync", "arguments": '{"day": "monday"}'},
+        {"id": "7", "name": "missing", "arguments": "{}"},
+    ]
+    start = time.perf_counter()
+    outcomes = asyncio.run(execute_tool_calls(calls, registry))
+    assert time.perf_counter() - start < 0.55
+    assert [outcome["id"] for outcome in outcomes] == ["1", "2", "3", "4", "5", "6", "7"]
+    assert outcomes[0]["result"] == {"city": "Paris"} and outcomes[2]["result"] == {"city": "Tokyo"}
+    assert outcomes[1]["result"] == {"date": "2024-05-01"}
+    assert "timed out" in outcomes[3]["error"]
+    assert "upstream down" in outcomes[4]["error"]
+    assert "Unexpected arguments" in outcomes[5]["error"]
+    assert "not found" in outcomes[6]["error"]
+
+
+def test_chat_sends_all_tool_results_in_one_follow_up(monkeypatch):
+    from fastapi.testclient import TestClient
+    import openai_client
+    from main import app
+    requests = []
+
+    def tool_call(id, name, arguments):
+        return SimpleNamespace(id=id, function=SimpleNamespace(name=name, arguments=json.dumps(arguments)))
+
+    async def create(**kwargs):
+        requests.append(kwargs)
+        if len(requests) == 1:
+            message = SimpleNamespace(content=None, tool_calls=[
+                tool_call("a", "get_weather", {"location": "Paris"}),
+                tool_call("b", "get_weather", {"location": "Tokyo"}),
+                tool_call("c", "get_events", {"date": "2024-05-01"}),
+            ])
+        else:
+            message = SimpleNamespace(content="Sunny in both; two meetings today.", tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    monkeypatch.setattr(openai_client, "client", SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=create))
+    ))
+    body = TestClient(app).post("/chat", json={"message": "Weather in Paris and Tokyo, and my events?"}).json()
+    assert body["response"] == "Sunny in both; two meetings today."
+    assert [call["arguments"] for call in body["tool_calls"]][:2] == [{"location": "Paris"}, {"location": "Tokyo"}]
+    assert body["function_call"] == {"name": "get_weather", "arguments": {"location": "Paris"}}
+    assert len(requests) == 2
+    assert requests[0]["tool_choice"] == "auto" and requests[1]["tool_choice"] == "none"
+    tool_messages = [message for message in requests[1]["messages"] if message["role"] == "tool"]
+    assert [message["tool_call_id"] for message in tool_messages] == ["a", "b", "c"]
+    assert json.loads(tool_messages[1]["content"])["location"] == "Tokyo"
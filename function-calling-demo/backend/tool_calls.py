@@ -0,0 +1,96 @@
+# =============================================================
+# Parallel Tool Call Execution (tool_calls.py)
+# -------------------------------------------------------------
+# With the tools API the LLM can ask for several function calls in one
+# response (e.g. weather in Paris, weather in Tokyo and today's events).
+# This module runs all of them at the same time and collects the results.
+#
+# Key Concepts for Beginners:
+# - async functions run directly on the event loop
+# - regular (sync) functions run on a small, bounded thread pool, so a slow
+#   one never blocks other requests
+# - every call has a timeout; a call that times out or raises becomes an
+#   {"error": ...} result instead of failing the whole chat
+# - results keep the order of the LLM's tool calls
+# =============================================================
+
+import asyncio
+import contextvars
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from functions import ArgumentError
+
+# Threads available to sync functions across all requests
+TOOL_THREADS = int(os.getenv("TOOL_THREADS", "16"))
+# Seconds a tool call may take unless its @register(timeout=...) says otherwise
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "10"))
+
+# Shared by every request, created on first use
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=TOOL_THREADS, thread_name_prefix="tool")
+    return _executor
+
+
+def parse_arguments(arguments):
+    """Tool call arguments arrive as a JSON string; an empty string means no arguments."""
+    if isinstance(arguments, dict):
+        return arguments
+    if not arguments:
+        return {}
+    try:
+        return json.loads(arguments)
+    except json.JSONDecodeError as e:
+        raise ArgumentError(f"Arguments are not valid JSON: {e}")
+
+
+async def execute_tool_call(tool_call, registry, default_timeout=TOOL_TIMEOUT):
+    """
+    Run one tool call {"id", "name", "arguments"} and return it with a
+    "result" or an "error" added. Never raises (except on cancellation).
+    """
+    name = tool_call["name"]
+    outcome = {"id": tool_call.get("id"), "name": name, "arguments": tool_call.get("arguments")}
+    func = registry.get(name)
+    if func is None:
+        outcome["error"] = f"Function '{name}' not found."
+        return outcome
+    timeout = func.timeout if func.timeout is not None else default_timeout
+    try:
+        arguments = func.validate(parse_arguments(tool_call.get("arguments")))
+        outcome["arguments"] = arguments
+        if func.is_async:
+            call = func(**arguments)
+        else:
+            # A thread can't be stopped: on timeout the chat moves on and the
+            # thread finishes in the background. The copied context carries
+            # current_user into the thread.
+            context = contextvars.copy_context()
+            call = asyncio.get_running_loop().run_in_executor(
+                get_executor(), lambda: context.run(func, **arguments)
+            )
+        outcome["result"] = await asyncio.wait_for(call, timeout)
+    except asyncio.TimeoutError:
+        outcome["error"] = f"Function '{name}' timed out after {timeout:g}s"
+    except Exception as e:
+        outcome["error"] = f"Function '{name}' failed: {e}"
+    return outcome
+
+
+async def execute_tool_calls(tool_calls, registry, default_timeout=TOOL_TIMEOUT):
+    """Run all tool calls concurrently; results are in the same order as the calls."""
+    return list(await asyncio.gather(*(
+        execute_tool_call(tool_call, registry, default_timeout) for tool_call in tool_calls
+    )))
+
+
+def tool_result_message(outcome):
+    """The {"role": "tool"} message that reports one call's outcome back to the LLM."""
+    content = {"error": outcome["error"]} if "error" in outcome else outcome["result"]
+    return {"role": "tool", "tool_call_id": outcome["id"], "content": json.dumps(content, default=str)}
@@ -1,3 +1,5 @@
+import os
+import sys
 import textwrap as tr
 from typing import List, Optional
 
@@ -13,6 +15,17 @@ import openai
 import numpy as np
 import pandas as pd
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from shared.embedding_cache import EmbeddingCache
+
+# Persistent cache shared with rag-pdf-demo ingestion; repeated runs skip the API
+embedding_cache = EmbeddingCache()
+
+
+def _cache_model(model: str, kwargs: dict) -> str:
+    # Options such as `dimensions` change the vector, so they are part of the key
+    return model if not kwargs else f"{model}:{sorted(kwargs.items())}"
+
 
 @retry(wait=wait_random_exponential(min=1, max=20), stop=stop_after_attempt(6))
 def get_embedding(text: str, model="text-similarity-davinci-001", **kwargs) -> List[float]:
@@ -20,8 +33,14 @@ def get_embedding(text: str, model="text-similarity-davinci-001", **kwargs) -> L
     # replace newlines, which can negatively affect performance.
     text = text.replace("\n", " ")
 
+    cache_model = _cache_model(model, kwargs)
+    cached = embedding_cache.get(text, cache_model)
+    if cached is not None:
+        return cached
+
     response = openai.embeddings.create(input=[text], model=model, **kwargs)
 
+    embedding_cache.put(text, cache_model, response.data[0].embedding)
     return response.data[0].embedding
 
 
@@ -47,8 +66,18 @@ def get_embeddings(
     # replace newlines, which can negatively affect performance.
     list_of_text = [text.replace("\n", " ") for text in list_of_text]
 
-    data = openai.embeddings.create(input=list_of_text, model=model, **kwargs).data
-    return [d.embedding for d in data]
+    # only send texts that are not already cached
+    cache_model = _cache_model(model, kwargs)
+    embeddings = embedding_cache.get_many(list_of_text, cache_model)
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if missing:
+        missing_text = [list_of_text[i] for i in missing]
+        data = openai.embeddings.create(input=missing_text, model=model, **kwargs).data
+        new_embeddings = [d.embedding for d in sorted(data, key=lambda d: d.index)]
+        embedding_cache.put_many(missing_text, cache_model, new_embeddings)
+        for i, embedding in zip(missing, new_embeddings):
+            embeddings[i] = embedding
+    return embeddings
 
 
 @retry(wait=wait_random_exponential(min=1, max=20), stop=stop_after_attempt(6))
@@ -0,0 +1,264 @@
+"""
+ann_index.py: Approximate nearest-neighbour search with IVF and product quantization.
+
+For corpora of millions of chunks, scanning every float32 embedding per query
+costs too much memory bandwidth, and holding them all in RAM costs too much
+memory. IVFPQIndex sits on top of a FlatIndex, which stays the on-disk store
+of record for vectors and metadata:
+    - a coarse k-means quantizer splits the corpus into `nlist` inverted lists;
+      a query only scans the `nprobe` lists whose centroids are closest
+    - each vector's residual from its centroid is compressed to `m` one-byte
+      codes (one per subspace, 256 centroids each), so RAM holds m bytes per
+      chunk instead of 4 * dim
+    - inner products are scored from a per-query lookup table of
+      (subspace, code) partial products, without decoding any vector
+    - the best `rerank` candidates are re-scored exactly against the
+      memory-mapped matrix, which only touches those few rows on disk
+Training and encoding run on a thread pool (NumPy releases the GIL in the
+heavy kernels): the coarse k-means splits its assignment step, the costly
+part, into row blocks across the pool, the PQ codebooks train one subspace
+per task, and encoding works on blocks of rows. The trained quantizers and codes are saved to one .npz; rows
+appended to the flat index later are encoded with the existing quantizers.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import numpy as np
+
+from flat_index import FlatIndex, normalize
+
+
+# Inverted lists scanned per query; higher is slower with better recall
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "16"))
+# Candidates re-scored with exact inner products; 0 returns PQ scores as is
+ANN_RERANK = int(os.getenv("ANN_RERANK", "256"))
+# Threads used to train the quantizers and encode vectors
+ANN_BUILD_WORKERS = int(os.getenv("ANN_BUILD_WORKERS", os.cpu_count() or 1))
+# Dimensions per PQ subspace; m = dim / PQ_SUBSPACE_DIMS bytes per vector
+PQ_SUBSPACE_DIMS = 8
+# Centroids per PQ subspace (codes are one byte)
+PQ_CENTROIDS = 256
+# Below this many rows the index is not trained and queries fall back to exact search
+MIN_TRAIN_ROWS = 4 * PQ_CENTROIDS
+# Rows sampled to train the coarse quantizer, and the PQ codebooks (64 per codeword is plenty)
+MAX_TRAIN_ROWS = 100_000
+PQ_TRAIN_ROWS = 64 * PQ_CENTROIDS
+KMEANS_ITERATIONS = 20
+# Rows encoded per thread-pool task
+ENCODE_BLOCK_ROWS = 16384
+# Largest (rows x centroids) distance matrix computed at once
+MAX_DISTANCE_ELEMENTS = 1 << 24
+
+
+def nearest(x: np.ndarray, centroids: np.ndarray, pool: Optional[ThreadPoolExecutor] = None,
+            workers: int = 1) -> np.ndarray:
+    """
+    Index of the closest centroid (L2) for every row of x. With a pool, row
+    blocks are assigned on `workers` threads at once.
+    """
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    block = max(1, MAX_DISTANCE_ELEMENTS // len(centroids))
+    if pool is not None and workers > 1:
+        # At least one block per worker
+        block = max(1, min(block, -(-len(x) // workers)))
+    assign = np.empty(len(x), dtype=np.int64)
+
+    def assign_block(start):
+        distances = centroid_norms - 2 * (x[start:start + block] @ centroids.T)
+        assign[start:start + block] = distances.argmin(axis=1)
+
+    starts = range(0, len(x), block)
+    if pool is not None and workers > 1 and len(starts) > 1:
+        list(pool.map(assign_block, starts))
+    else:
+        for start in starts:
+            assign_block(start)
+    return assign
+
+
+def kmeans(x: np.ndarray, k: int, iterations: int = KMEANS_ITERATIONS, seed: int = 0,
+           pool: Optional[ThreadPoolExecutor] = None, workers: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), k, replace=False)].astype(np.float32)
+    for _ in range(iterations):
+        assign = nearest(x, centroids, pool, workers)
+        counts = np.bincount(assign, minlength=k)
+        order = np.argsort(assign, kind="stable")
+        filled = counts > 0
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        centroids[filled] = np.add.reduceat(x[order], starts[filled], axis=0) / counts[filled, None]
+        # Reseed empty clusters on random points so every code stays useful
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            centroids[empty] = x[rng.choice(len(x), len(empty), replace=False)]
+    return centroids
+
+
+class IVFPQIndex:
+    def __init__(self, flat: FlatIndex, path: str, nlist: Optional[int] = None, m: Optional[int] = None,
+                 nprobe: int = ANN_NPROBE, rerank: int = ANN_RERANK, workers: int = ANN_BUILD_WORKERS):
+        self.flat = flat
+        self.path = path
+        self.nlist = nlist
+        self.m = m
+        self.nprobe = nprobe
+        self.rerank = rerank
+        self.workers = max(1, workers)
+        self._mtime = None
+        self._lock = threading.Lock()
+        # (centroids, codebooks, codes, lists, offsets, order, generation); replaced as a
+        # whole so queries on other threads always see one consistent index. None until trained.
+        self._state = None
+        self.load()
+
+    @property
+    def trained(self) -> bool:
+        return self._state is not None
+
+    def count(self) -> int:
+        return self.flat.count()
+
+    def get(self, ids) -> dict:
+        return self.flat.get(ids)
+
+    def memory_bytes(self) -> int:
+        """RAM held by the quantizers and codes (the flat matrix stays on disk)."""
+        if self._state is None:
+            return 0
+        return sum(array.nbytes for array in self._state[:-1])
+
+    def train(self) -> None:
+        rows, matrix, _ = self.flat.view
+        if rows < MIN_TRAIN_ROWS:
+            raise ValueError(f"Need at least {MIN_TRAIN_ROWS} rows to train, have {rows}")
+        dim = matrix.shape[1]
+        nlist = self.nlist or int(np.clip(4 * np.sqrt(rows), 1, rows // 39))
+        m = self.m or max(d for d in range(1, dim // PQ_SUBSPACE_DIMS + 1) if dim % d == 0)
+        rng = np.random.default_rng(0)
+        sample = np.asarray(matrix[np.sort(rng.choice(rows, min(rows, MAX_TRAIN_ROWS), replace=False))])
+        with ThreadPoolExecutor(self.workers) as pool:
+            centroids = kmeans(sample, nlist, pool=pool, workers=self.workers)
+            pq_sample = sample[rng.choice(len(sample), min(len(sample), PQ_TRAIN_ROWS), replace=False)]
+            residuals = (pq_sample - centroids[nearest(pq_sample, centroids, pool, self.workers)]).reshape(
+                len(pq_sample), m, dim // m
+            )
+            codebooks = np.stack(list(pool.map(
+                lambda j: kmeans(np.ascontiguousarray(residuals[:, j]), PQ_CENTROIDS, seed=j), range(m)
+            )))
+        self.nlist, self.m = nlist, m
+        empty = np.empty(0, dtype=np.int32)
+        self._state = (centroids, codebooks, np.empty((0, m), np.uint8), empty, np.zeros(nlist + 1, np.int64),
+                       empty, None)
+
+    def encode(self, vectors: np.ndarray, centroids: np.ndarray, codebooks: np.ndarray):
+        """(list, PQ codes) for each vector, computed in parallel blocks."""
+        m, _, sub = codebooks.shape
+
+        def encode_block(start):
+            block = np.asarray(vectors[start:start + ENCODE_BLOCK_ROWS], dtype=np.float32)
+            lists = nearest(block, centroids)
+            residuals = block - centroids[lists]
+            codes = np.empty((len(block), m), dtype=np.uint8)
+            for j in range(m):
+                codes[:, j] = nearest(residuals[:, j * sub:(j + 1) * sub], codebooks[j])
+            return lists, codes
+
+        with ThreadPoolExecutor(self.workers) as pool:
+            blocks = list(pool.map(encode_block, range(0, len(vectors), ENCODE_BLOCK_ROWS)))
+        if not blocks:
+            return np.empty(0, dtype=np.int64), np.empty((0, m), dtype=np.uint8)
+        return np.concatenate([b[0] for b in blocks]), np.concatenate([b[1] for b in blocks])
+
+    def sync(self) -> None:
+        """
+        Bring the codes up to date with the flat index: train once there are
+        enough rows, encode appended rows, re-encode everything after compaction.
+        """
+        with self._lock:
+            if self._state is None:
+                if self.flat.view[0] < MIN_TRAIN_ROWS:
+                    return
+                self.train()
+            centroids, codebooks, codes, lists, _, _, generation = self._state
+            rows, matrix, _ = self.flat.view
+            if generation != self.flat.generation:
+                codes, lists = codes[:0], lists[:0]
+            if len(codes) == rows:
+                return
+            new_lists, new_codes = self.encode(matrix[len(codes):rows], centroids, codebooks)
+            codes = np.concatenate([codes, new_codes])
+            lists = np.concatenate([lists, new_lists.astype(np.int32)])
+            order = np.argsort(lists, kind="stable").astype(np.int32)
+            offsets = np.concatenate(([0], np.cumsum(np.bincount(lists, minlength=len(centroids)))))
+            self._state = (centroids, codebooks, codes, lists, offsets, order, self.flat.generation)
+
+    def save(self) -> None:
+        if self._state is None:
+            return
+        centroids, codebooks, codes, lists, _, _, generation = self._state
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp.npz"
+        np.savez(tmp_path, centroids=centroids, codebooks=codebooks, codes=codes, lists=lists,
+                 generation=np.int64(generation or -1))
+        os.replace(tmp_path, self.path)
+        self._mtime = os.stat(self.path).st_mtime_ns
+
+    def load(self) -> None:
+        """Pick up new flat rows, reloading the saved index if it was rebuilt since."""
+        self.flat.load()
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime is not None and mtime != self._mtime:
+            with np.load(self.path) as saved:
+                centroids, codebooks = saved["centroids"], saved["codebooks"]
+                codes, lists, generation = saved["codes"], saved["lists"], int(saved["generation"])
+            order = np.argsort(lists, kind="stable").astype(np.int32)
+            offsets = np.concatenate(([0], np.cumsum(np.bincount(lists, minlength=len(centroids)))))
+            self.nlist, self.m = len(centroids), len(codebooks)
+            self._state = (centroids, codebooks, codes, lists, offsets, order, generation)
+            self._mtime = mtime
+        self.sync()
+
+    def query(self, query_embeddings, n_results: int = 10, nprobe: Optional[int] = None,
+              rerank: Optional[int] = None) -> dict:
+        """Approximate top-k, shaped like Chroma's query result."""
+        state = self._state
+        if state is None:
+            return self.flat.query(query_embeddings=query_embeddings, n_results=n_results)
+        centroids, codebooks, codes, lists, offsets, order, _ = state
+        nprobe = min(nprobe or self.nprobe, len(centroids))
+        rerank = self.rerank if rerank is None else rerank
+        rows, matrix, dead = self.flat.view
+        alive = np.ones(len(codes), dtype=bool)
+        alive[dead[dead < len(codes)]] = False
+        queries = normalize(query_embeddings)
+        m, _, sub = codebooks.shape
+        # Coarse probe by L2 to the centroids; score = q . centroid + q . residual
+        coarse = (centroids ** 2).sum(axis=1) - 2 * (queries @ centroids.T)
+        probes = np.argpartition(coarse, nprobe - 1, axis=1)[:, :nprobe]
+        base = queries @ centroids.T
+        # tables[q, j, c] = q_j . codebooks[j, c]
+        tables = np.einsum("qjd,jcd->qjc", queries.reshape(len(queries), m, sub), codebooks)
+        top_rows, top_scores = [], []
+        for i, query in enumerate(queries):
+            candidates = np.concatenate([order[offsets[l]:offsets[l + 1]] for l in probes[i]])
+            candidates = candidates[alive[candidates]]
+            scores = base[i, lists[candidates]] + tables[i, np.arange(m), codes[candidates]].sum(axis=1)
+            keep = min(len(candidates), max(n_results, rerank))
+            if keep == 0:
+                top_rows.append([])
+                top_scores.append([])
+                continue
+            best = np.argpartition(-scores, keep - 1)[:keep]
+            candidates, scores = candidates[best], scores[best]
+            if rerank:
+                candidates = np.sort(candidates)  # sequential reads from the memory map
+                scores = np.asarray(matrix[candidates]) @ query
+            best = np.argsort(-scores)[:n_results]
+            top_rows.append(candidates[best].tolist())
+            top_scores.append(scores[best].tolist())
+        return self.flat.results(top_rows, top_scores)
@@ -0,0 +1,85 @@
+"""
+bench_ann.py: IVF-PQ recall@k, QPS and memory vs. exact flat search.
+
+Builds a synthetic clustered corpus (Gaussian blobs, closer to real embedding
+distributions than uniform noise) in a temporary FlatIndex, trains an
+IVFPQIndex over it, and sweeps nprobe with and without exact re-ranking.
+Build time is reported for one worker and for --workers. The speedup needs
+at least that many cores; the core count is printed with the build times.
+
+Usage:
+    python backend/benchmarks/bench_ann.py [--rows 100000] [--dim 384] [--workers 4]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+from ann_index import ANN_BUILD_WORKERS, ANN_RERANK, IVFPQIndex
+from flat_index import FlatIndex, normalize
+
+
+def sample(centers, rows, rng):
+    noise = rng.standard_normal((rows, centers.shape[1])).astype(np.float32)
+    return normalize(centers[rng.integers(len(centers), size=rows)] + 0.5 * noise)
+
+
+def timed_queries(query, queries, k, **kwargs):
+    ids = []
+    start = time.perf_counter()
+    for vector in queries:
+        ids.extend(query(query_embeddings=vector[None, :], n_results=k, **kwargs)["ids"])
+    return len(queries) / (time.perf_counter() - start), ids
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=ANN_BUILD_WORKERS)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((args.clusters, args.dim)).astype(np.float32)
+    vectors = sample(centers, args.rows, rng)
+    queries = sample(centers, args.queries, rng)
+    with tempfile.TemporaryDirectory() as tmp:
+        flat = FlatIndex(os.path.join(tmp, "flat"))
+        for start in range(0, args.rows, 50_000):
+            ids = [str(i) for i in range(start, min(start + 50_000, args.rows))]
+            flat.upsert(ids=ids, embeddings=vectors[start:start + 50_000], documents=ids)
+        del vectors
+
+        builds = {}
+        for workers in sorted({1, args.workers}):
+            start = time.perf_counter()
+            index = IVFPQIndex(flat, os.path.join(tmp, f"ivfpq-{workers}.npz"), workers=workers)
+            builds[workers] = time.perf_counter() - start
+        print(f"{args.rows} x {args.dim} corpus, k={args.k}, {args.queries} single queries")
+        print("build seconds: " + ", ".join(f"{seconds:.1f} with {workers} worker(s)"
+                                             for workers, seconds in builds.items())
+              + f" on {os.cpu_count()} core(s)")
+        print(f"memory: flat float32 {flat.view[1].nbytes / 2**20:.1f} MiB, "
+              f"ivfpq {index.memory_bytes() / 2**20:.1f} MiB in RAM "
+              f"({index.nlist} lists, {index.m} bytes per vector)")
+
+        exact_qps, exact = timed_queries(flat.query, queries, args.k)
+        print(f"{'search':<22} {'recall@k':>9} {'QPS':>9}")
+        print(f"{'exact (flat)':<22} {1.0:>9.3f} {exact_qps:>9.0f}")
+        for rerank in (0, ANN_RERANK):
+            for nprobe in (1, 4, 16, 64):
+                qps, found = timed_queries(index.query, queries, args.k, nprobe=nprobe, rerank=rerank)
+                recall = statistics.mean(len(set(a) & set(e)) / args.k for a, e in zip(found, exact))
+                label = f"nprobe={nprobe} rerank={rerank}"
+                print(f"{label:<22} {recall:>9.3f} {qps:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
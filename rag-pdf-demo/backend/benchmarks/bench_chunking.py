@@ -0,0 +1,48 @@
+"""
+bench_chunking.py: Token chunker vs. the previous character splitter.
+
+Splits the pages of the bundled sample PDF (repeated to a larger corpus) with
+RecursiveCharacterTextSplitter(500 chars, 50 overlap) and TokenTextSplitter,
+reporting chunks/sec and the spread of tokens per chunk.
+
+Usage:
+    python backend/benchmarks/bench_chunking.py [--copies 200]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from pdf_loader import parse_pdf
+from tokens import TokenTextSplitter, count_tokens, get_encoding
+
+SAMPLE_PDF = os.path.join(os.path.dirname(__file__), "..", "data", "Developer quickstart - OpenAI API.pdf")
+
+
+def report(name, split, pages):
+    start = time.perf_counter()
+    chunks = split(pages)
+    elapsed = time.perf_counter() - start
+    sizes = count_tokens([chunk.page_content for chunk in chunks])
+    print(f"{name:<28} {len(chunks):>8} {len(chunks) / elapsed:>12.0f} "
+          f"{min(sizes):>6} {statistics.mean(sizes):>7.1f} {max(sizes):>6} {statistics.pstdev(sizes):>7.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--copies", type=int, default=200)
+    args = parser.parse_args()
+
+    pages = parse_pdf(SAMPLE_PDF) * args.copies
+    get_encoding()  # load the encoding outside the timed region
+    print(f"{len(pages)} pages")
+    print(f"{'splitter':<28} {'chunks':>8} {'chunks/sec':>12} {'min':>6} {'mean':>7} {'max':>6} {'stdev':>7}  (tokens/chunk)")
+    report("characters (500/50)", RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50).split_documents, pages)
+    report("tokens (200/20)", TokenTextSplitter(200, 20).split_documents, pages)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+bench_hybrid.py: Retrieval quality of vector, BM25 and hybrid (RRF) search.
+
+Builds a synthetic corpus where each chunk belongs to one of a few hundred
+topics and mentions a unique part code. Chunk embeddings only encode the
+topic (plus noise), as real embeddings blur exact identifiers, so:
+    - "semantic" queries describe a topic in other words (embedding near the
+      topic, few shared tokens); the relevant chunks are that topic's chunks
+    - "code" queries ask about one part code; the relevant chunk is the one
+      that mentions it
+Reports recall@k and MRR for each mode and query kind, and mean per-query
+latency of each stage (vector search, BM25 search, fusion).
+
+Usage:
+    python backend/benchmarks/bench_hybrid.py [--chunks 20000] [--topics 400] [--k 10]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+from bm25 import BM25Index
+from flat_index import FlatIndex, normalize
+from fusion import reciprocal_rank_fusion
+
+WORDS = ("pump valve seal filter pressure motor sensor cable housing bracket torque voltage coolant "
+         "bearing gasket relay fuse panel switch nozzle").split()
+
+
+def metrics(ranked, relevant, k):
+    recall = len(set(ranked[:k]) & relevant) / min(len(relevant), k)
+    rank = next((i for i, chunk_id in enumerate(ranked, start=1) if chunk_id in relevant), None)
+    return recall, 1.0 / rank if rank else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--topics", type=int, default=400)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--candidates", type=int, default=50, help="per-retriever candidates fused in hybrid mode")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    topic_vectors = normalize(rng.standard_normal((args.topics, args.dim)))
+    topic_words = [rng.choice(WORDS, 3, replace=False) for _ in range(args.topics)]
+    topics = rng.integers(0, args.topics, args.chunks)
+    ids = [f"c{i}" for i in range(args.chunks)]
+    codes = [f"XR-{i:06d}" for i in range(args.chunks)]
+    documents = [
+        f"Topic {t} covers the {' and '.join(topic_words[t])}. Part {code} fits unit {rng.integers(1000)}."
+        for t, code in zip(topics, codes)
+    ]
+    vectors = topic_vectors[topics] + 0.6 * rng.standard_normal((args.chunks, args.dim)) / np.sqrt(args.dim)
+
+    semantic = rng.choice(args.topics, args.queries // 2)
+    code_rows = rng.choice(args.chunks, args.queries - len(semantic), replace=False)
+    queries = (
+        [("semantic", f"how do I service the {' '.join(topic_words[t])}",
+          topic_vectors[t] + 0.3 * rng.standard_normal(args.dim) / np.sqrt(args.dim),
+          {ids[i] for i in np.flatnonzero(topics == t)}) for t in semantic]
+        + [("code", f"what is part {codes[i]} used for",
+            topic_vectors[topics[i]] + 0.3 * rng.standard_normal(args.dim) / np.sqrt(args.dim),
+            {ids[i]}) for i in code_rows]
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        flat = FlatIndex(os.path.join(tmp, "flat"))
+        flat.upsert(ids=ids, embeddings=vectors, documents=documents)
+        start = time.perf_counter()
+        lexical = BM25Index(os.path.join(tmp, "bm25"))
+        lexical.add(ids, documents)
+        print(f"{args.chunks} chunks, {args.topics} topics, k={args.k}; BM25 build {time.perf_counter() - start:.1f}s")
+
+        scores = {(mode, kind): [] for mode in ("vector", "bm25", "hybrid") for kind in ("semantic", "code")}
+        timings = {"vector": [], "bm25": [], "fuse": []}
+        for kind, text, embedding, relevant in queries:
+            start = time.perf_counter()
+            vector_ids = flat.query(query_embeddings=[embedding], n_results=args.candidates)["ids"][0]
+            timings["vector"].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            lexical_ids = [chunk_id for chunk_id, _ in lexical.search(text, args.candidates)]
+            timings["bm25"].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            hybrid_ids = [chunk_id for chunk_id, _ in reciprocal_rank_fusion([vector_ids, lexical_ids])]
+            timings["fuse"].append(time.perf_counter() - start)
+            for mode, ranked in (("vector", vector_ids), ("bm25", lexical_ids), ("hybrid", hybrid_ids)):
+                scores[mode, kind].append(metrics(ranked[:args.k], relevant, args.k))
+
+    print(f"{'mode':<8} {'queries':<9} {'recall@k':>9} {'MRR':>6}")
+    for (mode, kind), values in scores.items():
+        recall, mrr = (statistics.mean(column) for column in zip(*values))
+        print(f"{mode:<8} {kind:<9} {recall:>9.3f} {mrr:>6.3f}")
+    print("mean latency per query: " + ", ".join(
+        f"{stage} {statistics.mean(values) * 1000:.2f} ms" for stage, values in timings.items()
+    ))
+
+
+if __name__ == "__main__":
+    main()
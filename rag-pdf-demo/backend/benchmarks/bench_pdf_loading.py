@@ -0,0 +1,50 @@
+"""
+bench_pdf_loading.py: PDF parsing throughput vs. worker count.
+
+Copies the bundled sample PDF N times into a temp directory and times
+ParallelPDFLoader with 1, 2, 4, ... workers up to the core count.
+
+Usage:
+    python backend/benchmarks/bench_pdf_loading.py [--files 64] [--max-workers N]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pdf_loader import ParallelPDFLoader
+
+SAMPLE_PDF = os.path.join(os.path.dirname(__file__), "..", "data", "Developer quickstart - OpenAI API.pdf")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=64)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(args.files):
+            path = os.path.join(tmp, f"doc_{i:04d}.pdf")
+            shutil.copy(SAMPLE_PDF, path)
+            paths.append(path)
+
+        workers = 1
+        baseline = None
+        print(f"{'workers':>8} {'seconds':>9} {'files/sec':>10} {'pages/sec':>10} {'speedup':>8}")
+        while workers <= args.max_workers:
+            start = time.perf_counter()
+            pages = sum(len(p or []) for _, p in ParallelPDFLoader(workers=workers).iter_files(paths))
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(f"{workers:>8} {elapsed:>9.2f} {len(paths) / elapsed:>10.1f} "
+                  f"{pages / elapsed:>10.1f} {baseline / elapsed:>7.2f}x")
+            workers *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+bench_query_load.py: Concurrent /query load test with a simulated slow LLM.
+
+Runs the FastAPI app in-process (httpx ASGI transport) with the Azure client,
+the Chroma collection and the tiktoken encoding replaced by fakes, so it needs
+no network. Every chat completion sleeps for
+--llm-latency seconds. With the async request path, N concurrent questions
+should finish in about one LLM latency. For comparison, the same load is sent
+to a blocking `def` endpoint that sleeps the same time on Starlette's
+threadpool, which is how /query used to run.
+
+Usage:
+    python backend/benchmarks/bench_query_load.py [--requests 500] [--llm-latency 2.0]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# The real client is swapped for a fake below; these only let main.py import
+for name, value in {
+    "AZURE_OPENAI_API_KEY": "bench",
+    "AZURE_OPENAI_API_BASE": "https://example.invalid",
+    "AZURE_OPENAI_API_VERSION": "2024-02-01",
+    "AZURE_OPENAI_DEPLOYMENT": "bench",
+}.items():
+    os.environ.setdefault(name, value)
+
+import httpx
+from fastapi import FastAPI
+
+import main as api
+import tokens
+
+
+class FakeOpenAI:
+    def __init__(self, latency: float, dimensions: int = 1536):
+        async def embed(input, model):
+            # Random vectors, so the semantic answer cache never hits
+            return SimpleNamespace(data=[
+                SimpleNamespace(embedding=[random.random() for _ in range(dimensions)]) for _ in input
+            ])
+
+        async def complete(model, messages):
+            await asyncio.sleep(latency)
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="answer"))])
+
+        self.embeddings = SimpleNamespace(create=embed)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=complete))
+
+
+class FakeEncoding:
+    """Stand-in for the tiktoken encoding (which may need a download): one token per word."""
+
+    def encode_ordinary(self, text):
+        return text.split()
+
+    def encode_ordinary_batch(self, texts):
+        return [self.encode_ordinary(text) for text in texts]
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+class FakeCollection:
+    def query(self, query_embeddings, n_results):
+        return {"ids": [["a"]], "documents": [["context"]], "metadatas": [[{}]], "distances": [[0.0]]}
+
+
+def blocking_app(latency: float) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/query")
+    def query(request: api.QueryRequest):
+        time.sleep(latency)
+        return {"answer": "answer"}
+
+    return app
+
+
+async def load(app, requests: int, timeout: float):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=timeout) as client:
+        async def one(i):
+            start = time.perf_counter()
+            response = await client.post("/query", json={"question": f"question {i}"})
+            response.raise_for_status()
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(one(i) for i in range(requests)))
+        return time.perf_counter() - start, sorted(latencies)
+
+
+def report(name, requests, elapsed, latencies):
+    p50 = statistics.median(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{name:<22} {requests:>8} {elapsed:>9.2f} {requests / elapsed:>9.1f} {p50:>8.2f} {p99:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--llm-latency", type=float, default=2.0)
+    parser.add_argument("--skip-blocking", action="store_true", help="only run the async path")
+    args = parser.parse_args()
+
+    tokens.get_encoding = lambda name=tokens.DEFAULT_ENCODING: FakeEncoding()
+    tokens.load_encoding()
+    api.rag_qa.openai_client = FakeOpenAI(args.llm_latency)
+    api.rag_qa.store = SimpleNamespace(refresh=lambda: "bench", collection=FakeCollection())
+
+    timeout = args.llm_latency * args.requests + 60
+    print(f"{args.requests} concurrent questions, simulated LLM latency {args.llm_latency:.1f}s")
+    print(f"{'path':<22} {'requests':>8} {'seconds':>9} {'req/s':>9} {'p50 s':>8} {'p99 s':>8}")
+    elapsed, latencies = asyncio.run(load(api.app, args.requests, timeout))
+    report("async /query", args.requests, elapsed, latencies)
+    if not args.skip_blocking:
+        elapsed, latencies = asyncio.run(load(blocking_app(args.llm_latency), args.requests, timeout))
+        report("blocking def /query", args.requests, elapsed, latencies)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+bench_retrieval.py: Query latency of the flat NumPy index vs. Chroma.
+
+For each corpus size, random unit vectors are loaded into a fresh Chroma
+collection and a FlatIndex (both on disk in a temporary directory). The
+script reports single-query latency (p50/p95), the per-query cost of one
+batched query call, and Chroma's recall@k against the exact flat results.
+
+Usage:
+    python backend/benchmarks/bench_retrieval.py [--sizes 1000,10000,50000] [--dim 1536]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+from flat_index import FlatIndex, normalize
+from vectorstore import open_client
+
+
+def single_query_latencies(query, queries, k):
+    latencies = []
+    for vector in queries:
+        start = time.perf_counter()
+        query(query_embeddings=[vector.tolist()], n_results=k)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.95)]
+
+
+def batched_latency(query, queries, k):
+    start = time.perf_counter()
+    results = query(query_embeddings=queries.tolist(), n_results=k)
+    return (time.perf_counter() - start) / len(queries), results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1000,10000,50000", help="comma-separated corpus sizes")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    queries = normalize(rng.standard_normal((args.queries, args.dim)))
+    print(f"dim={args.dim}, k={args.k}, {args.queries} queries; latencies in ms")
+    print(f"{'backend':<8} {'chunks':>8} {'build s':>8} {'p50':>8} {'p95':>8} {'batched/q':>10} {'recall':>7}")
+    for size in (int(size) for size in args.sizes.split(",")):
+        vectors = normalize(rng.standard_normal((size, args.dim)))
+        ids = [str(i) for i in range(size)]
+        documents = [f"chunk {i}" for i in range(size)]
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.perf_counter()
+            flat = FlatIndex(os.path.join(tmp, "flat"))
+            flat.upsert(ids=ids, embeddings=vectors, documents=documents)
+            flat_build = time.perf_counter() - start
+
+            start = time.perf_counter()
+            client = open_client(os.path.join(tmp, "chroma"))
+            collection = client.get_or_create_collection(name="bench")
+            step = client.get_max_batch_size()
+            for i in range(0, size, step):
+                collection.add(ids=ids[i:i + step], embeddings=vectors[i:i + step], documents=documents[i:i + step])
+            chroma_build = time.perf_counter() - start
+
+            flat_p50, flat_p95 = single_query_latencies(flat.query, queries, args.k)
+            flat_batched, exact = batched_latency(flat.query, queries, args.k)
+            chroma_p50, chroma_p95 = single_query_latencies(collection.query, queries, args.k)
+            chroma_batched, approximate = batched_latency(collection.query, queries, args.k)
+            recall = statistics.mean(
+                len(set(a) & set(e)) / len(e) for a, e in zip(approximate["ids"], exact["ids"])
+            )
+            for name, build, p50, p95, batched, hit in (
+                ("flat", flat_build, flat_p50, flat_p95, flat_batched, 1.0),
+                ("chroma", chroma_build, chroma_p50, chroma_p95, chroma_batched, recall),
+            ):
+                print(f"{name:<8} {size:>8} {build:>8.1f} {p50 * 1000:>8.2f} {p95 * 1000:>8.2f} "
+                      f"{batched * 1000:>10.3f} {hit:>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
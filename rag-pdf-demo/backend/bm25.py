@@ -0,0 +1,221 @@
+"""
+bm25.py: BM25 inverted index over chunk text, for lexical and hybrid retrieval.
+
+Embeddings blur exact strings, so questions about part numbers, error codes
+or product names often miss with vector search alone. This index scores
+chunks by BM25 over their tokens, where identifiers like "XR-4471" or
+"ERR_CONN_RESET" are kept whole (and also split into their parts).
+
+The index is a directory of immutable segments, one written per ingest
+commit. A segment holds CSR postings for the chunks it added (term offsets,
+uint32 doc numbers, uint16 term frequencies) plus the chunk IDs it deletes
+from earlier segments; re-adding a chunk ID implicitly deletes the old copy.
+Readers load only segments they have not seen. Once there are more than
+MAX_SEGMENTS, they are merged into one and deleted documents dropped. As in
+Lucene, document frequencies count deleted documents until the next merge.
+"""
+import glob
+import os
+import re
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Segments kept before they are merged into one
+MAX_SEGMENTS = 16
+SEGMENT_PATTERN = "seg-*.npz"
+
+# Words and identifiers; joined forms like "xr-4471" or "v2.1" stay one token
+_TOKEN = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+_PART = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in _TOKEN.findall(text.lower()):
+        tokens.append(token)
+        parts = _PART.findall(token)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+def _pack(strings: Sequence[str]) -> np.ndarray:
+    return np.frombuffer("\n".join(strings).encode("utf-8"), dtype=np.uint8)
+
+
+def _unpack(packed: np.ndarray) -> List[str]:
+    return packed.tobytes().decode("utf-8").split("\n") if len(packed) else []
+
+
+class Segment:
+    def __init__(self, number: int, ids: List[str], lengths: np.ndarray, terms: List[str],
+                 offsets: np.ndarray, docs: np.ndarray, tfs: np.ndarray, deletes: List[str]):
+        self.number = number
+        self.ids = ids
+        self.lengths = lengths
+        self.term_index = {term: i for i, term in enumerate(terms)}
+        self.terms = terms
+        self.offsets = offsets
+        self.docs = docs
+        self.tfs = tfs
+        self.deletes = deletes
+        self.alive = np.ones(len(ids), dtype=bool)
+        self.positions = {chunk_id: i for i, chunk_id in enumerate(ids)}
+
+    @classmethod
+    def build(cls, number: int, ids: Sequence[str], token_lists: Iterable[List[str]],
+              deletes: Sequence[str] = ()) -> "Segment":
+        postings: Dict[str, Dict[int, int]] = {}
+        lengths = []
+        for doc, tokens in enumerate(token_lists):
+            lengths.append(len(tokens))
+            for token in tokens:
+                counts = postings.setdefault(token, {})
+                counts[doc] = counts.get(doc, 0) + 1
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(postings[term]) for term in terms])
+        docs = np.fromiter((doc for term in terms for doc in postings[term]), dtype=np.uint32, count=offsets[-1])
+        tfs = np.fromiter((min(tf, 65535) for term in terms for tf in postings[term].values()),
+                          dtype=np.uint16, count=offsets[-1])
+        return cls(number, list(ids), np.array(lengths, dtype=np.uint32), terms, offsets, docs, tfs, list(deletes))
+
+    def save(self, path: str) -> None:
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, ids=_pack(self.ids), lengths=self.lengths, terms=_pack(self.terms),
+                 offsets=self.offsets, docs=self.docs, tfs=self.tfs, deletes=_pack(self.deletes))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, number: int, path: str) -> "Segment":
+        with np.load(path) as data:
+            return cls(number, _unpack(data["ids"]), data["lengths"], _unpack(data["terms"]), data["offsets"],
+                       data["docs"], data["tfs"], _unpack(data["deletes"]))
+
+    def postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        i = self.term_index.get(term)
+        if i is None:
+            return self.docs[:0], self.tfs[:0]
+        return self.docs[self.offsets[i]:self.offsets[i + 1]], self.tfs[self.offsets[i]:self.offsets[i + 1]]
+
+
+class BM25Index:
+    """
+    One writer at a time (ingestion, under the manifest lock) appends segments;
+    readers call load() to pick them up.
+    """
+
+    def __init__(self, path: str, k1: float = BM25_K1, b: float = BM25_B, max_segments: int = MAX_SEGMENTS):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.max_segments = max_segments
+        self.segments: List[Segment] = []
+        self.load()
+
+    def _segment_path(self, number: int) -> str:
+        return os.path.join(self.path, f"seg-{number:08d}.npz")
+
+    def load(self) -> None:
+        numbers = sorted(int(os.path.basename(p)[4:12]) for p in glob.glob(os.path.join(self.path, SEGMENT_PATTERN)))
+        known = [segment.number for segment in self.segments]
+        if known and (not numbers or known[-1] > numbers[-1] or not set(known) <= set(numbers)):
+            # Segments were merged away: start over
+            self.segments = []
+            known = []
+        segments = list(self.segments)
+        for number in numbers:
+            if known and number <= known[-1]:
+                continue
+            segment = Segment.load(number, self._segment_path(number))
+            self._apply_deletes(segments, segment)
+            segments.append(segment)
+        # Replaced as a whole so concurrent queries see a consistent list
+        self.segments = segments
+
+    @staticmethod
+    def _apply_deletes(segments: List[Segment], new: Segment) -> None:
+        removed = set(new.deletes) | set(new.ids)
+        if not removed:
+            return
+        for segment in segments:
+            for chunk_id in removed & segment.positions.keys():
+                segment.alive[segment.positions[chunk_id]] = False
+
+    def count(self) -> int:
+        return int(sum(segment.alive.sum() for segment in self.segments))
+
+    def add(self, ids: Sequence[str], texts: Sequence[str]) -> None:
+        """Index chunks; an ID already in the index replaces the old copy."""
+        self._write(ids, [tokenize(text) for text in texts], ())
+
+    def delete(self, ids: Sequence[str]) -> None:
+        self._write((), (), ids)
+
+    def _write(self, ids, token_lists, deletes) -> None:
+        if not len(ids) and not len(deletes):
+            return
+        os.makedirs(self.path, exist_ok=True)
+        # Another writer may have added segments since; their numbers are taken
+        self.load()
+        number = self.segments[-1].number + 1 if self.segments else 0
+        segment = Segment.build(number, ids, token_lists, deletes)
+        segment.save(self._segment_path(number))
+        self._apply_deletes(self.segments, segment)
+        self.segments = self.segments + [segment]
+        if len(self.segments) > self.max_segments:
+            self.merge()
+
+    def merge(self) -> None:
+        """Rewrite all segments as one, dropping deleted documents."""
+        ids, token_lists = [], []
+        for segment in self.segments:
+            tokens = [[] for _ in segment.ids]
+            for term, i in segment.term_index.items():
+                start, end = segment.offsets[i], segment.offsets[i + 1]
+                for doc, tf in zip(segment.docs[start:end].tolist(), segment.tfs[start:end].tolist()):
+                    tokens[doc].extend([term] * tf)
+            for doc in np.flatnonzero(segment.alive).tolist():
+                ids.append(segment.ids[doc])
+                token_lists.append(tokens[doc])
+        old = [segment.number for segment in self.segments]
+        merged = Segment.build(old[-1] + 1, ids, token_lists)
+        merged.save(self._segment_path(merged.number))
+        self.segments = [merged]
+        for number in old:
+            os.remove(self._segment_path(number))
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """Top-k (chunk ID, BM25 score) for a query, best first."""
+        segments = self.segments
+        terms = list(dict.fromkeys(tokenize(query)))
+        docs_total = sum(len(segment.ids) for segment in segments)
+        if not terms or not docs_total:
+            return []
+        average_length = sum(float(segment.lengths.sum()) for segment in segments) / docs_total
+        idf = {}
+        for term in terms:
+            df = sum(len(segment.postings(term)[0]) for segment in segments)
+            if df:
+                idf[term] = np.log(1 + (docs_total - df + 0.5) / (df + 0.5))
+        hits: List[Tuple[str, float]] = []
+        for segment in segments:
+            scores = np.zeros(len(segment.ids), dtype=np.float32)
+            for term, weight in idf.items():
+                docs, tfs = segment.postings(term)
+                if not len(docs):
+                    continue
+                tfs = tfs.astype(np.float32)
+                norm = self.k1 * (1 - self.b + self.b * segment.lengths[docs] / average_length)
+                scores[docs] += weight * tfs * (self.k1 + 1) / (tfs + norm)
+            scores[~segment.alive] = 0
+            matched = np.flatnonzero(scores)
+            if len(matched) > k:
+                matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+            hits.extend((segment.ids[doc], float(scores[doc])) for doc in matched)
+        hits.sort(key=lambda hit: -hit[1])
+        return hits[:k]
@@ -0,0 +1,188 @@
+"""
+context.py: Token-budgeted prompt context from retrieved chunks.
+
+Retrieval over-fetches candidates and ContextBuilder turns them into the
+context sent to the LLM:
+    - chunks from the same page whose character spans overlap (neighbouring
+      windows share the chunk overlap) are merged into one passage
+    - near-duplicate passages (word-shingle Jaccard >= threshold) are dropped,
+      keeping the more relevant copy
+    - the rest are ordered by maximal marginal relevance (MMR), trading
+      relevance against similarity to the passages already chosen
+    - passages are packed in that order until the tiktoken budget is spent
+      (estimated until the encoding is loaded; see tokens.py)
+Each build reports how many tokens were trimmed: tokens of every candidate
+joined as retrieved, minus tokens of the packed context. This measures the
+over-fetched candidates cut down to the budget, not a saving over an earlier
+prompt format (the context may well be larger than a plain top-3 join).
+"""
+import threading
+from typing import List, Optional, Sequence
+
+from dedup import SHINGLE_SIZE, normalize
+from tokens import count_tokens, truncate_tokens
+
+
+# Most tokens of context per prompt
+CONTEXT_TOKEN_BUDGET = 1500
+# MMR weight of relevance against diversity (1.0 is plain relevance order)
+MMR_LAMBDA = 0.7
+# Shingle Jaccard similarity above which two passages count as duplicates
+DUPLICATE_THRESHOLD = 0.8
+SEPARATOR = "\n\n"
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set:
+    words = normalize(text).split()
+    return {" ".join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+
+
+def jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+class Passage:
+    def __init__(self, text: str, sources: List[dict], relevance: float):
+        self.text = text
+        self.sources = sources
+        self.relevance = relevance
+        self.shingles = shingles(text)
+
+    @property
+    def start(self) -> Optional[int]:
+        return self.sources[0].get("start_index")
+
+
+class PackedContext:
+    def __init__(self, text: str, sources: List[dict], tokens: int, candidate_tokens: int,
+                 candidates: int, duplicates: int):
+        self.text = text
+        # Sources of the chunks that made it into the context, in prompt order
+        self.sources = sources
+        self.tokens = tokens
+        self.candidate_tokens = candidate_tokens
+        self.candidates = candidates
+        self.duplicates = duplicates
+
+    @property
+    def tokens_trimmed(self) -> int:
+        return self.candidate_tokens - self.tokens
+
+    def report(self) -> dict:
+        return {
+            "candidates": self.candidates,
+            "chunks": len(self.sources),
+            "duplicates": self.duplicates,
+            "tokens": self.tokens,
+            "tokens_trimmed": self.tokens_trimmed,
+        }
+
+
+class ContextBuilder:
+    def __init__(self, token_budget: int = CONTEXT_TOKEN_BUDGET, mmr_lambda: float = MMR_LAMBDA,
+                 duplicate_threshold: float = DUPLICATE_THRESHOLD):
+        self.token_budget = token_budget
+        self.mmr_lambda = mmr_lambda
+        self.duplicate_threshold = duplicate_threshold
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.tokens = 0
+        self.tokens_trimmed = 0
+
+    @staticmethod
+    def relevances(sources: Sequence[dict]) -> List[float]:
+        """
+        Candidate relevance scaled to [0, 1]: from the cosine distance when
+        every candidate has one, else from the retrieval rank (e.g. fused
+        hybrid results, where lexical-only hits have no distance).
+        """
+        distances = [source.get("distance") for source in sources]
+        if all(distance is not None for distance in distances):
+            scores = [-distance for distance in distances]
+        else:
+            scores = [-float(rank) for rank in range(len(sources))]
+        low, high = min(scores), max(scores)
+        return [(score - low) / (high - low) if high > low else 1.0 for score in scores]
+
+    @staticmethod
+    def merge_overlaps(passages: List[Passage]) -> List[Passage]:
+        """Merge passages from the same page whose character spans overlap or touch."""
+        pages, merged = {}, []
+        for passage in passages:
+            source = passage.sources[0]
+            if passage.start is None or source.get("source") is None:
+                merged.append(passage)
+            else:
+                pages.setdefault((source["source"], source.get("page")), []).append(passage)
+        for group in pages.values():
+            group.sort(key=lambda passage: passage.start)
+            current = group[0]
+            for passage in group[1:]:
+                end = current.start + len(current.text)
+                if passage.start <= end:
+                    current = Passage(current.text + passage.text[end - passage.start:],
+                                      current.sources + passage.sources, max(current.relevance, passage.relevance))
+                else:
+                    merged.append(current)
+                    current = passage
+            merged.append(current)
+        return merged
+
+    def build(self, documents: Sequence[str], sources: Sequence[dict]) -> PackedContext:
+        """Pack retrieved chunks (best first, as returned by RAGQA.search) into one context."""
+        candidate_tokens = count_tokens(["\n".join(documents)], estimate=True)[0] if documents else 0
+        passages = self.merge_overlaps([
+            Passage(document, [source], relevance)
+            for document, source, relevance in zip(documents, sources, self.relevances(sources))
+        ])
+        passages.sort(key=lambda passage: -passage.relevance)
+        unique = []
+        for passage in passages:
+            if all(jaccard(passage.shingles, kept.shingles) < self.duplicate_threshold for kept in unique):
+                unique.append(passage)
+        duplicates = len(passages) - len(unique)
+
+        # MMR selection, skipping passages that no longer fit the budget
+        lengths = dict(zip(map(id, unique), count_tokens([passage.text for passage in unique], estimate=True)))
+        separator_tokens = count_tokens([SEPARATOR], estimate=True)[0]
+        remaining = self.token_budget
+        selected: List[Passage] = []
+        pool = list(unique)
+        while pool and remaining > 0:
+            best = max(pool, key=lambda passage: self.mmr_lambda * passage.relevance - (1 - self.mmr_lambda) * max(
+                (jaccard(passage.shingles, chosen.shingles) for chosen in selected), default=0.0
+            ))
+            pool.remove(best)
+            cost = lengths[id(best)] + (separator_tokens if selected else 0)
+            if cost <= remaining:
+                selected.append(best)
+                remaining -= cost
+        if not selected and unique:
+            # Even the best passage is over budget on its own: send its first token_budget tokens
+            best = unique[0]
+            prefix = truncate_tokens(best.text, self.token_budget, estimate=True)
+            selected = [Passage(prefix, best.sources, best.relevance)]
+
+        text = SEPARATOR.join(passage.text for passage in selected)
+        context = PackedContext(
+            text=text,
+            sources=[source for passage in selected for source in passage.sources],
+            tokens=count_tokens([text], estimate=True)[0] if text else 0,
+            candidate_tokens=candidate_tokens,
+            candidates=len(documents),
+            duplicates=duplicates,
+        )
+        with self._lock:
+            self.requests += 1
+            self.tokens += context.tokens
+            self.tokens_trimmed += context.tokens_trimmed
+        return context
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "tokens": self.tokens,
+                "tokens_trimmed": self.tokens_trimmed,
+                "mean_tokens": self.tokens / self.requests if self.requests else 0.0,
+            }
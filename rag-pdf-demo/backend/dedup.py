@@ -0,0 +1,223 @@
+"""
+dedup.py: Exact and near-duplicate chunk elimination before embedding.
+
+Repeated boilerplate, disclaimers and sections copied between document versions
+would otherwise be embedded, stored and retrieved once per copy. Each chunk is
+checked against the chunks already in the store (seeded at the start of the
+run) and the chunks seen so far in the run:
+    - exact duplicates: hash of the normalized text
+    - near duplicates: MinHash signatures over word shingles, with LSH banding
+      to find candidates and an estimated Jaccard similarity >= threshold
+A duplicate maps to its canonical chunk ID, and the canonical chunk keeps a
+back-reference to every location its text appears.
+
+DedupStore keeps the canonical chunks' digests, signatures and back-references
+in SQLite next to the ingest manifest, updated on every commit, so a run
+restores the deduplicator without reading or MinHashing the stored chunks.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import zlib
+from typing import Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+
+# Estimated Jaccard similarity above which two chunks count as duplicates
+DEDUP_THRESHOLD = 0.85
+# MinHash permutations, split into LSH bands of NUM_PERM // BANDS rows
+NUM_PERM = 128
+BANDS = 32
+# Words per shingle
+SHINGLE_SIZE = 3
+# Mersenne prime for the universal hash family; keeps a * x + b inside uint64
+_PRIME = (1 << 31) - 1
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+class ChunkDeduplicator:
+    def __init__(self, threshold: float = DEDUP_THRESHOLD, num_perm: int = NUM_PERM, bands: int = BANDS,
+                 shingle_size: int = SHINGLE_SIZE, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        rng = np.random.default_rng(seed)
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self._a = rng.integers(1, _PRIME, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _PRIME, num_perm, dtype=np.uint64)
+        self._exact: Dict[str, str] = {}
+        # canonical chunk ID -> digest, the inverse of _exact
+        self._digests: Dict[str, str] = {}
+        self._buckets: List[Dict[bytes, List[str]]] = [{} for _ in range(bands)]
+        self._signatures: Dict[str, np.ndarray] = {}
+        # canonical chunk ID -> every location its text appears, canonical first
+        self.refs: Dict[str, List[dict]] = {}
+        self.seen = 0
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+        self.chars_saved = 0
+
+    def signature(self, text: str) -> np.ndarray:
+        words = normalize(text).split()
+        n = self.shingle_size
+        shingles = {" ".join(words[i:i + n]) for i in range(max(1, len(words) - n + 1))}
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) & _PRIME for s in shingles),
+                             dtype=np.uint64, count=len(shingles))
+        return ((np.outer(self._a, hashes) + self._b[:, None]) % _PRIME).min(axis=1)
+
+    def add(self, chunk_id: str, text: str, ref: dict) -> Optional[str]:
+        """
+        Register a chunk. Returns the canonical ID of the chunk it duplicates,
+        or None when its text is new (chunk_id becomes canonical).
+        """
+        self.seen += 1
+        digest = hashlib.sha1(normalize(text).encode("utf-8")).hexdigest()
+        signature = None
+        canonical = self._exact.get(digest)
+        if canonical is not None:
+            self.exact_duplicates += 1
+        elif self.near_enabled:
+            signature = self.signature(text)
+            canonical = self._near_duplicate(signature)
+            if canonical is not None:
+                self.near_duplicates += 1
+        if canonical is not None:
+            self.chars_saved += len(text)
+            self.refs[canonical].append(ref)
+            return canonical
+
+        self._register(chunk_id, digest, signature, [ref])
+        return None
+
+    def seed(self, chunk_id: str, text: str, refs: List[dict]) -> None:
+        """Register a canonical chunk stored by an earlier run, with its known locations."""
+        digest = hashlib.sha1(normalize(text).encode("utf-8")).hexdigest()
+        if digest in self._exact:
+            return
+        signature = self.signature(text) if self.near_enabled else None
+        self._register(chunk_id, digest, signature, list(refs))
+
+    def restore(self, chunk_id: str, digest: str, signature: Optional[np.ndarray], refs: List[dict]) -> None:
+        """Register a canonical chunk from its saved state (see DedupStore), without its text."""
+        self._register(chunk_id, digest, signature if self.near_enabled else None, refs)
+
+    def state(self, chunk_id: str):
+        """(digest, signature or None, refs) of a canonical chunk, as DedupStore saves it."""
+        return self._digests[chunk_id], self._signatures.get(chunk_id), self.refs[chunk_id]
+
+    @property
+    def near_enabled(self) -> bool:
+        return self.threshold < 1
+
+    def _register(self, chunk_id: str, digest: str, signature: Optional[np.ndarray], refs: List[dict]) -> None:
+        self._exact[digest] = chunk_id
+        self._digests[chunk_id] = digest
+        self.refs[chunk_id] = refs
+        if signature is not None:
+            self._signatures[chunk_id] = signature
+            for band, key in enumerate(self._band_keys(signature)):
+                self._buckets[band].setdefault(key, []).append(chunk_id)
+
+    def _band_keys(self, signature: np.ndarray):
+        for band in range(self.bands):
+            yield signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def _near_duplicate(self, signature: np.ndarray) -> Optional[str]:
+        candidates = set()
+        for band, key in enumerate(self._band_keys(signature)):
+            candidates.update(self._buckets[band].get(key, ()))
+        best, best_score = None, self.threshold
+        for candidate in candidates:
+            score = float(np.mean(self._signatures[candidate] == signature))
+            if score >= best_score:
+                best, best_score = candidate, score
+        return best
+
+    def report(self) -> str:
+        duplicates = self.exact_duplicates + self.near_duplicates
+        share = duplicates / self.seen if self.seen else 0.0
+        return (f"Dedup: {duplicates} of {self.seen} chunks skipped ({share:.0%}; "
+                f"{self.exact_duplicates} exact, {self.near_duplicates} near), "
+                f"{self.chars_saved} characters not embedded")
+
+
+class DedupStore:
+    """
+    Canonical chunks of a ChunkDeduplicator persisted in SQLite, one row per
+    chunk: text digest, MinHash signature (when near-duplicate detection
+    computed one) and back-references. Written by the ingestion writer only,
+    under the manifest lock. The database is opened on first use.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                "chunk_id TEXT PRIMARY KEY, digest TEXT NOT NULL, signature BLOB, refs TEXT NOT NULL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def restore(self, deduper: ChunkDeduplicator, chunk_ids: Set[str]) -> None:
+        """
+        Register the stored chunks among chunk_ids as canonical. Rows of other
+        chunks (left by an interrupted run) are dropped; rows without the
+        signature near-duplicate detection needs are skipped, so the caller
+        seeds those chunks from their text.
+        """
+        conn = self._connect()
+        orphans = []
+        for chunk_id, digest, signature, refs in conn.execute("SELECT chunk_id, digest, signature, refs FROM chunks"):
+            if chunk_id not in chunk_ids:
+                orphans.append(chunk_id)
+            elif signature is not None:
+                deduper.restore(chunk_id, digest, np.frombuffer(signature, dtype=np.uint64), json.loads(refs))
+            elif not deduper.near_enabled:
+                deduper.restore(chunk_id, digest, None, json.loads(refs))
+        self.delete(orphans)
+
+    def save(self, deduper: ChunkDeduplicator, chunk_ids: Iterable[str]) -> None:
+        """Write (or overwrite) the rows of canonical chunks, e.g. after they are committed."""
+        rows = []
+        for chunk_id in chunk_ids:
+            digest, signature, refs = deduper.state(chunk_id)
+            rows.append((chunk_id, digest, None if signature is None else signature.tobytes(), json.dumps(refs)))
+        if rows:
+            conn = self._connect()
+            conn.executemany("INSERT OR REPLACE INTO chunks (chunk_id, digest, signature, refs) VALUES (?, ?, ?, ?)",
+                             rows)
+            conn.commit()
+
+    def update_refs(self, refs: Dict[str, List[dict]]) -> None:
+        """Replace the back-references of stored rows; chunks without a row are ignored."""
+        if refs:
+            conn = self._connect()
+            conn.executemany("UPDATE chunks SET refs = ? WHERE chunk_id = ?",
+                             [(json.dumps(chunk_refs), chunk_id) for chunk_id, chunk_refs in refs.items()])
+            conn.commit()
+
+    def delete(self, chunk_ids: Iterable[str]) -> None:
+        rows = [(chunk_id,) for chunk_id in chunk_ids]
+        if rows:
+            conn = self._connect()
+            conn.executemany("DELETE FROM chunks WHERE chunk_id = ?", rows)
+            conn.commit()
+
+    def clear(self) -> None:
+        conn = self._connect()
+        conn.execute("DELETE FROM chunks")
+        conn.commit()
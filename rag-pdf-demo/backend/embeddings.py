@@ -0,0 +1,178 @@
+"""
+embeddings.py: Batched embedding requests for the RAG PDF demo.
+
+Chunks are grouped into embedding requests capped by input count and total
+token count, so N chunks cost roughly N / batch_size round trips instead of N.
+Output order always matches input order.
+
+BatchEmbedder sends one request at a time on a sync client. AsyncBatchEmbedder
+keeps up to `concurrency` requests in flight on an async client, which is what
+actually uses provisioned throughput when latency dominates.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import AsyncIterator, Iterable, List, Sequence
+
+import openai
+
+from tokens import count_tokens
+
+
+# Inputs per embeddings request; Azure OpenAI accepts up to 2048, smaller
+# batches keep each request (and a retried one) quick
+MAX_BATCH_INPUTS = 256
+# Keep each request well below the per-request token limit
+MAX_BATCH_TOKENS = 100_000
+# Requests kept in flight by AsyncBatchEmbedder
+EMBED_CONCURRENCY = 8
+
+
+def is_input_error(error: Exception) -> bool:
+    """
+    Whether the request failed because of its inputs (400 Bad Request), so
+    splitting the batch can isolate the bad input. Rate limits, timeouts and
+    server errors are not: splitting would only send more requests to a
+    struggling endpoint (the client's own retries handle those).
+    """
+    return isinstance(error, openai.BadRequestError)
+
+
+def make_batches(
+    token_counts: Sequence[int],
+    max_inputs: int = MAX_BATCH_INPUTS,
+    max_tokens: int = MAX_BATCH_TOKENS,
+) -> List[range]:
+    """
+    Group consecutive inputs into batches capped by input and token count.
+    Returns index ranges so callers can map results back in order.
+    An input larger than max_tokens gets a batch of its own.
+    """
+    batches = []
+    start = 0
+    batch_tokens = 0
+    for i, tokens in enumerate(token_counts):
+        batch_len = i - start
+        if batch_len and (batch_len >= max_inputs or batch_tokens + tokens > max_tokens):
+            batches.append(range(start, i))
+            start = i
+            batch_tokens = 0
+        batch_tokens += tokens
+    if start < len(token_counts):
+        batches.append(range(start, len(token_counts)))
+    return batches
+
+
+class BatchEmbedder:
+    """
+    Embed texts through an OpenAI-compatible client in token-aware batches.
+    A batch rejected for its inputs is split in half and each half retried,
+    so one bad input only fails itself; other errors are raised unchanged.
+    Counters from the last run are kept on the instance.
+    """
+
+    def __init__(self, client, model: str, max_inputs: int = MAX_BATCH_INPUTS,
+                 max_tokens: int = MAX_BATCH_TOKENS):
+        self.client = client
+        self.model = model
+        self.max_inputs = max_inputs
+        self.max_tokens = max_tokens
+        self.requests = 0
+        self.embedded = 0
+        self.elapsed = 0.0
+
+    @property
+    def embeddings_per_sec(self) -> float:
+        return self.embedded / self.elapsed if self.elapsed else 0.0
+
+    def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        """Embed all texts, preserving input order."""
+        start = time.perf_counter()
+        self.requests = 0
+        embeddings: List[List[float]] = []
+        batches = make_batches(count_tokens(texts), self.max_inputs, self.max_tokens)
+        for batch in batches:
+            embeddings.extend(self._embed_batch([texts[i] for i in batch]))
+        self.embedded = len(embeddings)
+        self.elapsed = time.perf_counter() - start
+        return embeddings
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        self.requests += 1
+        try:
+            response = self.client.embeddings.create(input=texts, model=self.model)
+        except Exception as e:
+            if len(texts) == 1 or not is_input_error(e):
+                raise
+            mid = len(texts) // 2
+            return self._embed_batch(texts[:mid]) + self._embed_batch(texts[mid:])
+        # The API returns an index per item; don't rely on response ordering
+        return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+
+class AsyncBatchEmbedder:
+    """
+    Async counterpart of BatchEmbedder with a bounded in-flight window.
+    At most `concurrency` batches are requested at once and results are
+    yielded in batch order, so memory stays flat however many texts stream in.
+    A batch rejected for its inputs is split like in BatchEmbedder, but its
+    halves are sent one after the other within the batch's own slot, so
+    retries never exceed the window.
+    """
+
+    def __init__(self, client, model: str, concurrency: int = EMBED_CONCURRENCY,
+                 max_inputs: int = MAX_BATCH_INPUTS, max_tokens: int = MAX_BATCH_TOKENS):
+        self.client = client
+        self.model = model
+        self.concurrency = concurrency
+        self.max_inputs = max_inputs
+        self.max_tokens = max_tokens
+        self.requests = 0
+        self.embedded = 0
+        self.elapsed = 0.0
+
+    @property
+    def embeddings_per_sec(self) -> float:
+        return self.embedded / self.elapsed if self.elapsed else 0.0
+
+    async def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        """Embed all texts concurrently, preserving input order."""
+        start = time.perf_counter()
+        self.requests = 0
+        embeddings: List[List[float]] = []
+        batches = make_batches(count_tokens(texts), self.max_inputs, self.max_tokens)
+        async for batch_embeddings in self.iter_batches([texts[i] for i in batch] for batch in batches):
+            embeddings.extend(batch_embeddings)
+        self.embedded = len(embeddings)
+        self.elapsed = time.perf_counter() - start
+        return embeddings
+
+    async def iter_batches(self, batches: Iterable[List[str]]) -> AsyncIterator[List[List[float]]]:
+        """
+        Embed batches pulled lazily from `batches`, yielding results in order.
+        A new batch is only pulled once a slot in the window frees up, which
+        is the backpressure that keeps upstream producers from running ahead.
+        """
+        pending = deque()
+        try:
+            for batch in batches:
+                pending.append(asyncio.create_task(self._embed_batch(batch)))
+                if len(pending) >= self.concurrency:
+                    yield await pending.popleft()
+            while pending:
+                yield await pending.popleft()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        self.requests += 1
+        try:
+            response = await self.client.embeddings.create(input=texts, model=self.model)
+        except Exception as e:
+            if len(texts) == 1 or not is_input_error(e):
+                raise
+            mid = len(texts) // 2
+            left = await self._embed_batch(texts[:mid])
+            return left + await self._embed_batch(texts[mid:])
+        return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
@@ -0,0 +1,262 @@
+"""
+flat_index.py: In-process exact vector index on a NumPy matrix.
+
+An alternative to Chroma for retrieval. Chunk embeddings are L2-normalized and
+kept in one contiguous float32 matrix, so top-k for a batch of queries is a
+single BLAS matmul followed by argpartition, with no per-query client overhead.
+On disk an index is a directory with two append-only files:
+    vectors.npy   the (rows, dim) matrix, memory-mapped by readers
+    chunks.jsonl  one add/update/delete record per line, replayed on open
+Rows are appended in place: numpy pads the .npy header so the shape can grow
+without moving the data. Overwritten and deleted rows become tombstones, and
+the files are compacted once tombstones outnumber live rows.
+
+Compaction writes both files to temporaries and replaces chunks.jsonl last. A
+crash between the two replaces leaves the compacted matrix next to the old
+log, with fewer rows than the log has records; load() detects that and maps the
+log's live chunks onto the compacted rows, and the writer finishes the
+compaction before its next write.
+
+FlatIndex implements the part of Chroma's Collection API that ingest.py and
+main.py use (upsert, update, delete, count, get, query), so either store can back
+retrieval. One process writes (ingestion); any number of processes read and
+call load() to pick up new records.
+"""
+import io
+import json
+import os
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+VECTORS_FILE = "vectors.npy"
+CHUNKS_FILE = "chunks.jsonl"
+# Largest (queries x rows) score matrix computed at once; bigger query batches are split
+MAX_SCORE_ELEMENTS = 1 << 25
+
+
+def normalize(vectors) -> np.ndarray:
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+def _npy_header(shape) -> bytes:
+    # Same length for any row count (numpy reserves room for the shape to grow)
+    buffer = io.BytesIO()
+    np.lib.format.write_array_header_1_0(buffer, {"descr": "<f4", "fortran_order": False, "shape": shape})
+    return buffer.getvalue()
+
+
+class FlatIndex:
+    def __init__(self, path: str):
+        self.path = path
+        self.vectors_path = os.path.join(path, VECTORS_FILE)
+        self.chunks_path = os.path.join(path, CHUNKS_FILE)
+        self._reset()
+        self.load()
+
+    def _reset(self) -> None:
+        self.ids: List[str] = []
+        self.documents: List[str] = []
+        self.metadatas: List[dict] = []
+        self.dim: Optional[int] = None
+        # live chunk ID -> row; rows missing from here are tombstones
+        self._row_of: Dict[str, int] = {}
+        self._dead: List[int] = []
+        self._offset = 0
+        self._inode = None
+        # The matrix is compacted but chunks.jsonl is not (interrupted compact())
+        self._compaction_pending = False
+        # (rows, matrix, dead rows) used by queries. Replaced as a whole, so a
+        # query running on another thread never sees a half-applied load.
+        self._view = (0, None, np.empty(0, dtype=np.int64))
+
+    def load(self) -> None:
+        """Apply records appended since the last load, by this or another process."""
+        try:
+            stat = os.stat(self.chunks_path)
+        except FileNotFoundError:
+            if self._inode is not None:
+                self._reset()
+            return
+        if stat.st_ino != self._inode or stat.st_size < self._offset:
+            # First load, or the files were compacted: replay from the start
+            self._reset()
+            self._inode = stat.st_ino
+        with open(self.chunks_path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read()
+        # A writer may be mid-line; stop at the last complete record
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            self._apply(json.loads(line))
+        self._offset += end
+        matrix = np.load(self.vectors_path, mmap_mode="r") if self.ids else None
+        if matrix is not None and len(matrix) < len(self.ids):
+            self._recover_compaction(len(matrix))
+        rows = len(self.ids)
+        matrix = matrix[:rows] if rows else None
+        if matrix is not None:
+            self.dim = matrix.shape[1]
+        self._view = (rows, matrix, np.array(self._dead, dtype=np.int64))
+
+    def _recover_compaction(self, rows: int) -> None:
+        """Renumber the live chunks to the rows of a matrix that compact() replaced before the log."""
+        live = sorted(self._row_of.values())
+        if len(live) != rows:
+            raise ValueError(f"{self.vectors_path} has {rows} rows but {self.chunks_path} has {len(live)} live chunks")
+        self.ids = [self.ids[row] for row in live]
+        self.documents = [self.documents[row] for row in live]
+        self.metadatas = [self.metadatas[row] for row in live]
+        self._row_of = {chunk_id: row for row, chunk_id in enumerate(self.ids)}
+        self._dead = []
+        self._compaction_pending = True
+
+    def _apply(self, record: dict) -> None:
+        chunk_id = record["id"]
+        if record["op"] == "add":
+            previous = self._row_of.get(chunk_id)
+            if previous is not None:
+                self._dead.append(previous)
+            self._row_of[chunk_id] = len(self.ids)
+            self.ids.append(chunk_id)
+            self.documents.append(record["document"])
+            self.metadatas.append(record["metadata"])
+        elif record["op"] == "update":
+            row = self._row_of.get(chunk_id)
+            if row is not None:
+                self.metadatas[row] = {**self.metadatas[row], **record["metadata"]}
+        elif record["op"] == "delete":
+            row = self._row_of.pop(chunk_id, None)
+            if row is not None:
+                self._dead.append(row)
+
+    @property
+    def view(self):
+        """(rows, matrix, dead rows) as of the last load; safe to use from any thread."""
+        return self._view
+
+    @property
+    def generation(self):
+        """Changes when compaction renumbers rows."""
+        # Recovering an interrupted compaction renumbers rows without a new log file
+        return -self._inode if self._compaction_pending else self._inode
+
+    def count(self) -> int:
+        return len(self._row_of)
+
+    def get(self, ids: Sequence[str]) -> dict:
+        """Documents and metadata for live chunk IDs (unknown IDs are skipped), like Chroma's get."""
+        rows = [self._row_of[chunk_id] for chunk_id in ids if chunk_id in self._row_of]
+        return {
+            "ids": [self.ids[row] for row in rows],
+            "documents": [self.documents[row] for row in rows],
+            "metadatas": [self.metadatas[row] for row in rows],
+        }
+
+    def upsert(self, ids: Sequence[str], embeddings, documents: Sequence[str],
+               metadatas: Optional[Sequence[dict]] = None) -> None:
+        if not len(ids):
+            return
+        self._append_vectors(normalize(embeddings))
+        metadatas = metadatas or [{}] * len(ids)
+        self._write([
+            {"op": "add", "id": chunk_id, "document": document, "metadata": metadata}
+            for chunk_id, document, metadata in zip(ids, documents, metadatas)
+        ])
+
+    def update(self, ids: Sequence[str], metadatas: Sequence[dict]) -> None:
+        self._write([
+            {"op": "update", "id": chunk_id, "metadata": metadata}
+            for chunk_id, metadata in zip(ids, metadatas) if chunk_id in self._row_of
+        ])
+
+    def delete(self, ids: Sequence[str]) -> None:
+        self._write([{"op": "delete", "id": chunk_id} for chunk_id in ids if chunk_id in self._row_of])
+        if len(self._dead) > len(self._row_of):
+            self.compact()
+
+    def _append_vectors(self, vectors: np.ndarray) -> None:
+        if self.dim is not None and vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-dimensional embeddings, got {vectors.shape[1]}")
+        if self._compaction_pending:
+            self.compact()
+        os.makedirs(self.path, exist_ok=True)
+        rows = len(self.ids)
+        header = _npy_header((rows + len(vectors), vectors.shape[1]))
+        mode = "r+b" if os.path.exists(self.vectors_path) else "w+b"
+        with open(self.vectors_path, mode) as f:
+            # Rows beyond len(ids) are leftovers of an interrupted write; overwrite them
+            f.seek(len(header) + rows * vectors.shape[1] * 4)
+            f.write(vectors.tobytes())
+            f.truncate()
+            # Publish the new shape only once its rows are on disk
+            f.seek(0)
+            f.write(header)
+        self.dim = vectors.shape[1]
+
+    def _write(self, records: List[dict]) -> None:
+        if not records:
+            return
+        if self._compaction_pending:
+            self.compact()
+        os.makedirs(self.path, exist_ok=True)
+        with open(self.chunks_path, "ab") as f:
+            f.write(b"".join(json.dumps(record).encode("utf-8") + b"\n" for record in records))
+        self.load()
+
+    def compact(self) -> None:
+        """Rewrite both files without tombstoned rows."""
+        _, matrix, _ = self._view
+        live = sorted(self._row_of.values())
+        vectors = np.ascontiguousarray(matrix[live]) if live else np.empty((0, self.dim or 0), np.float32)
+        with open(f"{self.vectors_path}.tmp", "wb") as f:
+            f.write(_npy_header(vectors.shape))
+            f.write(vectors.tobytes())
+        with open(f"{self.chunks_path}.tmp", "wb") as f:
+            for row in live:
+                record = {"op": "add", "id": self.ids[row], "document": self.documents[row],
+                          "metadata": self.metadatas[row]}
+                f.write(json.dumps(record).encode("utf-8") + b"\n")
+        # The log goes last: until it is replaced, load() maps the old log onto the new matrix.
+        # Readers notice the new chunks file (different inode) and replay it
+        os.replace(f"{self.vectors_path}.tmp", self.vectors_path)
+        os.replace(f"{self.chunks_path}.tmp", self.chunks_path)
+        self._reset()
+        self.load()
+
+    def query(self, query_embeddings, n_results: int = 10) -> dict:
+        """
+        Exact top-k by cosine similarity for each query, shaped like Chroma's
+        query result. Distances are squared L2 between the unit vectors
+        (2 - 2 * cosine), the scale Chroma's default space reports.
+        """
+        rows, matrix, dead = self._view
+        queries = normalize(query_embeddings)
+        k = min(n_results, rows - len(dead))
+        if k <= 0:
+            return self.results([[] for _ in queries], [[] for _ in queries])
+        top_rows, top_scores = [], []
+        block = max(1, MAX_SCORE_ELEMENTS // rows)
+        for start in range(0, len(queries), block):
+            scores = queries[start:start + block] @ matrix.T
+            if len(dead):
+                scores[:, dead] = -np.inf
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-scores, axis=1)
+            top_rows.extend(np.take_along_axis(top, order, axis=1).tolist())
+            top_scores.extend(np.take_along_axis(scores, order, axis=1).tolist())
+        return self.results(top_rows, top_scores)
+
+    def results(self, rows: List[List[int]], scores: List[List[float]]) -> dict:
+        """Chroma-shaped query result for per-query rows and cosine similarities."""
+        return {
+            "ids": [[self.ids[row] for row in query_rows] for query_rows in rows],
+            "documents": [[self.documents[row] for row in query_rows] for query_rows in rows],
+            "metadatas": [[self.metadatas[row] for row in query_rows] for query_rows in rows],
+            "distances": [[2 - 2 * score for score in query_scores] for query_scores in scores],
+        }
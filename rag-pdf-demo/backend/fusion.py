@@ -0,0 +1,22 @@
+"""
+fusion.py: Reciprocal rank fusion of several ranked candidate lists.
+
+RRF scores a candidate by the sum of 1 / (k + rank) over the lists it appears
+in. It needs no score calibration between retrievers (BM25 scores and
+embedding distances are on unrelated scales), and a candidate ranked well by
+both retrievers beats one ranked first by only one of them.
+"""
+from typing import Dict, List, Sequence, Tuple
+
+
+# Damping constant from the original RRF paper; larger flattens the rank curve
+RRF_K = 60
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = RRF_K) -> List[Tuple[str, float]]:
+    """Fuse ranked ID lists (best first) into one (ID, score) list, best first."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: -item[1])
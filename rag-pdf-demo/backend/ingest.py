@@ -2,26 +2,70 @@
 ingest.py: Ingestion pipeline for RAG PDF demo.
 Steps:
 	- Load PDFs from data directory
-	- Chunk text for semantic search
+	- Chunk text into token-sized, overlapping chunks for semantic search
 	- Generate embeddings using Azure OpenAI
-	- Store chunks and embeddings in ChromaDB vectorstore
+	- Store chunks and embeddings in ChromaDB vectorstore (or the flat NumPy index, RETRIEVAL_BACKEND=flat|ivfpq)
+
+Ingestion is incremental: a manifest of per-file content hashes decides which
+PDFs are new, changed or removed, and only those are processed. Processing is
+streamed in bounded batches, so memory does not grow with corpus size.
 """
 
 # Standard library
+import asyncio
+import glob
+import itertools
+import json
 import os
-# LangChain for PDF loading and text splitting
-from langchain_community.document_loaders import PyPDFLoader, DirectoryLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-# Azure OpenAI client
-from openai import AzureOpenAI
-# ChromaDB for vectorstore
-import chromadb
+import sys
+# Azure OpenAI clients
+from openai import AsyncAzureOpenAI, AzureOpenAI, DefaultAsyncHttpxClient
+import httpx
+# Persistent ChromaDB vectorstore shared with the query API
+from vectorstore import (
+	ANN_INDEX_PATH, BM25_INDEX_PATH, CHROMA_COLLECTION_NAME, FLAT_INDEX_PATH, RETRIEVAL_BACKEND, VECTORSTORE_DIR, VERSION_PATH,
+	bump_version, open_client,
+)
+from flat_index import FlatIndex
+from ann_index import IVFPQIndex
+from bm25 import BM25Index
+# Batched, token-aware embedding requests
+from embeddings import (
+	AsyncBatchEmbedder,
+	BatchEmbedder,
+	EMBED_CONCURRENCY,
+	MAX_BATCH_INPUTS,
+	MAX_BATCH_TOKENS,
+)
+# Token-sized chunking
+from tokens import CHUNK_OVERLAP_TOKENS, CHUNK_TOKENS, TokenTextSplitter
+# Exact and near-duplicate chunk elimination
+from dedup import ChunkDeduplicator, DedupStore, DEDUP_THRESHOLD
+# Process-pool PDF parsing
+from pdf_loader import ParallelPDFLoader, PARSE_TIMEOUT, PARSE_WORKERS
+# Per-file manifest and deterministic chunk IDs for incremental ingestion
+from manifest import IngestManifest, chunk_id, file_sha256
+# Repo-level shared utilities (embedding cache shared with the notebooks)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from shared.embedding_cache import EmbeddingCache
 
 
 # Path to PDF data
 DATA_PATH = "./data/"
 # (Unused) FAISS path stub
 DB_FAISS_PATH = "vectorstore/db_faiss"
+# Manifest of ingested files (hashes, mtimes, chunk IDs), kept next to the store it describes;
+# one per backend, so switching backends rebuilds the new store instead of trusting the old manifest
+# (flat and ivfpq share the flat store, so they share its manifest)
+MANIFEST_PATH = os.path.join(
+	VECTORSTORE_DIR, "ingest_manifest.json" if RETRIEVAL_BACKEND == "chroma" else "ingest_manifest.flat.json"
+)
+# Pages tokenized together in one batched encode call
+SPLIT_BATCH_SIZE = 64
+# Chunks embedded and upserted per streaming commit
+COMMIT_BATCH_SIZE = 1024
+# Stored chunks read per request when seeding the deduplicator or pruning back-references
+STORE_READ_BATCH_SIZE = 1000
 
 
 # Load environment variables from .env
@@ -35,6 +79,10 @@ AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
 AZURE_OPENAI_API_BASE = os.getenv("AZURE_OPENAI_API_BASE")
 AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION")
 AZURE_OPENAI_DEPLOYMENT = os.getenv("AZURE_OPENAI_DEPLOYMENT")
+# Deployment used for embeddings; main.py embeds queries with the same one
+AZURE_OPENAI_EMBEDDING_DEPLOYMENT = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT", AZURE_OPENAI_DEPLOYMENT)
+# Embedding requests kept in flight; 1 uses the sync client one request at a time
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", EMBED_CONCURRENCY))
 
 # Create AzureOpenAI client for embedding generation
 client = AzureOpenAI(
@@ -44,71 +92,457 @@ client = AzureOpenAI(
 )
 
 
+def create_async_client(concurrency=INGEST_CONCURRENCY):
+	"""
+	Create an AsyncAzureOpenAI client whose connection pool matches the
+	concurrency window, so every in-flight request reuses a kept-alive connection.
+	"""
+	return AsyncAzureOpenAI(
+		api_key=AZURE_OPENAI_API_KEY,
+		api_version=AZURE_OPENAI_API_VERSION,
+		azure_endpoint=AZURE_OPENAI_API_BASE,
+		http_client=DefaultAsyncHttpxClient(
+			limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+		),
+	)
+
+
 # PDFIngestor: Handles loading, chunking, embedding, and storing
 
 
 
 class PDFIngestor:
-	def __init__(self, data_path=DATA_PATH):
+	def __init__(self, data_path=DATA_PATH, batch_size=MAX_BATCH_INPUTS, max_batch_tokens=MAX_BATCH_TOKENS,
+			concurrency=INGEST_CONCURRENCY, embedding_cache=None, chroma_client=None,
+			manifest_path=MANIFEST_PATH, commit_batch_size=COMMIT_BATCH_SIZE,
+			parse_workers=PARSE_WORKERS, parse_timeout=PARSE_TIMEOUT, version_path=VERSION_PATH,
+			chunk_tokens=CHUNK_TOKENS, chunk_overlap_tokens=CHUNK_OVERLAP_TOKENS, dedup_threshold=DEDUP_THRESHOLD,
+			backend=RETRIEVAL_BACKEND, flat_index_path=FLAT_INDEX_PATH, ann_index_path=ANN_INDEX_PATH,
+			bm25_path=BM25_INDEX_PATH, dedup_path=None):
 		self.data_path = data_path
+		# None disables deduplication; 1.0 keeps exact-duplicate removal only
+		self.dedup_threshold = dedup_threshold
+		self.text_splitter = TokenTextSplitter(chunk_tokens, chunk_overlap_tokens)
+		self.loader = ParallelPDFLoader(workers=parse_workers, timeout=parse_timeout)
+		self.commit_batch_size = commit_batch_size
+		self.batch_size = batch_size
+		self.max_batch_tokens = max_batch_tokens
+		self.concurrency = concurrency
+		# Content-addressed cache consulted before calling the embeddings API
+		self.embedding_cache = embedding_cache if embedding_cache is not None else EmbeddingCache()
+		# "chroma", "flat" or "ivfpq"; the stores take the same upsert/update/delete calls
+		self.backend = backend
+		if chroma_client is None and backend == "chroma":
+			chroma_client = open_client()
+		self.chroma_client = chroma_client
+		self.flat_index_path = flat_index_path
+		self.ann_index_path = ann_index_path
+		self._flat_index = None
+		# BM25 index kept in step with the vector store, for hybrid retrieval; None disables it
+		self.lexical_index = BM25Index(bm25_path) if bm25_path else None
+		self.version_path = version_path
+		self.manifest = IngestManifest(manifest_path)
+		# Deduplicator state of the stored chunks, next to the manifest that lists them
+		self.dedup_store = DedupStore(dedup_path or f"{os.path.splitext(manifest_path)[0]}.dedup.sqlite")
+
+	def list_pdfs(self):
+		"""
+		List PDF files in the data directory in a stable order.
+		"""
+		return sorted(glob.glob(os.path.join(self.data_path, "*.pdf")))
+
+	def iter_files(self, file_hashes):
+		"""
+		Parse PDFs in parallel and yield (path, file hash, pages) in path order.
+		pages is None for files that failed to parse or timed out.
+		file_hashes maps path -> content hash, stored on each page's metadata.
+		"""
+		for path, pages in self.loader.iter_files(file_hashes):
+			for document in pages or []:
+				document.metadata["source"] = path
+				document.metadata["file_hash"] = file_hashes[path]
+			yield path, file_hashes[path], pages
+
+	def iter_pages(self, file_hashes):
+		"""
+		Lazily yield one Document per PDF page, file by file.
+		"""
+		for _, _, pages in self.iter_files(file_hashes):
+			yield from pages or []
 
-	def load_pdfs(self):
+	def load_pdfs(self, file_hashes=None):
 		"""
-		Load all PDF files from the data directory using LangChain.
+		Load PDF files using LangChain, one Document per page.
+		file_hashes maps path -> content hash and limits loading to those files;
+		by default every PDF in the data directory is loaded and hashed.
 		"""
-		loader = DirectoryLoader(self.data_path, glob="*.pdf", loader_cls=PyPDFLoader)
-		documents = loader.load()
-		print(f"Loaded {len(documents)} documents from {self.data_path}")
+		if file_hashes is None:
+			file_hashes = {path: file_sha256(path) for path in self.list_pdfs()}
+		documents = list(self.iter_pages(file_hashes))
+		print(f"Loaded {len(documents)} documents from {len(file_hashes)} files in {self.data_path}")
 		return documents
 
+	def iter_chunks(self, documents):
+		"""
+		Lazily split documents into token-sized chunks, encoding a bounded group
+		of documents per batch. Each chunk gets a deterministic ID from
+		(file hash, page, offset).
+		"""
+		documents = iter(documents)
+		while True:
+			group = list(itertools.islice(documents, SPLIT_BATCH_SIZE))
+			if not group:
+				return
+			for chunk in self.text_splitter.split_documents(group):
+				metadata = chunk.metadata
+				metadata["chunk_id"] = chunk_id(metadata["file_hash"], metadata.get("page", 0), metadata["start_index"])
+				yield chunk
+
 	def chunk_text(self, documents):
 		"""
 		Split loaded documents into smaller chunks for semantic search.
 		"""
-		text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-		chunks = text_splitter.split_documents(documents)
+		chunks = list(self.iter_chunks(documents))
 		print(f"Split documents into {len(chunks)} chunks")
 		return chunks
 
 	def generate_embeddings(self, chunks):
 		"""
 		Generate embeddings for each chunk using Azure OpenAI.
-		Each chunk is sent to the embedding endpoint; results are collected.
+		Chunks are sent in batches capped by input count and token count;
+		results come back in chunk order. With concurrency > 1, batches are
+		requested concurrently on the async client.
+		Chunks already in the embedding cache are not sent at all.
 		"""
 		texts = [chunk.page_content for chunk in chunks]
-		embeddings = []
-		for text in texts:
-			response = client.embeddings.create(
-				input=[text],
-				model=AZURE_OPENAI_DEPLOYMENT
+		embeddings = self.embedding_cache.get_many(texts, AZURE_OPENAI_EMBEDDING_DEPLOYMENT)
+		missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+		if missing:
+			missing_texts = [texts[i] for i in missing]
+			embedder, new_embeddings = self._embed_texts(missing_texts)
+			self.embedding_cache.put_many(missing_texts, AZURE_OPENAI_EMBEDDING_DEPLOYMENT, new_embeddings)
+			for i, embedding in zip(missing, new_embeddings):
+				embeddings[i] = embedding
+			print(
+				f"Generated {len(new_embeddings)} embeddings in {embedder.requests} requests "
+				f"({embedder.embeddings_per_sec:.1f} embeddings/sec)"
 			)
-			embeddings.append(response.data[0].embedding)
-		print(f"Generated {len(embeddings)} embeddings")
+		print(
+			f"Embedding cache: {len(texts) - len(missing)} hits, {len(missing)} misses "
+			f"(lifetime hit rate {self.embedding_cache.hit_rate:.0%})"
+		)
 		return texts, embeddings
 
-	def build_vectorstore(self, texts, embeddings):
+	def _embed_texts(self, texts):
+		"""
+		Embed texts through the API, concurrently when concurrency > 1.
+		Returns the embedder (for its counters) and the embeddings.
+		"""
+		if self.concurrency > 1:
+			return asyncio.run(self._generate_embeddings_async(texts))
+		embedder = BatchEmbedder(
+			client,
+			AZURE_OPENAI_EMBEDDING_DEPLOYMENT,
+			max_inputs=self.batch_size,
+			max_tokens=self.max_batch_tokens,
+		)
+		return embedder, embedder.embed(texts)
+
+	async def _generate_embeddings_async(self, texts):
+		"""
+		Embed texts with AsyncBatchEmbedder on a pooled async client.
+		"""
+		async with create_async_client(self.concurrency) as async_client:
+			embedder = AsyncBatchEmbedder(
+				async_client,
+				AZURE_OPENAI_EMBEDDING_DEPLOYMENT,
+				concurrency=self.concurrency,
+				max_inputs=self.batch_size,
+				max_tokens=self.max_batch_tokens,
+			)
+			embeddings = await embedder.embed(texts)
+		return embedder, embeddings
+
+	def get_collection(self):
+		"""
+		Open (or create) the store shared with the query API: the Chroma
+		collection, or the flat index when backend is "flat" or "ivfpq".
+		"""
+		if self.backend in ("flat", "ivfpq"):
+			if self._flat_index is None:
+				self._flat_index = FlatIndex(self.flat_index_path)
+			return self._flat_index
+		return self.chroma_client.get_or_create_collection(name=CHROMA_COLLECTION_NAME)
+
+	def reload_stores(self):
+		"""
+		Pick up what other writers committed since this ingestor last wrote, so
+		a long-lived ingestor (the API worker) never appends after stale state.
+		Call with the manifest lock held.
+		"""
+		if self._flat_index is not None:
+			self._flat_index.load()
+
+	@staticmethod
+	def _ref_metadata(refs):
+		"""
+		Back-references of a canonical chunk, flattened for Chroma's scalar metadata.
+		"""
+		return {"duplicates": len(refs) - 1, "locations": json.dumps(refs)}
+
+	@staticmethod
+	def _stored_refs(metadata):
+		"""
+		Back-references of a stored chunk; a chunk stored without them (dedup
+		disabled) has only its own location.
+		"""
+		if "locations" in metadata:
+			return json.loads(metadata["locations"])
+		return [{"source": metadata["source"], "page": metadata.get("page", 0), "start_index": metadata["start_index"]}]
+
+	def _iter_stored(self, chunk_ids):
+		"""Yield (chunk ID, document, metadata) of stored chunks, a bounded batch per read."""
+		collection = self.get_collection()
+		for start in range(0, len(chunk_ids), STORE_READ_BATCH_SIZE):
+			stored = collection.get(ids=chunk_ids[start:start + STORE_READ_BATCH_SIZE])
+			yield from zip(stored["ids"], stored["documents"], stored["metadatas"])
+
+	def load_deduplicator(self):
+		"""
+		A ChunkDeduplicator seeded with the canonical chunks of every file in the
+		manifest, so chunks duplicating earlier runs are not embedded again and
+		their locations are added to the stored chunk. None disables dedup.
+		The chunks are restored from the dedup store; only chunks it lacks (a
+		store written before it existed, or while dedup was off) are read back
+		and hashed, and then saved to it.
+		"""
+		if self.dedup_threshold is None:
+			return None
+		deduper = ChunkDeduplicator(self.dedup_threshold)
+		stored_ids = {cid for entry in self.manifest.files.values() for cid in entry["chunk_ids"]}
+		self.dedup_store.restore(deduper, stored_ids)
+		missing = sorted(stored_ids - deduper.refs.keys())
+		for stored_id, document, metadata in self._iter_stored(missing):
+			deduper.seed(stored_id, document, self._stored_refs(metadata))
+		self.dedup_store.save(deduper, [cid for cid in missing if cid in deduper.refs])
+		return deduper
+
+	def remove_files(self, paths):
+		"""
+		Drop files from the manifest and delete the chunks no other file uses.
+		Canonical chunks that other files still use lose the removed files'
+		back-references; if the chunk's own location was removed, its first
+		remaining location takes over. Returns the deleted chunk IDs.
+		"""
+		paths = set(paths)
+		used_ids = {cid for path in paths for cid in self.manifest.files.get(path, {}).get("chunk_ids", [])}
+		stale_ids = self.manifest.remove(paths)
+		kept_ids = sorted(used_ids - set(stale_ids))
+		if stale_ids:
+			self.delete_chunks(stale_ids)
+			self.dedup_store.delete(stale_ids)
+		ids, metadatas, kept_refs = [], [], {}
+		for stored_id, _, metadata in self._iter_stored(kept_ids):
+			stored_refs = self._stored_refs(metadata)
+			refs = [ref for ref in stored_refs if ref["source"] not in paths]
+			if not refs:
+				# Identical files share chunk IDs, and the surviving copy has no ref of its own
+				owner = next(path for path, entry in self.manifest.files.items() if stored_id in entry["chunk_ids"])
+				refs = [{**stored_refs[0], "source": owner}]
+			first = refs[0]
+			owner_entry = self.manifest.files.get(first["source"], {})
+			ids.append(stored_id)
+			kept_refs[stored_id] = refs
+			metadatas.append({
+				"source": first["source"],
+				"page": first.get("page", 0),
+				"start_index": first["start_index"],
+				"file_hash": owner_entry.get("sha256", metadata.get("file_hash")),
+				**self._ref_metadata(refs),
+			})
+		if ids:
+			self.get_collection().update(ids=ids, metadatas=metadatas)
+			self.dedup_store.update_refs(kept_refs)
+		if stale_ids or ids:
+			bump_version(self.version_path)
+		return stale_ids
+
+	def build_vectorstore(self, chunks, embeddings, refs=None):
 		"""
-		Store chunk texts and their embeddings in ChromaDB vectorstore.
-		Each chunk is assigned a unique ID.
+		Upsert chunk texts, embeddings and source metadata into the vector store.
+		Chunk IDs are deterministic, so re-ingesting a file overwrites its chunks.
+		refs maps canonical chunk IDs to every location their text appears.
 		"""
-		client = chromadb.Client()
-		collection = client.create_collection(name="pdf_chunks")
-		ids = [str(i) for i in range(len(texts))]
-		collection.add(documents=texts, embeddings=embeddings, ids=ids)
-		print(f"Stored {len(texts)} chunks in ChromaDB")
+		# Identical files produce identical IDs; Chroma rejects duplicates in one call
+		first_index = {}
+		for i, chunk in enumerate(chunks):
+			first_index.setdefault(chunk.metadata["chunk_id"], i)
+		chunks = [chunks[i] for i in first_index.values()]
+		embeddings = [embeddings[i] for i in first_index.values()]
+		metadatas = []
+		for chunk in chunks:
+			metadata = {
+				"source": chunk.metadata["source"],
+				"page": chunk.metadata.get("page", 0),
+				"start_index": chunk.metadata["start_index"],
+				"file_hash": chunk.metadata["file_hash"],
+			}
+			if refs and chunk.metadata["chunk_id"] in refs:
+				metadata.update(self._ref_metadata(refs[chunk.metadata["chunk_id"]]))
+			metadatas.append(metadata)
+		ids = [chunk.metadata["chunk_id"] for chunk in chunks]
+		documents = [chunk.page_content for chunk in chunks]
+		collection = self.get_collection()
+		collection.upsert(ids=ids, documents=documents, embeddings=embeddings, metadatas=metadatas)
+		if self.lexical_index is not None:
+			self.lexical_index.add(ids, documents)
+		print(f"Stored {len(chunks)} chunks in the {self.backend} store")
+
+	def delete_chunks(self, chunk_ids):
+		"""Remove chunks from the vector store and the lexical index."""
+		self.get_collection().delete(ids=chunk_ids)
+		if self.lexical_index is not None:
+			self.lexical_index.delete(chunk_ids)
+
+	def ingest_paths(self, paths, on_commit=None):
+		"""
+		Incrementally ingest specific files (e.g. fresh uploads) without
+		scanning the whole data directory. Unchanged files are skipped.
+		Holds the manifest lock, so an offline run and the API worker take turns.
+		"""
+		with self.manifest.locked():
+			self.reload_stores()
+			changed, _ = self.manifest.diff(paths)
+			self.remove_files(changed)
+			self.manifest.save()
+			if on_commit:
+				on_commit([path for path in paths if path not in changed], 0)
+			return self.ingest_files(changed, on_commit) if changed else 0
+
+	def ingest_files(self, file_hashes, on_commit=None):
+		"""
+		Streaming pipeline for the given {path: file hash} files.
+		PDFs are parsed in a process pool a bounded window ahead and chunked as
+		they arrive; every commit_batch_size chunks are embedded and upserted, so
+		memory stays flat regardless of corpus size. A file is recorded in the
+		manifest once all of its chunks are committed, so a crash keeps everything
+		already stored and the next run only redoes the unfinished files.
+		Duplicate chunks, of this run's or of stored chunks, are dropped before
+		embedding; the file records the canonical chunk's ID instead, so the
+		canonical chunk is only deleted once no file uses it.
+		on_commit(finished_paths, chunks_committed) is called after every commit;
+		files that fail to parse are never reported and are listed at the end.
+		Callers other than run() and ingest_paths() should hold manifest.locked().
+		"""
+		deduper = self.load_deduplicator()
+		batch = []
+		# Files whose chunks have all been queued, waiting for the batch to commit
+		finished = []
+		# Canonical chunks already committed (including earlier runs'), and those that gained back-references since
+		committed, touched = set(deduper.refs if deduper else ()), set()
+		total = 0
+		skipped = []
+		for path, file_hash, pages in self.iter_files(file_hashes):
+			if pages is None:
+				# Not recorded in the manifest, so the next run retries it
+				skipped.append(path)
+				continue
+			file_chunk_ids = []
+			for chunk in self.iter_chunks(pages):
+				metadata = chunk.metadata
+				duplicate_of = None
+				if deduper:
+					ref = {"source": path, "page": metadata.get("page", 0), "start_index": metadata["start_index"]}
+					duplicate_of = deduper.add(metadata["chunk_id"], chunk.page_content, ref)
+				file_chunk_ids.append(duplicate_of or metadata["chunk_id"])
+				if duplicate_of:
+					if duplicate_of in committed:
+						touched.add(duplicate_of)
+					continue
+				batch.append(chunk)
+				if len(batch) >= self.commit_batch_size:
+					total += self._commit(batch, finished, on_commit, deduper, touched)
+					committed.update(c.metadata["chunk_id"] for c in batch)
+					batch, finished, touched = [], [], set()
+			finished.append((path, file_hash, file_chunk_ids))
+		total += self._commit(batch, finished, on_commit, deduper, touched)
+		print(f"Committed {total} chunks from {len(file_hashes) - len(skipped)} files")
+		if skipped:
+			print(f"Skipped {len(skipped)} files that failed to parse or timed out: {', '.join(skipped)}")
+		if deduper:
+			print(deduper.report())
+		self.update_ann_index()
+		return total
+
+	def update_ann_index(self):
+		"""
+		With the ivfpq backend, train (first time) or extend the IVF-PQ index over
+		the flat store and save it, so the query API loads it instead of building it.
+		"""
+		if self.backend != "ivfpq":
+			return
+		index = IVFPQIndex(self.get_collection(), self.ann_index_path)
+		index.sync()
+		index.save()
+		if index.trained:
+			print(f"IVF-PQ index: {index.count()} chunks, {index.nlist} lists, {index.m} bytes per chunk")
+		else:
+			print("IVF-PQ index: too few chunks to train yet; queries use exact search")
+
+	def _commit(self, chunks, finished, on_commit=None, deduper=None, touched=()):
+		"""
+		Embed and upsert one batch of chunks, then record the files it completes.
+		Canonical chunks committed earlier get their back-references refreshed.
+		"""
+		refs = deduper.refs if deduper else {}
+		if chunks:
+			_, embeddings = self.generate_embeddings(chunks)
+			self.build_vectorstore(chunks, embeddings, refs)
+		if touched:
+			self.get_collection().update(
+				ids=sorted(touched),
+				metadatas=[self._ref_metadata(refs[cid]) for cid in sorted(touched)],
+			)
+		if deduper:
+			# After the store, so the dedup store never lists a chunk the store lacks
+			self.dedup_store.save(deduper, [*(c.metadata["chunk_id"] for c in chunks), *sorted(touched)])
+		if chunks or touched:
+			# Tell the query API to pick up the new chunks
+			bump_version(self.version_path)
+		for path, file_hash, file_chunk_ids in finished:
+			self.manifest.record(path, file_hash, file_chunk_ids)
+		if finished:
+			self.manifest.save()
+		if on_commit:
+			on_commit([path for path, _, _ in finished], len(chunks))
+		return len(chunks)
 
 	def run(self):
 		"""
-		End-to-end ingestion pipeline:
-			1. Load PDFs
-			2. Chunk text
-			3. Generate embeddings
-			4. Store in ChromaDB
+		Incremental ingestion pipeline:
+			1. Diff the data directory against the manifest
+			2. Delete chunks of removed and changed files
+			3. Stream new and changed PDFs through load -> chunk -> embed -> upsert
+		Holds the manifest lock throughout (see manifest.py).
 		"""
-		documents = self.load_pdfs()
-		chunks = self.chunk_text(documents)
-		texts, embeddings = self.generate_embeddings(chunks)
-		self.build_vectorstore(texts, embeddings)
+		with self.manifest.locked():
+			self.reload_stores()
+			collection = self.get_collection()
+			if collection.count() == 0 and self.manifest.files:
+				# The store was wiped: the manifest no longer describes it
+				self.manifest.clear()
+				self.dedup_store.clear()
+			pdfs = self.list_pdfs()
+			changed, removed = self.manifest.diff(pdfs)
+			print(f"{len(changed)} new or changed, {len(removed)} removed, {len(pdfs) - len(changed)} unchanged files")
+			stale_ids = self.remove_files([*removed, *changed])
+			if stale_ids:
+				print(f"Deleted {len(stale_ids)} stale chunks")
+			self.manifest.save()
+			if changed:
+				self.ingest_files(changed)
+			elif stale_ids:
+				self.update_ann_index()
 		print("Ingestion complete.")
 
 
@@ -0,0 +1,162 @@
+"""
+jobs.py: Background ingestion queue for uploaded PDFs.
+
+/upload enqueues a job and returns immediately. A worker thread drains the
+queue, coalescing every job that arrives within a short window into one
+ingestion run, so a burst of uploads shares embedding batches and commits.
+Job progress and throughput are readable at any time via /jobs/{id}.
+A run that finishes without reporting some of a job's files (e.g. PDFs that
+failed to parse) marks the job "partial", or "failed" if none got in, and
+lists those files under skipped_files.
+
+A single worker is used on purpose: the ingest manifest and the Chroma writer
+are not safe to drive from several threads at once, and coalescing already
+gives batching across uploads.
+"""
+import queue
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Iterable, List, Optional
+
+
+# Seconds to wait for more uploads before starting an ingestion run
+COALESCE_WINDOW = 1.0
+# Finished jobs kept for /jobs/{id} lookups
+MAX_FINISHED_JOBS = 1000
+
+
+class IngestJob:
+    def __init__(self, files: List[str]):
+        self.id = uuid.uuid4().hex
+        self.files = files
+        self.status = "queued"
+        self.done_files = set()
+        self.skipped_files: List[str] = []
+        self.chunks = 0
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        # Number of jobs coalesced into the same ingestion run
+        self.batch_size = 1
+
+    @property
+    def files_done(self) -> int:
+        return len(self.done_files)
+
+    def to_dict(self) -> dict:
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "files": self.files,
+            "files_done": self.files_done,
+            "skipped_files": self.skipped_files,
+            "chunks": self.chunks,
+            "chunks_per_sec": round(self.chunks / elapsed, 1) if elapsed else 0.0,
+            "queued_seconds": round((self.started_at or end) - self.created_at, 3),
+            "elapsed_seconds": round(elapsed, 3),
+            "coalesced_jobs": self.batch_size,
+            "error": self.error,
+        }
+
+
+class IngestJobQueue:
+    """
+    ingest_fn(paths, on_commit) ingests the given files and calls
+    on_commit(finished_paths, chunks_committed) after every commit.
+    """
+
+    def __init__(self, ingest_fn: Callable, coalesce_window: float = COALESCE_WINDOW):
+        self.ingest_fn = ingest_fn
+        self.coalesce_window = coalesce_window
+        self.jobs: Dict[str, IngestJob] = {}
+        self._queue: "queue.Queue[Optional[IngestJob]]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, name="ingest-worker", daemon=True)
+            self._worker.start()
+
+    def stop(self) -> None:
+        if self._worker is not None:
+            self._queue.put(None)
+            self._worker.join()
+            self._worker = None
+
+    def submit(self, files: Iterable[str]) -> IngestJob:
+        """Queue files for ingestion, starting the worker on first use."""
+        job = IngestJob(list(files))
+        self._prune()
+        self.jobs[job.id] = job
+        self._queue.put(job)
+        self.start()
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        return self.jobs.get(job_id)
+
+    def _prune(self) -> None:
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished_at]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            batch = [job]
+            # Let a burst of uploads accumulate, then take everything queued
+            time.sleep(self.coalesce_window)
+            stopping = False
+            while True:
+                try:
+                    queued = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if queued is None:
+                    stopping = True
+                    break
+                batch.append(queued)
+            self._ingest(batch)
+            if stopping:
+                return
+
+    def _ingest(self, batch: List[IngestJob]) -> None:
+        started = time.time()
+        by_file: Dict[str, List[IngestJob]] = {}
+        for job in batch:
+            job.status = "running"
+            job.started_at = started
+            job.batch_size = len(batch)
+            for path in job.files:
+                by_file.setdefault(path, []).append(job)
+
+        def on_commit(finished_paths, chunks):
+            for path in finished_paths:
+                for job in by_file.get(path, []):
+                    job.done_files.add(path)
+            # Coalesced jobs share commits, so each reports the run's chunk count
+            for job in batch:
+                job.chunks += chunks
+
+        try:
+            self.ingest_fn(list(by_file), on_commit)
+            status, error = "done", None
+        except Exception as e:
+            status, error = "failed", str(e)
+        finished = time.time()
+        for job in batch:
+            job.status = status
+            job.error = error
+            job.finished_at = finished
+            if status == "done":
+                job.skipped_files = [path for path in job.files if path not in job.done_files]
+                if job.skipped_files:
+                    job.status = "partial" if job.done_files else "failed"
+                    job.error = (f"{len(job.skipped_files)} of {len(job.files)} files were not ingested "
+                                 f"(failed to parse or timed out)")
@@ -4,20 +4,29 @@ main.py: FastAPI backend for RAG PDF Demo
 This file implements the core API for the Retrieval-Augmented Generation (RAG) PDF demo project.
 
 Features:
-- PDF upload endpoint: saves PDFs to local storage
+- PDF upload endpoint: saves PDFs to local storage and queues background ingestion
+- Job status endpoint: progress and throughput of an ingestion job
 - Query endpoint: answers questions using RAG pipeline (ChromaDB + Azure OpenAI)
+- Streaming query endpoint: the same answer as Server-Sent Events, tokens sent as they are generated
+- Batch query endpoint: many questions per request, answers streamed back as NDJSON
+- Cache stats endpoint: hit rates of the query embedding and semantic answer caches
+- Context stats endpoint: prompt context tokens sent and trimmed by the context builder
+- Metrics endpoint: per-stage latency histograms, token counts, cache hits and errors for Prometheus
 - Health endpoint: basic service status
 - CORS middleware for frontend-backend integration
 
 Key Classes:
 - RAGQA: Handles retrieval and LLM answering
+- IngestJobQueue (jobs.py): Background worker that ingests uploads
 
 Usage:
 1. Start the backend server:
     $ uvicorn main:app --reload
-2. Upload PDFs via the frontend or API
-3. Run offline ingestion (see ingest.py) to process new PDFs
-4. Query processed documents via the frontend or API
+2. Upload PDFs via the frontend or API; they are ingested in the background
+   (poll /jobs/{job_id}). Offline ingestion (see ingest.py) still works for
+   bulk loads.
+3. Query processed documents via the frontend or API; new ingest results are
+   picked up from the shared on-disk store without a restart
 
 Environment:
 - Requires Azure OpenAI credentials in .env
@@ -25,13 +34,28 @@ Environment:
 
 For more details, see README.md and onboarding docs.
 """
+import asyncio
+import json
 import os
+import time
+from contextlib import asynccontextmanager
+from typing import List
 from fastapi import FastAPI, UploadFile, File
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
-from openai import AzureOpenAI
-import chromadb
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+import httpx
+from openai import AsyncAzureOpenAI, DefaultAsyncHttpxClient
 from dotenv import load_dotenv
+from vectorstore import CHROMA_COLLECTION_NAME, RETRIEVAL_BACKEND, SharedBM25Index, open_shared_store
+from fusion import reciprocal_rank_fusion
+from jobs import IngestJobQueue
+from ttl_cache import TTLCache
+from semantic_cache import SemanticCache
+from context import ContextBuilder
+from tokens import load_encoding_in_background
+from metrics import MetricsMiddleware, Registry
+from embeddings import AsyncBatchEmbedder
+from ingest import PDFIngestor
 
 # Load environment variables
 load_dotenv()
@@ -40,16 +64,83 @@ load_dotenv()
 DATA_DIR = "data"
 os.makedirs(DATA_DIR, exist_ok=True)
 
+# Query embedding cache: entries kept and seconds before an entry expires
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "3600"))
+# Answer cache: cosine similarity for a paraphrase to reuse an answer, entries and TTL
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+# Connections to Azure OpenAI shared by all in-flight questions; requests beyond
+# this wait for a free connection instead of opening new ones
+QUERY_MAX_CONNECTIONS = int(os.getenv("QUERY_MAX_CONNECTIONS", "500"))
+# Seconds an LLM call may take, and seconds to establish a connection
+QUERY_TIMEOUT = float(os.getenv("QUERY_TIMEOUT", "120"))
+QUERY_CONNECT_TIMEOUT = float(os.getenv("QUERY_CONNECT_TIMEOUT", "5"))
+# /query/batch: most questions per request, and chat completions in flight per request
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "5000"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "16"))
+# "vector", or "hybrid" to fuse BM25 and vector candidates with reciprocal rank fusion
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "vector")
+# Candidates fetched from each retriever before fusion in hybrid mode
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+# Chunks retrieved per question before overlap removal, deduplication and MMR selection
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "12"))
+# Prompt context budget in tokens, and MMR weight of relevance against diversity
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+# Send each response's per-stage timing breakdown in a Server-Timing header
+SERVER_TIMING = os.getenv("SERVER_TIMING", "0") == "1"
+
 # In-memory PDF tracker (demo only)
 pdf_store = {}
 
-# Chroma collection
-CHROMA_COLLECTION_NAME = "pdf_chunks"
+# Ingestor used by the background worker, created on first upload
+_ingestor = None
+
+
+def ingest_uploads(paths, on_commit):
+    """Runs on the ingest worker thread."""
+    global _ingestor
+    if _ingestor is None:
+        _ingestor = PDFIngestor(data_path=DATA_DIR)
+    return _ingestor.ingest_paths(paths, on_commit)
+
+
+# Background ingestion queue fed by /upload
+ingest_queue = IngestJobQueue(ingest_uploads)
+
+# Metrics served at /metrics
+metrics = Registry()
+HTTP_SECONDS = metrics.histogram(
+    "rag_http_request_seconds", "HTTP request latency", ["method", "route", "status"]
+)
+STAGE_SECONDS = metrics.histogram(
+    "rag_stage_seconds", "Time spent in each stage of answering questions", ["stage"]
+)
+STAGE_ERRORS = metrics.counter("rag_stage_errors_total", "Stages that raised an exception", ["stage"])
+REQUEST_ERRORS = metrics.counter("rag_request_errors_total", "Questions answered with an error", ["endpoint"])
+TOKENS = metrics.counter(
+    "rag_tokens_total", "Tokens by kind: prompt and completion (from the API), context and context_trimmed", ["kind"]
+)
+
+
+def stage(name: str):
+    """Time a stage into rag_stage_seconds and the request's Server-Timing breakdown."""
+    return STAGE_SECONDS.time(name, errors=STAGE_ERRORS)
+
 
 # Initialize FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI(title="RAG PDF Demo API")
+@asynccontextmanager
+async def lifespan(app):
+    # Load the tokenizer off the event loop; context token counts are estimated until it is ready
+    load_encoding_in_background()
+    yield
+
+
+app = FastAPI(title="RAG PDF Demo API", lifespan=lifespan)
 
 # Allow all origins for development; restrict in production
 app.add_middleware(
@@ -59,40 +150,146 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware, histogram=HTTP_SECONDS, server_timing_header=SERVER_TIMING)
 
 
 class QueryRequest(BaseModel):
     question: str
 
 
+class BatchQueryRequest(BaseModel):
+    questions: List[str] = Field(..., min_length=1, max_length=BATCH_MAX_QUESTIONS)
+
+
 class RAGQA:
-    def __init__(self, collection_name=CHROMA_COLLECTION_NAME):
-        # Connect to Chroma (PersistentClient if you want disk persistence)
-        self.client = chromadb.Client()
-        try:
-            self.collection = self.client.get_collection(collection_name)
-        except Exception:
-            self.collection = self.client.create_collection(name=collection_name)
+    def __init__(self, collection_name=CHROMA_COLLECTION_NAME, backend=RETRIEVAL_BACKEND, mode=RETRIEVAL_MODE):
+        # On-disk store (Chroma or flat index) written by ingest.py; refreshed when ingestion commits
+        self.store = open_shared_store(backend, collection_name)
+        # BM25 index written by ingest.py next to the vector store, used in hybrid mode
+        self.lexical = SharedBM25Index() if mode == "hybrid" else None
 
         # Azure OpenAI config
         self.api_key = os.getenv("AZURE_OPENAI_API_KEY")
         self.api_base = os.getenv("AZURE_OPENAI_API_BASE")
         self.api_version = os.getenv("AZURE_OPENAI_API_VERSION")
         self.deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT")
+        # Queries must be embedded by the same model as the ingested chunks
+        self.embedding_deployment = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT", self.deployment)
 
-        self.openai_client = AzureOpenAI(
+        # Async client: a question waiting on the LLM holds no thread, only a pooled connection
+        self.openai_client = AsyncAzureOpenAI(
             api_key=self.api_key,
             api_version=self.api_version,
             azure_endpoint=self.api_base,
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=QUERY_MAX_CONNECTIONS,
+                    max_keepalive_connections=QUERY_MAX_CONNECTIONS,
+                    keepalive_expiry=60,
+                ),
+                timeout=httpx.Timeout(QUERY_TIMEOUT, connect=QUERY_CONNECT_TIMEOUT),
+            ),
         )
-
-    def retrieve(self, query: str, k: int = 3) -> str:
-        results = self.collection.query(query_texts=[query], n_results=k)
-        documents = results.get("documents", [[]])[0]
-        return "\n".join(documents)
-
-    def answer(self, query: str, context: str) -> str:
-        prompt = f"""
+        self.query_embeddings = TTLCache(maxsize=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL)
+        self.answers = SemanticCache(
+            threshold=ANSWER_CACHE_THRESHOLD, maxsize=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL
+        )
+        self.context_builder = ContextBuilder(token_budget=CONTEXT_TOKEN_BUDGET, mmr_lambda=MMR_LAMBDA)
+
+    async def embed_query(self, query: str) -> list:
+        # Whitespace-normalized so trivially different phrasings share an entry
+        key = " ".join(query.split())
+        embedding = self.query_embeddings.get(key)
+        if embedding is None:
+            with stage("embed"):
+                response = await self.openai_client.embeddings.create(input=[key], model=self.embedding_deployment)
+            embedding = response.data[0].embedding
+            self.query_embeddings.set(key, embedding)
+        return embedding
+
+    async def embed_queries(self, queries: List[str]) -> List[list]:
+        """Embed many queries, sending only uncached distinct ones in as few requests as possible."""
+        keys = [" ".join(query.split()) for query in queries]
+        embeddings = {key: self.query_embeddings.get(key) for key in dict.fromkeys(keys)}
+        missing = [key for key, embedding in embeddings.items() if embedding is None]
+        if missing:
+            embedder = AsyncBatchEmbedder(self.openai_client, self.embedding_deployment)
+            with stage("embed"):
+                vectors = await embedder.embed(missing)
+            for key, embedding in zip(missing, vectors):
+                embeddings[key] = embedding
+                self.query_embeddings.set(key, embedding)
+        return [embeddings[key] for key in keys]
+
+    async def search(self, query: str, k: int = CONTEXT_CANDIDATES, embedding=None):
+        """Return (documents, sources) for the k chunks closest to the query."""
+        if embedding is None:
+            embedding = await self.embed_query(query)
+        # Chroma's client is blocking; run it on a worker thread to keep the event loop free
+        results = await asyncio.to_thread(self._search, [query], [embedding], k)
+        return results[0]
+
+    async def search_many(self, queries: List[str], embeddings: List[list], k: int = CONTEXT_CANDIDATES):
+        """(documents, sources) per query, from one multi-query top-k search."""
+        return await asyncio.to_thread(self._search, queries, embeddings, k)
+
+    def _search(self, queries: List[str], embeddings: List[list], k: int):
+        fetch = max(k, HYBRID_CANDIDATES) if self.lexical else k
+        collection = self.store.collection
+        with stage("search"):
+            results = collection.query(query_embeddings=embeddings, n_results=fetch)
+        matches = []
+        for i, ids in enumerate(results["ids"]):
+            metadatas = (results.get("metadatas") or [None] * len(embeddings))[i] or [{}] * len(ids)
+            distances = (results.get("distances") or [None] * len(embeddings))[i] or [None] * len(ids)
+            # chunk ID -> (document, metadata, distance)
+            candidates = dict(zip(ids, zip(results["documents"][i], metadatas, distances)))
+            ranked = ids
+            if self.lexical:
+                with stage("lexical"):
+                    lexical_ids = [chunk_id for chunk_id, _ in self.lexical.collection.search(queries[i], fetch)]
+                    ranked = [chunk_id for chunk_id, _ in reciprocal_rank_fusion([ids, lexical_ids])[:k]]
+                    missing = [chunk_id for chunk_id in ranked if chunk_id not in candidates]
+                    if missing:
+                        # Lexical-only hits: fetch their text from the vector store; they have no distance
+                        fetched = collection.get(ids=missing)
+                        for chunk_id, document, metadata in zip(fetched["ids"], fetched["documents"], fetched["metadatas"]):
+                            candidates[chunk_id] = (document, metadata or {}, None)
+                        ranked = [chunk_id for chunk_id in ranked if chunk_id in candidates]
+            documents = [candidates[chunk_id][0] for chunk_id in ranked]
+            sources = [
+                {
+                    "id": chunk_id,
+                    "source": candidates[chunk_id][1].get("source"),
+                    "page": candidates[chunk_id][1].get("page"),
+                    "start_index": candidates[chunk_id][1].get("start_index"),
+                    "distance": candidates[chunk_id][2],
+                }
+                for chunk_id in ranked
+            ]
+            matches.append((documents, sources))
+        return matches
+
+    async def build_context(self, documents: List[str], sources: List[dict]):
+        """Pack retrieved chunks into a token-budgeted context (tiktoken runs on a worker thread)."""
+        contexts = await asyncio.to_thread(self._build_contexts, [(documents, sources)])
+        return contexts[0]
+
+    def _build_contexts(self, matches):
+        with stage("context"):
+            contexts = [self.context_builder.build(documents, sources) for documents, sources in matches]
+        TOKENS.inc("context", amount=sum(context.tokens for context in contexts))
+        TOKENS.inc("context_trimmed", amount=sum(context.tokens_trimmed for context in contexts))
+        return contexts
+
+    async def retrieve(self, query: str, k: int = CONTEXT_CANDIDATES, embedding=None) -> str:
+        documents, sources = await self.search(query, k, embedding)
+        context = await self.build_context(documents, sources)
+        return context.text
+
+    @staticmethod
+    def build_prompt(query: str, context: str) -> str:
+        return f"""
 Use the following context to answer the user's question.
 If you don't know, say you don't know.
 
@@ -102,49 +299,236 @@ Context:
 Question: {query}
 Answer:
 """
-        response = self.openai_client.chat.completions.create(
-            model=self.deployment,
-            messages=[{"role": "user", "content": prompt}],
-        )
+
+    async def answer(self, query: str, context: str) -> str:
+        with stage("completion"):
+            response = await self.openai_client.chat.completions.create(
+                model=self.deployment,
+                messages=[{"role": "user", "content": self.build_prompt(query, context)}],
+            )
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            TOKENS.inc("prompt", amount=usage.prompt_tokens)
+            TOKENS.inc("completion", amount=usage.completion_tokens)
         return response.choices[0].message.content
 
-    def run(self, query: str) -> str:
-        context = self.retrieve(query)
-        return self.answer(query, context)
+    async def stream_answer(self, query: str, context: str):
+        """Yield answer text deltas as the completion generates them."""
+        # Only time to first token: the rest of the stream is paced by the model and the client
+        with stage("first_token"):
+            stream = await self.openai_client.chat.completions.create(
+                model=self.deployment,
+                messages=[{"role": "user", "content": self.build_prompt(query, context)}],
+                stream=True,
+            )
+        async for chunk in stream:
+            # Azure sends a content-filter chunk with no choices first
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def run(self, query: str) -> str:
+        embedding = await self.embed_query(query)
+        # Cached answers are only valid for the collection version they were computed against
+        version = await asyncio.to_thread(self.store.refresh)
+        cached = self.answers.get(embedding, version)
+        if cached is not None:
+            return cached
+        started = time.perf_counter()
+        context = await self.retrieve(query, embedding=embedding)
+        answer = await self.answer(query, context)
+        self.answers.put(embedding, answer, version, time.perf_counter() - started)
+        return answer
+
+    async def run_stream(self, query: str):
+        """
+        Yield ("sources", [...]) and ("context", {...token report}) once the
+        context is built, then ("token", text) for each answer delta. A cached
+        answer is sent as a single token.
+        """
+        embedding = await self.embed_query(query)
+        version = await asyncio.to_thread(self.store.refresh)
+        started = time.perf_counter()
+        documents, sources = await self.search(query, embedding=embedding)
+        context = await self.build_context(documents, sources)
+        yield "sources", context.sources
+        yield "context", context.report()
+        cached = self.answers.get(embedding, version)
+        if cached is not None:
+            yield "token", cached
+            return
+        parts = []
+        async for text in self.stream_answer(query, context.text):
+            parts.append(text)
+            yield "token", text
+        self.answers.put(embedding, "".join(parts), version, time.perf_counter() - started)
+
+    async def run_batch(self, queries: List[str], concurrency: int = BATCH_CONCURRENCY, k: int = CONTEXT_CANDIDATES):
+        """
+        Answer many questions, yielding {"index", "question", "answer" or "error"}
+        (plus the "context" token report when not answered from cache) as each one finishes. Embedding and retrieval are done once for the whole
+        batch; only the chat completions are per question, `concurrency` at a time.
+        """
+        embeddings = await self.embed_queries(queries)
+        version = await asyncio.to_thread(self.store.refresh)
+        pending = []
+        for index, embedding in enumerate(embeddings):
+            cached = self.answers.get(embedding, version)
+            if cached is not None:
+                yield {"index": index, "question": queries[index], "answer": cached}
+            else:
+                pending.append(index)
+        if not pending:
+            return
+
+        started = time.perf_counter()
+        matches = await self.search_many([queries[index] for index in pending], [embeddings[index] for index in pending], k)
+        contexts = await asyncio.to_thread(self._build_contexts, matches)
+        # Each question's share of the batched search, counted in its cached cost
+        search_cost = (time.perf_counter() - started) / len(pending)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def complete(index, context):
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    answer = await self.answer(queries[index], context.text)
+                except Exception as e:
+                    REQUEST_ERRORS.inc("batch")
+                    return {"index": index, "question": queries[index], "error": str(e)}
+                self.answers.put(embeddings[index], answer, version, search_cost + time.perf_counter() - started)
+                return {"index": index, "question": queries[index], "answer": answer, "context": context.report()}
+
+        tasks = [asyncio.create_task(complete(index, context)) for index, context in zip(pending, contexts)]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            # Client went away or a caller stopped early: drop the completions still queued
+            for task in tasks:
+                task.cancel()
 
 
 # Instantiate the RAG pipeline
 rag_qa = RAGQA()
 
 
+def _cache_counts(counter: str):
+    return lambda: {
+        ("query_embeddings",): getattr(rag_qa.query_embeddings, counter),
+        ("answers",): getattr(rag_qa.answers, counter),
+    }
+
+
+metrics.callback("rag_cache_hits_total", "Cache hits", "counter", ["cache"], _cache_counts("hits"))
+metrics.callback("rag_cache_misses_total", "Cache misses", "counter", ["cache"], _cache_counts("misses"))
+
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
 
+@app.get("/cache/stats")
+def cache_stats():
+    """Hit rates of the query embedding and answer caches."""
+    return {
+        "query_embeddings": rag_qa.query_embeddings.stats(),
+        "answers": rag_qa.answers.stats(),
+    }
+
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """Prometheus text exposition of request, stage, token, cache and error metrics."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/context/stats")
+def context_stats():
+    """Prompt context tokens sent, and candidate tokens trimmed by overlap removal, deduplication and the token budget."""
+    return rag_qa.context_builder.stats()
+
+
 @app.post("/upload")
 async def upload_pdf(file: UploadFile = File(...)):
-    """Save uploaded PDF into the local data/ folder."""
+    """Save uploaded PDF into the local data/ folder and queue it for ingestion."""
     try:
         file_path = os.path.join(DATA_DIR, file.filename)
         with open(file_path, "wb") as f:
             f.write(await file.read())
 
+        job = ingest_queue.submit([file_path])
         pdf_store[file.filename] = {
             "path": file_path,
-            "ingested": False,  # ingestion happens offline
+            "job_id": job.id,  # ingestion runs in the background
         }
 
-        return {"file_id": file.filename, "status": "uploaded"}
+        return {"file_id": file.filename, "status": "uploaded", "job_id": job.id}
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    """Progress and throughput of a background ingestion job."""
+    job = ingest_queue.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": f"Unknown job '{job_id}'"})
+    return job.to_dict()
+
+
 @app.post("/query")
-def query_api(request: QueryRequest):
+async def query_api(request: QueryRequest):
     """Query against already ingested Chroma collection."""
     try:
-        answer = rag_qa.run(request.question)
+        answer = await rag_qa.run(request.question)
         return {"answer": answer}
     except Exception as e:
+        REQUEST_ERRORS.inc("query")
         return JSONResponse(status_code=500, content={"error": str(e)})
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/query/stream")
+async def query_stream(request: QueryRequest):
+    """
+    Server-Sent Events variant of /query. Events, in order:
+    sources (metadata of the chunks in the context), context (prompt tokens
+    sent and trimmed), token (answer text, repeated), done.
+    An error event replaces the remaining events if anything fails.
+    """
+    async def events():
+        try:
+            async for event, data in rag_qa.run_stream(request.question):
+                yield sse_event(event, data)
+            yield sse_event("done", {})
+        except Exception as e:
+            REQUEST_ERRORS.inc("stream")
+            yield sse_event("error", {"error": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/query/batch")
+async def query_batch(request: BatchQueryRequest):
+    """
+    Answer many questions in one request. Streams NDJSON, one
+    {"index", "question", "answer" or "error"} object per line, in the order
+    answers complete; use "index" to match results to questions.
+    """
+    async def lines():
+        try:
+            async for result in rag_qa.run_batch(request.questions):
+                yield json.dumps(result) + "\n"
+        except Exception as e:
+            REQUEST_ERRORS.inc("batch")
+            yield json.dumps({"error": str(e)}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
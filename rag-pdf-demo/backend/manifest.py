@@ -0,0 +1,125 @@
+"""
+manifest.py: File manifest for incremental ingestion.
+
+Records, per ingested PDF, its content hash, mtime, size and the chunk IDs it
+produced. Diffing the data directory against the manifest tells ingestion which
+files are new or changed (re-embed and upsert) and which were removed (delete
+their chunks), so ingestion cost scales with the size of the change.
+
+The API's ingest worker and an offline `python ingest.py` run can both write
+the manifest. Each run holds locked() from diff to last save, so runs take
+turns and each starts from the other's saved entries. The lock is an advisory
+fcntl lock; where fcntl is unavailable (Windows), run one writer at a time.
+"""
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, see the module docstring
+    fcntl = None
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_id(file_hash: str, page: int, offset: int) -> str:
+    """Deterministic chunk ID: the same bytes always produce the same IDs."""
+    return f"{file_hash[:16]}:{page}:{offset}"
+
+
+class IngestManifest:
+    def __init__(self, path: str):
+        self.path = path
+        self.files: Dict[str, dict] = {}
+        self.load()
+
+    def load(self) -> None:
+        """Read the manifest from disk (empty if it doesn't exist yet)."""
+        self.files = {}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self.files = json.load(f).get("files", {})
+
+    @contextmanager
+    def locked(self):
+        """
+        Hold the manifest's writer lock for a whole ingestion run, blocking
+        until any other writer finishes, then reload what that writer saved.
+        """
+        if fcntl is None:
+            yield self
+            return
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(f"{self.path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self.load()
+                yield self
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def diff(self, paths: Iterable[str]) -> Tuple[Dict[str, str], List[str]]:
+        """
+        Compare files on disk with the manifest.
+        Returns ({path: sha256} for new or changed files, [removed paths]).
+        Files whose mtime and size match are not re-hashed; files that were
+        only touched keep their chunks and get their mtime refreshed.
+        """
+        changed = {}
+        paths = list(paths)
+        for path in paths:
+            stat = os.stat(path)
+            entry = self.files.get(path)
+            if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+                continue
+            file_hash = file_sha256(path)
+            if entry and entry["sha256"] == file_hash:
+                entry["mtime"] = stat.st_mtime
+                continue
+            changed[path] = file_hash
+        removed = sorted(set(self.files) - set(paths))
+        return changed, removed
+
+    def remove(self, paths: Iterable[str]) -> List[str]:
+        """
+        Drop paths from the manifest and return chunk IDs no other file still uses
+        (identical files share chunk IDs).
+        """
+        dropped = set()
+        for path in paths:
+            entry = self.files.pop(path, None)
+            if entry:
+                dropped.update(entry["chunk_ids"])
+        still_used = {cid for entry in self.files.values() for cid in entry["chunk_ids"]}
+        return sorted(dropped - still_used)
+
+    def record(self, path: str, file_hash: str, chunk_ids: List[str]) -> None:
+        stat = os.stat(path)
+        self.files[path] = {
+            "sha256": file_hash,
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "chunk_ids": chunk_ids,
+        }
+
+    def clear(self) -> None:
+        self.files = {}
+
+    def save(self) -> None:
+        """Write atomically so a crash never leaves a half-written manifest."""
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"files": self.files}, f, indent=1)
+        os.replace(tmp_path, self.path)
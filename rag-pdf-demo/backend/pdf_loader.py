@@ -0,0 +1,89 @@
+"""
+pdf_loader.py: Parallel PDF parsing for ingestion.
+
+PDF text extraction is CPU-bound, so files are fanned out to a process pool.
+Results come back in input order, a bounded number of files are parsed ahead
+of the consumer, and a file that takes longer than the per-file timeout is
+skipped (its stuck worker is killed) so one pathological PDF cannot stall the batch.
+Files that other workers finished meanwhile keep their results.
+
+The timeout also applies with a single worker, which then parses in one
+child process; only INGEST_PARSE_TIMEOUT=0 (no timeout) with one worker parses
+in-process.
+"""
+import multiprocessing
+import os
+from collections import deque
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_core.documents import Document
+
+
+# Worker processes used for parsing
+PARSE_WORKERS = int(os.getenv("INGEST_PARSE_WORKERS", os.cpu_count() or 1))
+# Seconds a single file may take before it is skipped; 0 waits forever
+PARSE_TIMEOUT = float(os.getenv("INGEST_PARSE_TIMEOUT", "120"))
+
+
+def parse_pdf(path: str) -> List[Document]:
+    """Extract one Document per page. Runs inside worker processes."""
+    return PyPDFLoader(path).load()
+
+
+class ParallelPDFLoader:
+    def __init__(self, workers: int = PARSE_WORKERS, timeout: float = PARSE_TIMEOUT, parse=parse_pdf):
+        self.workers = max(1, workers)
+        self.timeout = timeout or None
+        # Module-level function run in the workers (it must be picklable)
+        self.parse = parse
+
+    def iter_files(self, paths: Iterable[str]) -> Iterator[Tuple[str, Optional[List[Document]]]]:
+        """
+        Yield (path, pages) in input order. pages is None when the file failed
+        to parse or timed out; callers should leave such files for the next run.
+        """
+        if self.workers == 1 and self.timeout is None:
+            for path in paths:
+                try:
+                    yield path, self.parse(path)
+                except Exception as e:
+                    print(f"Failed to parse {path}: {e}")
+                    yield path, None
+            return
+
+        # spawn: the parent holds HTTP and database threads that fork would copy mid-state
+        context = multiprocessing.get_context("spawn")
+        pool = context.Pool(self.workers)
+        pending = deque()
+        paths = iter(paths)
+        try:
+            while True:
+                # Keep a bounded window parsed ahead of the consumer
+                for path in paths:
+                    pending.append((path, pool.apply_async(self.parse, (path,))))
+                    if len(pending) >= self.workers * 2:
+                        break
+                if not pending:
+                    return
+                path, result = pending.popleft()
+                try:
+                    pages = result.get(timeout=self.timeout)
+                except multiprocessing.TimeoutError:
+                    print(f"Timed out parsing {path} after {self.timeout:.0f}s; skipping")
+                    # The stuck worker can only be stopped by replacing the pool;
+                    # files already parsed keep their results, the rest are resubmitted
+                    done = [queued_result.ready() for _, queued_result in pending]
+                    pool.terminate()
+                    pool = context.Pool(self.workers)
+                    pending = deque(
+                        (queued, queued_result if ready else pool.apply_async(self.parse, (queued,)))
+                        for (queued, queued_result), ready in zip(pending, done)
+                    )
+                    pages = None
+                except Exception as e:
+                    print(f"Failed to parse {path}: {e}")
+                    pages = None
+                yield path, pages
+        finally:
+            pool.terminate()
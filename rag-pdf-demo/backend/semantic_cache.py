@@ -0,0 +1,118 @@
+"""
+semantic_cache.py: Answer cache keyed on query-embedding similarity.
+
+Paraphrases of a popular question embed close to each other, so an answer
+computed for one can be served for the others without retrieval or a chat
+completion. A lookup is a single matrix-vector product over the cached
+(normalized) query embeddings. Entries are tied to the collection version
+they were answered against and are dropped as soon as ingestion commits.
+"""
+import threading
+import time
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+
+# Cosine similarity at or above which a cached answer is reused
+ANSWER_CACHE_THRESHOLD = 0.95
+ANSWER_CACHE_SIZE = 512
+# Seconds an answer is served before it is recomputed
+ANSWER_CACHE_TTL = 3600.0
+
+
+class SemanticCache:
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD, maxsize: int = ANSWER_CACHE_SIZE,
+                 ttl: float = ANSWER_CACHE_TTL):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version: Optional[str] = None
+        # One slot per entry; a slot is empty when its expiry is 0
+        self._vectors: Optional[np.ndarray] = None
+        self._answers: list = [None] * maxsize
+        self._costs = np.zeros(maxsize)
+        self._expires = np.zeros(maxsize)
+        self._last_used = np.zeros(maxsize)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # Seconds of retrieval + completion that hits did not have to spend
+        self.latency_saved = 0.0
+
+    def get(self, embedding: Sequence[float], version: str) -> Optional[str]:
+        query = self._normalize(embedding)
+        with self._lock:
+            self._check_version(version)
+            now = time.monotonic()
+            live = self._expires > now
+            if self._vectors is None or not live.any():
+                self.misses += 1
+                return None
+            scores = np.where(live, self._vectors @ query, -np.inf)
+            slot = int(np.argmax(scores))
+            if scores[slot] < self.threshold:
+                self.misses += 1
+                return None
+            self._last_used[slot] = now
+            self.hits += 1
+            self.latency_saved += self._costs[slot]
+            return self._answers[slot]
+
+    def put(self, embedding: Sequence[float], answer: str, version: str, cost: float) -> None:
+        """Store an answer computed against `version`; cost is the seconds it took."""
+        vector = self._normalize(embedding)
+        with self._lock:
+            self._check_version(version)
+            if self._vectors is None:
+                self._vectors = np.zeros((self.maxsize, len(vector)), dtype=np.float32)
+            now = time.monotonic()
+            # Reuse an empty or expired slot, otherwise evict the least recently used
+            free = np.flatnonzero(self._expires <= now)
+            slot = int(free[0]) if len(free) else int(np.argmin(self._last_used))
+            self._vectors[slot] = vector
+            self._answers[slot] = answer
+            self._costs[slot] = cost
+            self._expires[slot] = now + self.ttl
+            self._last_used[slot] = now
+
+    def clear(self) -> None:
+        with self._lock:
+            self._clear()
+
+    def __len__(self) -> int:
+        return int((self._expires > time.monotonic()).sum())
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+            "size": len(self),
+            "invalidations": self.invalidations,
+            "latency_saved_seconds": round(self.latency_saved, 3),
+        }
+
+    def _check_version(self, version: str) -> None:
+        if version != self.version:
+            if self.version is not None:
+                self.invalidations += 1
+            self._clear()
+            self.version = version
+
+    def _clear(self) -> None:
+        self._answers = [None] * self.maxsize
+        self._expires[:] = 0
+        self._last_used[:] = 0
+
+    @staticmethod
+    def _normalize(embedding: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
@@ -0,0 +1,52 @@
+import os
+import re
+import sys
+
+import pytest
+
+# Make backend modules importable the same way main.py and ingest.py import them
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+# Repo root, for the shared/ utilities
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..")))
+
+
+class FakeEncoding:
+    """Offline stand-in for a tiktoken encoding: one token per word plus trailing whitespace."""
+
+    def __init__(self):
+        self.vocab = {}
+        self.pieces = []
+
+    def encode_ordinary(self, text):
+        tokens = []
+        for piece in re.findall(r"\s*\S+\s*|\s+", text):
+            if piece not in self.vocab:
+                self.vocab[piece] = len(self.pieces)
+                self.pieces.append(piece)
+            tokens.append(self.vocab[piece])
+        return tokens
+
+    encode = encode_ordinary
+
+    def encode_ordinary_batch(self, texts):
+        return [self.encode_ordinary(text) for text in texts]
+
+    def decode(self, tokens):
+        return "".join(self.pieces[token] for token in tokens)
+
+    def decode_with_offsets(self, tokens):
+        offsets, position = [], 0
+        for token in tokens:
+            offsets.append(position)
+            position += len(self.pieces[token])
+        return self.decode(tokens), offsets
+
+
+@pytest.fixture
+def fake_encoding(monkeypatch):
+    """tiktoken downloads its BPE files on first use; tests run offline."""
+    import tokens
+    encoding = FakeEncoding()
+    monkeypatch.setattr(tokens, "get_encoding", lambda name=None: encoding)
+    monkeypatch.setattr(tokens, "_encoding", encoding)
+    return encoding
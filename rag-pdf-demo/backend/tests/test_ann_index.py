@@ -0,0 +1,49 @@
+import numpy as np
+
+from ann_index import MIN_TRAIN_ROWS, IVFPQIndex
+from flat_index import FlatIndex
+
+
+def clustered(rows, dim=32, clusters=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim))
+    return centers[rng.integers(clusters, size=rows)] + 0.3 * rng.standard_normal((rows, dim))
+
+
+def fill(flat, vectors, start=0):
+    ids = [str(i) for i in range(start, start + len(vectors))]
+    flat.upsert(ids=ids, embeddings=vectors, documents=ids)
+
+
+def test_ivfpq_recall_against_exact_search(tmp_path):
+    flat = FlatIndex(str(tmp_path / "flat"))
+    fill(flat, clustered(3000))
+    index = IVFPQIndex(flat, str(tmp_path / "ivfpq.npz"), workers=2)
+    assert index.trained
+    queries = clustered(20, seed=1)
+    exact = flat.query(query_embeddings=queries, n_results=10)["ids"]
+    approximate = index.query(query_embeddings=queries, n_results=10, nprobe=8)["ids"]
+    recall = np.mean([len(set(a) & set(e)) / 10 for a, e in zip(approximate, exact)])
+    assert recall >= 0.9
+    assert index.memory_bytes() < flat.view[1].nbytes / 4
+
+
+def test_ivfpq_persists_and_encodes_appended_rows(tmp_path):
+    flat_path, ann_path = str(tmp_path / "flat"), str(tmp_path / "ivfpq.npz")
+    writer = FlatIndex(flat_path)
+    fill(writer, clustered(MIN_TRAIN_ROWS - 1))
+    assert not IVFPQIndex(writer, ann_path).trained
+    fill(writer, clustered(1000, seed=2), start=MIN_TRAIN_ROWS - 1)
+    built = IVFPQIndex(writer, ann_path)
+    built.save()
+
+    reader = IVFPQIndex(FlatIndex(flat_path), ann_path)
+    assert reader.trained and reader.nlist == built.nlist
+    vector = clustered(1, seed=3)
+    fill(writer, vector, start=10_000)
+    writer.delete(ids=["0"])
+    reader.load()
+    results = reader.query(query_embeddings=vector, n_results=3)
+    assert results["ids"][0][0] == "10000"
+    deleted_vector = np.asarray(writer.view[1][:1])
+    assert "0" not in reader.query(query_embeddings=deleted_vector, n_results=5)["ids"][0]
@@ -1,6 +1,201 @@
+import asyncio
+import json
+
+
 def test_ragqa_stub():
     from backend.main import RAGQA
     ragqa = RAGQA()
     assert hasattr(ragqa, 'retrieve')
     assert hasattr(ragqa, 'answer')
     assert hasattr(ragqa, 'run')
+
+
+def test_query_embeddings_are_cached():
+    from types import SimpleNamespace
+    from backend.main import RAGQA
+    ragqa = RAGQA()
+    calls = []
+
+    async def create(input, model):
+        calls.append((input, model))
+        return SimpleNamespace(data=[SimpleNamespace(embedding=[0.1, 0.2])])
+
+    ragqa.openai_client = SimpleNamespace(embeddings=SimpleNamespace(create=create))
+    assert asyncio.run(ragqa.embed_query("what is  RAG?")) == [0.1, 0.2]
+    assert asyncio.run(ragqa.embed_query(" what is RAG? ")) == [0.1, 0.2]
+    assert calls == [(["what is RAG?"], ragqa.embedding_deployment)]
+    assert ragqa.query_embeddings.hits == 1
+
+
+def test_run_reuses_answers_for_paraphrases_until_ingest():
+    from types import SimpleNamespace
+    from backend.main import RAGQA
+    ragqa = RAGQA()
+    version = ["v1"]
+    answered = []
+
+    async def embed_query(query):
+        return [1.0, 0.0] if "RAG" in query else [0.0, 1.0]
+
+    async def retrieve(query, embedding=None):
+        return "context"
+
+    async def answer(query, context):
+        answered.append(query)
+        return f"answer to {query}"
+
+    ragqa.embed_query, ragqa.retrieve, ragqa.answer = embed_query, retrieve, answer
+    ragqa.store = SimpleNamespace(refresh=lambda: version[0])
+
+    assert asyncio.run(ragqa.run("What is RAG?")) == "answer to What is RAG?"
+    assert asyncio.run(ragqa.run("Explain RAG")) == "answer to What is RAG?"
+    version[0] = "v2"
+    assert asyncio.run(ragqa.run("Explain RAG")) == "answer to Explain RAG"
+    assert answered == ["What is RAG?", "Explain RAG"]
+
+
+def test_query_stream_sends_sources_first_then_tokens(monkeypatch, fake_encoding):
+    from types import SimpleNamespace
+    from fastapi.testclient import TestClient
+    from backend import main
+    rag_qa = main.rag_qa
+    sources = [{"id": "abc:0:0", "source": "a.pdf", "page": 0, "start_index": 0, "distance": 0.1}]
+
+    async def embed_query(query):
+        return [1.0, 0.0]
+
+    async def search(query, embedding=None):
+        return ["context"], sources
+
+    async def stream_answer(query, context):
+        for text in ["Hel", "lo"]:
+            yield text
+
+    monkeypatch.setattr(rag_qa, "embed_query", embed_query)
+    monkeypatch.setattr(rag_qa, "search", search)
+    monkeypatch.setattr(rag_qa, "stream_answer", stream_answer)
+    monkeypatch.setattr(rag_qa, "store", SimpleNamespace(refresh=lambda: "stream-test"))
+
+    response = TestClient(main.app).post("/query/stream", json={"question": "hi"})
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [block.split("\n") for block in response.text.strip().split("\n\n")]
+    assert [lines[0] for lines in events] == [
+        "event: sources", "event: context", "event: token", "event: token", "event: done"
+    ]
+    assert events[0][1] == f"data: {json.dumps(sources)}"
+    assert json.loads(events[1][1][len("data: "):])["chunks"] == 1
+    assert rag_qa.answers.get([1.0, 0.0], "stream-test") == "Hello"
+
+
+def test_query_batch_embeds_and_searches_once_and_streams_ndjson(monkeypatch, fake_encoding):
+    from types import SimpleNamespace
+    from fastapi.testclient import TestClient
+    from backend import main
+    rag_qa = main.rag_qa
+    questions = ["slow question", "fast question", "slow question"]
+    embed_calls, searches = [], []
+
+    async def embed(input, model):
+        embed_calls.append(input)
+        vectors = {"slow question": [1.0, 0.0], "fast question": [0.0, 1.0]}
+        return SimpleNamespace(data=[
+            SimpleNamespace(index=i, embedding=vectors[text]) for i, text in enumerate(input)
+        ])
+
+    async def complete(model, messages):
+        prompt = messages[0]["content"]
+        await asyncio.sleep(0.2 if "slow" in prompt else 0)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="answer"))])
+
+    def query(query_embeddings, n_results):
+        searches.append(query_embeddings)
+        count = len(query_embeddings)
+        return {"ids": [["a"]] * count, "documents": [["context"]] * count,
+                "metadatas": [[{}]] * count, "distances": [[0.0]] * count}
+
+    monkeypatch.setattr(rag_qa, "openai_client", SimpleNamespace(
+        embeddings=SimpleNamespace(create=embed),
+        chat=SimpleNamespace(completions=SimpleNamespace(create=complete)),
+    ))
+    monkeypatch.setattr(rag_qa, "store", SimpleNamespace(
+        refresh=lambda: "batch-test", collection=SimpleNamespace(query=query)
+    ))
+    monkeypatch.setattr(rag_qa, "query_embeddings", main.TTLCache(maxsize=8, ttl=60))
+
+    response = TestClient(main.app).post("/query/batch", json={"questions": questions})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert results[0]["index"] == 1
+    assert sorted(result["index"] for result in results) == [0, 1, 2]
+    assert all(result["answer"] == "answer" for result in results)
+    assert embed_calls == [["slow question", "fast question"]]
+    assert len(searches) == 1 and len(searches[0]) == 3
+
+
+def test_hybrid_search_fuses_vector_and_lexical_candidates():
+    from types import SimpleNamespace
+    from backend.main import RAGQA
+    ragqa = RAGQA(mode="hybrid")
+    chunks = {
+        "semantic": ("pump maintenance overview", {"source": "a.pdf", "page": 1}),
+        "both": ("pump seal XR-4471 replacement", {"source": "a.pdf", "page": 2}),
+        "code": ("XR-4471 torque table", {"source": "b.pdf", "page": 9}),
+    }
+
+    def query(query_embeddings, n_results):
+        ids = ["semantic", "both"]
+        return {"ids": [ids], "documents": [[chunks[i][0] for i in ids]],
+                "metadatas": [[chunks[i][1] for i in ids]], "distances": [[0.1, 0.2]]}
+
+    def get(ids):
+        return {"ids": ids, "documents": [chunks[i][0] for i in ids], "metadatas": [chunks[i][1] for i in ids]}
+
+    ragqa.store = SimpleNamespace(collection=SimpleNamespace(query=query, get=get))
+    ragqa.lexical = SimpleNamespace(collection=SimpleNamespace(
+        search=lambda query, k: [("code", 7.0), ("both", 5.0)]
+    ))
+
+    documents, sources = asyncio.run(ragqa.search("XR-4471 seal", k=3, embedding=[1.0, 0.0]))
+    assert [source["id"] for source in sources] == ["both", "semantic", "code"]
+    assert documents[2] == "XR-4471 torque table"
+    assert sources[2]["page"] == 9 and sources[2]["distance"] is None
+    assert sources[0]["distance"] == 0.2
+
+
+def test_metrics_endpoint_reports_stage_latency_tokens_and_cache_hits(monkeypatch, fake_encoding):
+    from types import SimpleNamespace
+    from fastapi.testclient import TestClient
+    from backend import main
+    rag_qa = main.rag_qa
+
+    async def embed(input, model):
+        return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=[0.3, 0.7]) for i, _ in enumerate(input)])
+
+    async def complete(model, messages):
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="answer"))],
+                               usage=SimpleNamespace(prompt_tokens=40, completion_tokens=2))
+
+    def query(query_embeddings, n_results):
+        return {"ids": [["m"]], "documents": [["metrics context"]], "metadatas": [[{}]], "distances": [[0.0]]}
+
+    monkeypatch.setattr(rag_qa, "openai_client", SimpleNamespace(
+        embeddings=SimpleNamespace(create=embed),
+        chat=SimpleNamespace(completions=SimpleNamespace(create=complete)),
+    ))
+    monkeypatch.setattr(rag_qa, "store", SimpleNamespace(
+        refresh=lambda: "metrics-test", collection=SimpleNamespace(query=query)
+    ))
+    monkeypatch.setattr(rag_qa, "query_embeddings", main.TTLCache(maxsize=8, ttl=60))
+    before = {stage: main.STAGE_SECONDS.count(stage) for stage in ("embed", "search", "context", "completion")}
+    prompt_tokens = main.TOKENS.value("prompt")
+
+    client = TestClient(main.app)
+    assert client.post("/query", json={"question": "metrics?"}).json() == {"answer": "answer"}
+    text = client.get("/metrics").text
+    assert {stage: main.STAGE_SECONDS.count(stage) - count for stage, count in before.items()} == {
+        "embed": 1, "search": 1, "context": 1, "completion": 1
+    }
+    assert main.TOKENS.value("prompt") == prompt_tokens + 40
+    assert 'rag_stage_seconds_bucket{stage="search",le="+Inf"}' in text
+    assert 'rag_cache_misses_total{cache="query_embeddings"} 1' in text
+    assert 'rag_http_request_seconds_count{method="POST",route="/query",status="200"}' in text
@@ -0,0 +1,55 @@
+from bm25 import BM25Index, tokenize
+
+
+def test_tokenize_keeps_identifiers_whole_and_split():
+    assert tokenize("Replace part XR-4471 (see ERR_CONN_RESET).") == [
+        "replace", "part", "xr-4471", "xr", "4471", "see", "err_conn_reset", "err", "conn", "reset",
+    ]
+
+
+def test_bm25_ranks_exact_codes_and_rare_terms_first(tmp_path):
+    index = BM25Index(str(tmp_path / "bm25"))
+    index.add(["pump", "valve", "code"], [
+        "The pump pressure drops when the intake filter clogs.",
+        "Close the valve before servicing the pump.",
+        "Error XR-4471 means the pump seal failed.",
+    ])
+    assert [chunk_id for chunk_id, _ in index.search("XR-4471")] == ["code"]
+    assert index.search("intake filter", k=1)[0][0] == "pump"
+    assert index.search("unrelated words") == []
+
+
+def test_bm25_segments_replace_delete_merge_and_reload(tmp_path):
+    path = str(tmp_path / "bm25")
+    writer = BM25Index(path, max_segments=3)
+    writer.add(["a", "b"], ["alpha apples", "beta bananas"])
+    reader = BM25Index(path)
+    assert reader.count() == 2
+
+    writer.add(["a"], ["alpha cherries"])
+    writer.delete(["b"])
+    reader.load()
+    assert reader.count() == 1
+    assert reader.search("apples") == []
+    assert reader.search("cherries")[0][0] == "a"
+    assert reader.search("bananas") == []
+
+    writer.add(["c"], ["gamma bananas"])
+    assert len(writer.segments) == 1  # fourth segment triggered a merge
+    reader.load()
+    assert reader.count() == 2
+    assert [chunk_id for chunk_id, _ in reader.search("bananas cherries")] in (["a", "c"], ["c", "a"])
+    assert BM25Index(path).search("gamma")[0][0] == "c"
+
+
+def test_bm25_writers_taking_turns_keep_each_others_segments(tmp_path):
+    path = str(tmp_path / "bm25")
+    worker = BM25Index(path)
+    worker.add(["a"], ["alpha pump"])
+    BM25Index(path).add(["b"], ["beta valve"])
+    # The worker's in-memory segments are stale; its next segment must not overwrite the offline one
+    worker.add(["c"], ["gamma seal"])
+    worker.delete(["a"])
+    reader = BM25Index(path)
+    assert reader.count() == 2
+    assert sorted(chunk_id for chunk_id, _ in reader.search("beta gamma alpha")) == ["b", "c"]
@@ -0,0 +1,43 @@
+from context import ContextBuilder
+
+
+def source(chunk_id, start_index, distance, page=0, name="a.pdf"):
+    return {"id": chunk_id, "source": name, "page": page, "start_index": start_index, "distance": distance}
+
+
+def test_context_merges_overlapping_windows_and_drops_near_duplicates(fake_encoding):
+    page = "one two three four five six seven eight nine ten eleven twelve"
+    first, second = page[:28], page[19:]  # "five six seven" -> "... eight nine" overlap
+    boilerplate = "all rights reserved by the publisher of this manual"
+    documents = [first, second, boilerplate, boilerplate + " 2024"]
+    sources = [source("a", 0, 0.1), source("b", 19, 0.2), source("c", 0, 0.3, page=5),
+               source("d", 0, 0.4, name="b.pdf")]
+
+    context = ContextBuilder(token_budget=100).build(documents, sources)
+    assert context.text == page + "\n\n" + boilerplate
+    assert [s["id"] for s in context.sources] == ["a", "b", "c"]
+    assert context.duplicates == 1
+    assert context.tokens_trimmed > 0
+
+
+def test_context_mmr_prefers_diverse_passages_within_budget(fake_encoding):
+    documents = [
+        "reset the router by holding the power button for ten seconds",
+        "reset the router by holding the power button for ten long seconds please",
+        "firmware updates are downloaded from the support portal",
+        "warranty claims need the original receipt and serial number " * 10,
+    ]
+    sources = [source(str(i), None, 0.1 + 0.01 * i) for i in range(len(documents))]
+
+    builder = ContextBuilder(token_budget=35, mmr_lambda=0.5, duplicate_threshold=1.1)
+    context = builder.build(documents, sources)
+    # Second chunk repeats the first; the long fourth one does not fit the budget
+    assert [s["id"] for s in context.sources] == ["0", "2", "1"]
+    assert context.tokens <= 35
+    assert builder.stats()["requests"] == 1
+
+
+def test_context_truncates_a_single_oversized_passage(fake_encoding):
+    context = ContextBuilder(token_budget=5).build(["word " * 50], [source("a", None, None)])
+    assert context.tokens == 5
+    assert context.text.split() == ["word"] * 5
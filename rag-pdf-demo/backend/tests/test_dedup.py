@@ -0,0 +1,46 @@
+from dedup import ChunkDeduplicator, DedupStore
+
+SECTION = (
+    "All rights reserved. This document is provided for informational purposes only and does not "
+    "constitute legal advice. Redistribution without written permission is prohibited. "
+    "Contact the compliance team for questions about acceptable use of this material."
+)
+
+
+def test_deduplicator_maps_exact_and_near_duplicates_to_canonical_chunk():
+    deduper = ChunkDeduplicator(threshold=0.7)
+    assert deduper.add("a:0:0", SECTION, {"source": "a.pdf"}) is None
+    assert deduper.add("b:0:0", SECTION.upper() + "  ", {"source": "b.pdf"}) == "a:0:0"
+    edited = SECTION.replace("questions about", "questions regarding")
+    assert deduper.add("c:3:10", edited, {"source": "c.pdf"}) == "a:0:0"
+    assert deduper.add("d:0:0", "Quarterly revenue grew in every region.", {"source": "d.pdf"}) is None
+    assert [ref["source"] for ref in deduper.refs["a:0:0"]] == ["a.pdf", "b.pdf", "c.pdf"]
+    assert (deduper.exact_duplicates, deduper.near_duplicates) == (1, 1)
+
+
+def test_seeded_chunks_from_earlier_runs_are_canonical():
+    deduper = ChunkDeduplicator(threshold=0.7)
+    deduper.seed("a:0:0", SECTION, [{"source": "a.pdf"}, {"source": "b.pdf"}])
+    assert deduper.add("c:0:0", SECTION.lower(), {"source": "c.pdf"}) == "a:0:0"
+    assert [ref["source"] for ref in deduper.refs["a:0:0"]] == ["a.pdf", "b.pdf", "c.pdf"]
+    assert deduper.seen == 1
+
+
+def test_dedup_store_restores_canonical_chunks_without_their_text(tmp_path):
+    store = DedupStore(str(tmp_path / "dedup.sqlite"))
+    deduper = ChunkDeduplicator(threshold=0.7)
+    deduper.add("a:0:0", SECTION, {"source": "a.pdf"})
+    deduper.add("d:0:0", "Quarterly revenue grew in every region.", {"source": "d.pdf"})
+    store.save(deduper, ["a:0:0", "d:0:0"])
+    store.update_refs({"a:0:0": [{"source": "a.pdf"}, {"source": "b.pdf"}]})
+
+    restored = ChunkDeduplicator(threshold=0.7)
+    # d is no longer in the manifest: its row is dropped
+    DedupStore(store.path).restore(restored, {"a:0:0"})
+    assert list(restored.refs) == ["a:0:0"]
+    edited = SECTION.replace("questions about", "questions regarding")
+    assert restored.add("c:0:0", edited, {"source": "c.pdf"}) == "a:0:0"
+    assert [ref["source"] for ref in restored.refs["a:0:0"]] == ["a.pdf", "b.pdf", "c.pdf"]
+    again = ChunkDeduplicator(threshold=0.7)
+    DedupStore(store.path).restore(again, {"a:0:0", "d:0:0"})
+    assert list(again.refs) == ["a:0:0"]
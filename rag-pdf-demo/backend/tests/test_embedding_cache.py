@@ -0,0 +1,19 @@
+from shared.embedding_cache import EmbeddingCache
+
+
+def test_embedding_cache_round_trip_and_counters(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"))
+    assert cache.get_many(["hello world", "other"], "model-a") == [None, None]
+    cache.put("hello world", "model-a", [0.5, 0.25])
+    assert cache.get("hello   world\n", "model-a") == [0.5, 0.25]
+    assert cache.get("hello world", "model-b") is None
+    assert cache.hits == 1 and cache.misses == 3
+
+
+def test_embedding_cache_evicts_least_recently_used(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"), max_entries=10)
+    cache.put_many([f"text {i}" for i in range(10)], "m", [[float(i)] for i in range(10)])
+    cache.get("text 0", "m")
+    cache.put("text 10", "m", [10.0])
+    assert cache.get("text 0", "m") == [0.0]
+    assert cache.stats()["entries"] <= 10
@@ -0,0 +1,103 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+import embeddings
+from embeddings import AsyncBatchEmbedder, BatchEmbedder, make_batches
+
+
+def api_error(error_class, status):
+    response = httpx.Response(status, request=httpx.Request("POST", "https://example.test/embeddings"))
+    return error_class("rejected", response=response, body=None)
+
+
+class FakeEmbeddingsClient:
+    def __init__(self, fail_on=None, error=None):
+        self.calls = []
+        self.fail_on = fail_on
+        self.error = error
+        self.embeddings = self
+
+    def create(self, input, model):
+        self.calls.append(list(input))
+        if self.error is not None:
+            raise self.error
+        if self.fail_on and self.fail_on in input and len(input) > 1:
+            raise api_error(openai.BadRequestError, 400)
+        data = [SimpleNamespace(index=i, embedding=[float(len(text))]) for i, text in enumerate(input)]
+        return SimpleNamespace(data=list(reversed(data)))
+
+
+def test_make_batches_caps_inputs_and_tokens():
+    assert make_batches([1, 1, 1, 1, 1], max_inputs=2, max_tokens=100) == [range(0, 2), range(2, 4), range(4, 5)]
+    assert make_batches([60, 60, 10, 200], max_inputs=10, max_tokens=100) == [range(0, 1), range(1, 3), range(3, 4)]
+
+
+def test_batch_embedder_preserves_order_and_splits_failed_batches(monkeypatch):
+    monkeypatch.setattr(embeddings, "count_tokens", lambda texts: [len(t) for t in texts])
+    texts = ["a", "bb", "ccc", "dddd"]
+    client = FakeEmbeddingsClient(fail_on="ccc")
+    embedder = BatchEmbedder(client, "test-deployment", max_inputs=4)
+    assert embedder.embed(texts) == [[1.0], [2.0], [3.0], [4.0]]
+    assert client.calls[0] == texts
+    assert embedder.requests > 1
+
+
+def test_batch_embedder_does_not_split_on_rate_limits(monkeypatch):
+    monkeypatch.setattr(embeddings, "count_tokens", lambda texts: [len(t) for t in texts])
+    client = FakeEmbeddingsClient(error=api_error(openai.RateLimitError, 429))
+    embedder = BatchEmbedder(client, "test-deployment", max_inputs=64)
+    with pytest.raises(openai.RateLimitError):
+        embedder.embed(["x"] * 64)
+    assert len(client.calls) == 1
+
+
+class FakeAsyncEmbeddingsClient:
+    def __init__(self, error=None, fail_on=None):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requests = 0
+        self.error = error
+        self.fail_on = fail_on
+        self.embeddings = self
+
+    async def create(self, input, model):
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        if self.error is not None:
+            raise self.error
+        if self.fail_on and self.fail_on in input and len(input) > 1:
+            raise api_error(openai.BadRequestError, 400)
+        return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=[float(len(t))]) for i, t in enumerate(input)])
+
+
+def test_async_batch_embedder_bounds_in_flight_requests(monkeypatch):
+    monkeypatch.setattr(embeddings, "count_tokens", lambda texts: [len(t) for t in texts])
+    client = FakeAsyncEmbeddingsClient()
+    embedder = AsyncBatchEmbedder(client, "test-deployment", concurrency=3, max_inputs=1)
+    texts = ["x" * n for n in range(1, 11)]
+    assert asyncio.run(embedder.embed(texts)) == [[float(n)] for n in range(1, 11)]
+    assert client.max_in_flight == 3
+    assert embedder.requests == 10
+
+
+def test_async_batch_embedder_retries_stay_within_the_window(monkeypatch):
+    monkeypatch.setattr(embeddings, "count_tokens", lambda texts: [len(t) for t in texts])
+    texts = [f"text {i}" for i in range(128)]
+    client = FakeAsyncEmbeddingsClient(fail_on="text 5")
+    embedder = AsyncBatchEmbedder(client, "test-deployment", concurrency=2, max_inputs=32)
+    assert len(asyncio.run(embedder.embed(texts))) == 128
+    assert client.max_in_flight <= 2
+
+    client = FakeAsyncEmbeddingsClient(error=api_error(openai.RateLimitError, 429))
+    embedder = AsyncBatchEmbedder(client, "test-deployment", concurrency=2, max_inputs=32)
+    with pytest.raises(openai.RateLimitError):
+        asyncio.run(embedder.embed(texts))
+    assert client.max_in_flight <= 2
+    assert client.requests <= 2
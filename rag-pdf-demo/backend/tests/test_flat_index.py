@@ -0,0 +1,78 @@
+import os
+
+import numpy as np
+import pytest
+
+from flat_index import FlatIndex
+
+
+def test_flat_index_exact_top_k_for_batched_queries(tmp_path):
+    index = FlatIndex(str(tmp_path / "flat"))
+    index.upsert(ids=["x", "y", "xy"], embeddings=[[1, 0], [0, 3], [1, 1]],
+                 documents=["X", "Y", "XY"], metadatas=[{"page": 0}, {"page": 1}, {"page": 2}])
+
+    results = index.query(query_embeddings=[[2, 0], [0, 1]], n_results=2)
+    assert results["ids"] == [["x", "xy"], ["y", "xy"]]
+    assert results["documents"][0] == ["X", "XY"]
+    assert results["metadatas"][1] == [{"page": 1}, {"page": 2}]
+    assert np.allclose(results["distances"][0], [0.0, 2 - np.sqrt(2)])
+    assert index.query(query_embeddings=[[1, 0]], n_results=10)["ids"] == [["x", "xy", "y"]]
+
+
+def test_flat_index_persists_appends_and_tombstones_across_processes(tmp_path):
+    path = str(tmp_path / "flat")
+    writer = FlatIndex(path)
+    writer.upsert(ids=["a", "b"], embeddings=[[1, 0], [0, 1]], documents=["A", "B"])
+    reader = FlatIndex(path)
+    assert reader.count() == 2
+
+    writer.upsert(ids=["a", "c"], embeddings=[[0.2, 1], [1, 0]], documents=["A2", "C"])
+    writer.update(ids=["b"], metadatas=[{"duplicates": 1}])
+    writer.delete(ids=["c"])
+    reader.load()
+    assert reader.count() == 2
+    results = reader.query(query_embeddings=[[0, 1]], n_results=3)
+    assert results["ids"] == [["b", "a"]]
+    assert results["documents"][0] == ["B", "A2"]
+    assert results["metadatas"][0][0] == {"duplicates": 1}
+
+
+def test_flat_index_compacts_when_tombstones_outnumber_live_rows(tmp_path):
+    path = str(tmp_path / "flat")
+    index = FlatIndex(path)
+    index.upsert(ids=list("abcd"), embeddings=np.eye(4), documents=list("ABCD"))
+    reader = FlatIndex(path)
+    index.delete(ids=["a", "b", "c"])
+    assert np.load(index.vectors_path).shape == (1, 4)
+    reader.load()
+    assert reader.count() == 1
+    assert reader.query(query_embeddings=[[0, 0, 0, 1]], n_results=2)["ids"] == [["d"]]
+
+
+def test_flat_index_recovers_from_compaction_interrupted_between_replaces(tmp_path, monkeypatch):
+    path = str(tmp_path / "flat")
+    index = FlatIndex(path)
+    index.upsert(ids=list("abcd"), embeddings=np.eye(4), documents=list("ABCD"))
+    index.delete(ids=["b"])
+    replace = os.replace
+
+    def crash_before_log(src, dst):
+        if dst == index.chunks_path:
+            raise OSError("crashed")
+        replace(src, dst)
+
+    monkeypatch.setattr(os, "replace", crash_before_log)
+    with pytest.raises(OSError):
+        index.compact()
+    monkeypatch.setattr(os, "replace", replace)
+    # Compacted matrix (3 rows) next to the old log (4 adds, 1 delete)
+    assert np.load(index.vectors_path).shape == (3, 4)
+
+    reader = FlatIndex(path)
+    assert reader.count() == 3
+    assert reader.query(query_embeddings=[[0, 0, 1, 0]], n_results=1)["ids"] == [["c"]]
+    assert reader.get(["d"])["documents"] == ["D"]
+
+    # The next write finishes the compaction before appending
+    reader.upsert(ids=["e"], embeddings=[[1, 1, 0, 0]], documents=["E"])
+    assert FlatIndex(path).query(query_embeddings=np.eye(4), n_results=1)["ids"] == [["a"], ["e"], ["c"], ["d"]]
@@ -6,3 +6,206 @@ def test_pdf_ingestor_stub():
     assert hasattr(ingestor, 'generate_embeddings')
     assert hasattr(ingestor, 'build_vectorstore')
     assert hasattr(ingestor, 'run')
+
+
+def test_ingest_files_commits_in_batches_and_records_manifest(tmp_path, monkeypatch, fake_encoding):
+    import os
+    import shutil
+    from types import SimpleNamespace
+    import chromadb
+    from backend import ingest
+    from shared.embedding_cache import EmbeddingCache
+
+    class FakeEmbeddingsClient:
+        def __init__(self):
+            self.embeddings = self
+
+        def create(self, input, model):
+            return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=[float(len(t)), 1.0]) for i, t in enumerate(input)])
+
+    monkeypatch.setattr(ingest, "client", FakeEmbeddingsClient())
+    data_path = tmp_path / "data"
+    data_path.mkdir()
+    sample = os.path.join(os.path.dirname(__file__), "..", "data", "Developer quickstart - OpenAI API.pdf")
+    shutil.copy(sample, data_path / "original.pdf")
+    shutil.copy(sample, data_path / "copy.pdf")
+    ingestor = ingest.PDFIngestor(
+        data_path=str(data_path),
+        concurrency=1,
+        embedding_cache=EmbeddingCache(str(tmp_path / "cache.sqlite")),
+        chroma_client=chromadb.PersistentClient(path=str(tmp_path / "chroma")),
+        manifest_path=str(tmp_path / "manifest.json"),
+        commit_batch_size=4,
+        chunk_tokens=50,
+        chunk_overlap_tokens=5,
+        version_path=str(tmp_path / "version"),
+        bm25_path=str(tmp_path / "bm25"),
+    )
+    ingestor.run()
+    original, copy = ingestor.manifest.files.values()
+    collection = ingestor.get_collection()
+    assert original["chunk_ids"] == copy["chunk_ids"]
+    assert collection.count() == len(set(original["chunk_ids"])) > 4
+    metadata = collection.get(ids=[original["chunk_ids"][0]])["metadatas"][0]
+    assert metadata["duplicates"] == 1
+    assert (tmp_path / "version").exists()
+
+
+def test_ingest_into_flat_index(tmp_path, monkeypatch, fake_encoding):
+    import os
+    import shutil
+    from types import SimpleNamespace
+    from backend import ingest
+    from flat_index import FlatIndex
+    from shared.embedding_cache import EmbeddingCache
+
+    def create(input, model):
+        return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=[float(len(t)), 1.0]) for i, t in enumerate(input)])
+
+    monkeypatch.setattr(ingest, "client", SimpleNamespace(embeddings=SimpleNamespace(create=create)))
+    data_path = tmp_path / "data"
+    data_path.mkdir()
+    sample = os.path.join(os.path.dirname(__file__), "..", "data", "Developer quickstart - OpenAI API.pdf")
+    shutil.copy(sample, data_path / "sample.pdf")
+    ingestor = ingest.PDFIngestor(
+        data_path=str(data_path),
+        concurrency=1,
+        embedding_cache=EmbeddingCache(str(tmp_path / "cache.sqlite")),
+        manifest_path=str(tmp_path / "manifest.json"),
+        commit_batch_size=4,
+        chunk_tokens=50,
+        chunk_overlap_tokens=5,
+        version_path=str(tmp_path / "version"),
+        backend="flat",
+        flat_index_path=str(tmp_path / "flat"),
+        bm25_path=str(tmp_path / "bm25"),
+    )
+    ingestor.run()
+    chunk_ids = set(ingestor.manifest.files[str(data_path / "sample.pdf")]["chunk_ids"])
+    index = FlatIndex(str(tmp_path / "flat"))
+    assert index.count() == len(chunk_ids) > 4
+    results = index.query(query_embeddings=[[100.0, 1.0]], n_results=3)
+    assert set(results["ids"][0]) <= chunk_ids
+    assert results["metadatas"][0][0]["source"].endswith("sample.pdf")
+
+
+def test_dedup_spans_runs_and_removal_updates_back_references(tmp_path, monkeypatch, fake_encoding):
+    import json
+    import os
+    import shutil
+    from types import SimpleNamespace
+    import chromadb
+    from backend import ingest
+    from shared.embedding_cache import EmbeddingCache
+
+    embedded = []
+
+    class FakeEmbeddingsClient:
+        def __init__(self):
+            self.embeddings = self
+
+        def create(self, input, model):
+            embedded.extend(input)
+            return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=[float(len(t)), 1.0]) for i, t in enumerate(input)])
+
+    monkeypatch.setattr(ingest, "client", FakeEmbeddingsClient())
+    data_path = tmp_path / "data"
+    data_path.mkdir()
+    sample = os.path.join(os.path.dirname(__file__), "..", "data", "Developer quickstart - OpenAI API.pdf")
+    shutil.copy(sample, data_path / "original.pdf")
+
+    def run():
+        # A fresh ingestor per run, like separate `python ingest.py` invocations
+        ingestor = ingest.PDFIngestor(
+            data_path=str(data_path),
+            concurrency=1,
+            # No embedding cache hits: every chunk sent to the client is counted
+            embedding_cache=EmbeddingCache(str(tmp_path / f"cache{len(embedded)}.sqlite")),
+            chroma_client=chromadb.PersistentClient(path=str(tmp_path / "chroma")),
+            manifest_path=str(tmp_path / "manifest.json"),
+            chunk_tokens=50,
+            chunk_overlap_tokens=5,
+            version_path=str(tmp_path / "version"),
+            bm25_path=str(tmp_path / "bm25"),
+        )
+        ingestor.run()
+        return ingestor
+
+    ingestor = run()
+    chunk_ids = ingestor.manifest.files[str(data_path / "original.pdf")]["chunk_ids"]
+    first_run = len(embedded)
+    assert first_run == len(set(chunk_ids))
+
+    shutil.copy(sample, data_path / "copy.pdf")
+    read_back = []
+    iter_stored = ingest.PDFIngestor._iter_stored
+    monkeypatch.setattr(ingest.PDFIngestor, "_iter_stored", lambda self, ids: read_back.extend(ids) or iter_stored(self, ids))
+    ingestor = run()
+    assert len(embedded) == first_run
+    # The deduplicator was restored from its saved state, not from the stored chunks
+    assert read_back == []
+    metadata = ingestor.get_collection().get(ids=[chunk_ids[0]])["metadatas"][0]
+    assert metadata["duplicates"] == 1
+    assert {ref["source"] for ref in json.loads(metadata["locations"])} == {
+        str(data_path / "original.pdf"), str(data_path / "copy.pdf"),
+    }
+
+    os.remove(data_path / "original.pdf")
+    ingestor = run()
+    collection = ingestor.get_collection()
+    assert collection.count() == len(set(chunk_ids))
+    metadata = collection.get(ids=[chunk_ids[0]])["metadatas"][0]
+    assert metadata["source"] == str(data_path / "copy.pdf")
+    assert metadata["duplicates"] == 0
+    assert [ref["source"] for ref in json.loads(metadata["locations"])] == [str(data_path / "copy.pdf")]
+
+
+def test_writers_taking_turns_append_after_each_other(tmp_path, monkeypatch, fake_encoding):
+    import os
+    import shutil
+    from types import SimpleNamespace
+    from backend import ingest
+    from flat_index import FlatIndex
+    from shared.embedding_cache import EmbeddingCache
+
+    def create(input, model):
+        return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=[float(len(t)), 1.0]) for i, t in enumerate(input)])
+
+    monkeypatch.setattr(ingest, "client", SimpleNamespace(embeddings=SimpleNamespace(create=create)))
+    data_path = tmp_path / "data"
+    data_path.mkdir()
+    sample = os.path.join(os.path.dirname(__file__), "..", "data", "Developer quickstart - OpenAI API.pdf")
+    paths = []
+    for i in range(3):
+        # Trailing bytes give each copy its own file hash, so its own chunk IDs
+        shutil.copy(sample, data_path / f"{i}.pdf")
+        with open(data_path / f"{i}.pdf", "ab") as f:
+            f.write(f"\n% copy {i}\n".encode())
+        paths.append(str(data_path / f"{i}.pdf"))
+
+    def ingestor():
+        return ingest.PDFIngestor(
+            data_path=str(data_path),
+            concurrency=1,
+            embedding_cache=EmbeddingCache(str(tmp_path / "cache.sqlite")),
+            manifest_path=str(tmp_path / "manifest.json"),
+            chunk_tokens=50,
+            chunk_overlap_tokens=5,
+            dedup_threshold=None,
+            version_path=str(tmp_path / "version"),
+            backend="flat",
+            flat_index_path=str(tmp_path / "flat"),
+            bm25_path=str(tmp_path / "bm25"),
+        )
+
+    # A long-lived writer (the API worker) and an offline run take turns
+    worker, offline = ingestor(), ingestor()
+    worker.ingest_paths(paths[:1])
+    offline.ingest_paths(paths[1:2])
+    worker.ingest_paths(paths[2:])
+    # The manifest was reloaded under the lock, so it lists all three files
+    chunk_ids = [cid for path in paths for cid in worker.manifest.files[path]["chunk_ids"]]
+    index = FlatIndex(str(tmp_path / "flat"))
+    assert index.count() == len(set(chunk_ids)) > 4
+    assert index.view[1].shape[0] == len(index.ids)
+    assert index.get(chunk_ids)["ids"] == chunk_ids
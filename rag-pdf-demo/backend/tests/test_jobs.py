@@ -0,0 +1,49 @@
+
+from jobs import IngestJobQueue
+
+
+def test_job_queue_coalesces_burst_of_uploads_into_one_run():
+    runs = []
+
+    def fake_ingest(paths, on_commit):
+        runs.append(paths)
+        on_commit(paths[:1], 10)
+        on_commit(paths[1:], 5)
+
+    jobs = IngestJobQueue(fake_ingest, coalesce_window=0.2)
+    submitted = [jobs.submit([f"data/{name}.pdf"]) for name in ("a", "b", "c")]
+    jobs.stop()
+    assert runs == [["data/a.pdf", "data/b.pdf", "data/c.pdf"]]
+    for job in submitted:
+        status = jobs.get(job.id).to_dict()
+        assert status["status"] == "done"
+        assert status["files_done"] == 1
+        assert status["chunks"] == 15
+        assert status["coalesced_jobs"] == 3
+
+def test_job_queue_reports_failures():
+    def failing_ingest(paths, on_commit):
+        raise RuntimeError("embedding endpoint unavailable")
+
+    jobs = IngestJobQueue(failing_ingest, coalesce_window=0)
+    job = jobs.submit(["data/a.pdf"])
+    jobs.stop()
+    assert job.to_dict()["status"] == "failed"
+    assert job.error == "embedding endpoint unavailable"
+
+
+def test_job_queue_reports_files_that_were_not_ingested():
+    def ingest_skipping_b(paths, on_commit):
+        # b.pdf failed to parse, so it is never committed
+        on_commit([path for path in paths if not path.endswith("b.pdf")], 3)
+
+    jobs = IngestJobQueue(ingest_skipping_b, coalesce_window=0.1)
+    partial = jobs.submit(["data/a.pdf", "data/b.pdf"])
+    skipped = jobs.submit(["data/b.pdf"])
+    jobs.stop()
+    assert partial.to_dict()["status"] == "partial"
+    assert partial.to_dict()["files_done"] == 1
+    assert partial.to_dict()["skipped_files"] == ["data/b.pdf"]
+    assert "1 of 2 files" in partial.error
+    assert skipped.to_dict()["status"] == "failed"
+    assert skipped.to_dict()["skipped_files"] == ["data/b.pdf"]
@@ -0,0 +1,50 @@
+from manifest import IngestManifest, chunk_id, file_sha256
+
+
+def test_manifest_diff_detects_new_changed_and_removed_files(tmp_path):
+    a, b = tmp_path / "a.pdf", tmp_path / "b.pdf"
+    a.write_bytes(b"first")
+    b.write_bytes(b"second")
+    manifest = IngestManifest(str(tmp_path / "manifest.json"))
+    changed, removed = manifest.diff([str(a), str(b)])
+    assert set(changed) == {str(a), str(b)} and removed == []
+    for path, file_hash in changed.items():
+        manifest.record(path, file_hash, [chunk_id(file_hash, 0, 0)])
+    manifest.save()
+
+    manifest = IngestManifest(str(tmp_path / "manifest.json"))
+    a.write_bytes(b"first, edited")
+    changed, removed = manifest.diff([str(a)])
+    assert changed == {str(a): file_sha256(str(a))}
+    assert removed == [str(b)]
+    assert manifest.remove(removed) == [chunk_id(file_sha256(str(b)), 0, 0)]
+
+
+def test_locked_manifest_runs_take_turns_and_keep_each_others_entries(tmp_path):
+    import threading
+    import time
+
+    path = str(tmp_path / "manifest.json")
+    a, b = tmp_path / "a.pdf", tmp_path / "b.pdf"
+    a.write_bytes(b"first")
+    b.write_bytes(b"second")
+    # Both writers load the (empty) manifest before either runs
+    api, offline = IngestManifest(path), IngestManifest(path)
+    order = []
+
+    def offline_run():
+        with offline.locked():
+            order.append("offline")
+            offline.record(str(b), file_sha256(str(b)), ["b:0:0"])
+            offline.save()
+
+    with api.locked():
+        thread = threading.Thread(target=offline_run)
+        thread.start()
+        time.sleep(0.1)
+        order.append("api")
+        api.record(str(a), file_sha256(str(a)), ["a:0:0"])
+        api.save()
+    thread.join(5)
+    assert order == ["api", "offline"]
+    assert set(IngestManifest(path).files) == {str(a), str(b)}
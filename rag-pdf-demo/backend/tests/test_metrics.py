@@ -0,0 +1,52 @@
+import pytest
+
+from metrics import MetricsMiddleware, Registry
+
+
+def test_registry_renders_prometheus_text():
+    registry = Registry()
+    requests = registry.counter("demo_requests_total", "Requests", ["endpoint"])
+    latency = registry.histogram("demo_seconds", "Latency", ["stage"], buckets=(0.1, 1.0))
+    registry.callback("demo_hits_total", "Hits", "counter", ["cache"], lambda: {("answers",): 3})
+    requests.inc("query")
+    requests.inc("query", amount=2)
+    latency.observe(0.05, "embed")
+    latency.observe(0.5, "embed")
+    latency.observe(5.0, "embed")
+
+    text = registry.render()
+    assert "# TYPE demo_requests_total counter\ndemo_requests_total{endpoint=\"query\"} 3" in text
+    assert 'demo_seconds_bucket{stage="embed",le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{stage="embed",le="1.0"} 2' in text
+    assert 'demo_seconds_bucket{stage="embed",le="+Inf"} 3' in text
+    assert 'demo_seconds_sum{stage="embed"} 5.55' in text
+    assert 'demo_seconds_count{stage="embed"} 3' in text
+    assert 'demo_hits_total{cache="answers"} 3' in text
+    with pytest.raises(ValueError):
+        registry.counter("demo_requests_total", "Again")
+
+
+def test_timer_counts_errors_and_middleware_sends_server_timing():
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    registry = Registry()
+    http = registry.histogram("http_seconds", "HTTP", ["method", "route", "status"])
+    stages = registry.histogram("stage_seconds", "Stages", ["stage"])
+    errors = registry.counter("stage_errors_total", "Errors", ["stage"])
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware, histogram=http, server_timing_header=True)
+
+    @app.get("/items/{item_id}")
+    def item(item_id: int):
+        with stages.time("lookup", errors=errors):
+            pass
+        with pytest.raises(KeyError), stages.time("fail", errors=errors):
+            raise KeyError(item_id)
+        return {"id": item_id}
+
+    response = TestClient(app).get("/items/7")
+    names = [part.split(";")[0] for part in response.headers["server-timing"].split(", ")]
+    assert names == ["lookup", "fail"]
+    assert stages.count("lookup") == 1
+    assert errors.value("fail") == 1 and errors.value("lookup") == 0
+    assert http.count("GET", "/items/{item_id}", "200") == 1
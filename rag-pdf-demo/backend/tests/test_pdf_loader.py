@@ -0,0 +1,38 @@
+import os
+
+from pdf_loader import ParallelPDFLoader
+
+PDF_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "Developer quickstart - OpenAI API.pdf")
+
+
+def test_parallel_loader_keeps_input_order_and_reports_failures(tmp_path):
+    missing = str(tmp_path / "missing.pdf")
+    results = list(ParallelPDFLoader(workers=2).iter_files([missing, PDF_PATH, PDF_PATH]))
+    assert [path for path, _ in results] == [missing, PDF_PATH, PDF_PATH]
+    assert results[0][1] is None
+    assert len(results[1][1]) == len(results[2][1]) > 0
+
+
+def slow_or_fast(path):
+    """Parse stand-in: records each call next to the path; 'slow' files hang."""
+    import time
+    with open(path, "a") as f:
+        f.write("parsed\n")
+    if "slow" in path:
+        time.sleep(120)
+    return [path]
+
+
+def test_timeout_applies_with_one_worker_and_keeps_finished_results(tmp_path):
+    fast, slow, after = (str(tmp_path / name) for name in ("fast", "slow", "after"))
+    loader = ParallelPDFLoader(workers=1, timeout=10, parse=slow_or_fast)
+    assert list(loader.iter_files([fast, slow, after])) == [(fast, [fast]), (slow, None), (after, [after])]
+
+    first, hang, second = (str(tmp_path / name) for name in ("first", "slow2", "second"))
+    loader = ParallelPDFLoader(workers=2, timeout=10, parse=slow_or_fast)
+    results = list(loader.iter_files([hang, first, second]))
+    assert results == [(hang, None), (first, [first]), (second, [second])]
+    # Files finished by the other worker during the timeout were not parsed again
+    for path in (first, second):
+        with open(path) as f:
+            assert f.read().count("parsed") == 1
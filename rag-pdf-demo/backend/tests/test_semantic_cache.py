@@ -0,0 +1,29 @@
+import time
+
+from semantic_cache import SemanticCache
+
+
+def test_semantic_cache_serves_close_queries_until_the_version_changes():
+    cache = SemanticCache(threshold=0.95, maxsize=2, ttl=60)
+    cache.put([1.0, 0.0], "answer", version="v1", cost=2.0)
+
+    assert cache.get([0.99, 0.05], version="v1") == "answer"
+    assert cache.get([0.0, 1.0], version="v1") is None
+    assert cache.latency_saved == 2.0
+
+    assert cache.get([1.0, 0.0], version="v2") is None
+    assert cache.invalidations == 1
+    assert len(cache) == 0
+
+
+def test_semantic_cache_evicts_least_recently_used_and_expired_entries():
+    cache = SemanticCache(threshold=0.95, maxsize=2, ttl=0.05)
+    cache.put([1.0, 0.0], "a", version="v1", cost=1.0)
+    cache.put([0.0, 1.0], "b", version="v1", cost=1.0)
+    assert cache.get([1.0, 0.0], version="v1") == "a"
+    cache.put([1.0, 1.0], "c", version="v1", cost=1.0)
+    assert cache.get([0.0, 1.0], version="v1") is None
+    assert cache.get([1.0, 1.0], version="v1") == "c"
+
+    time.sleep(0.06)
+    assert cache.get([1.0, 0.0], version="v1") is None
@@ -0,0 +1,48 @@
+from langchain_core.documents import Document
+
+from tokens import TokenTextSplitter
+
+
+def test_token_splitter_sizes_and_overlaps_chunks_in_tokens(fake_encoding):
+    text = " ".join(f"word{i}" for i in range(25))
+    splitter = TokenTextSplitter(chunk_tokens=10, overlap_tokens=2)
+    chunks = splitter.split_documents([Document(page_content=text, metadata={"page": 3})])
+    assert [len(fake_encoding.encode(c.page_content)) for c in chunks] == [10, 10, 9]
+    assert chunks[1].page_content.startswith("word8 word9 ")
+    for chunk in chunks:
+        assert text[chunk.metadata["start_index"]:].startswith(chunk.page_content)
+        assert chunk.metadata["page"] == 3
+
+
+def test_estimates_until_the_encoding_loads_and_retries_failed_loads(monkeypatch, fake_encoding):
+    import threading
+    import time
+    import tokens
+
+    loaded = threading.Event()
+    attempts = []
+
+    def get_encoding(name=None):
+        attempts.append(name)
+        if len(attempts) == 1:
+            raise OSError("offline")
+        loaded.set()
+        return fake_encoding
+
+    monkeypatch.setattr(tokens, "get_encoding", get_encoding)
+    monkeypatch.setattr(tokens, "_encoding", None)
+    monkeypatch.setattr(tokens, "_next_load", 0.0)
+    # The first load fails: counts are estimated and no new load starts before the retry time
+    assert not tokens.load_encoding()
+    assert tokens.count_tokens(["a" * 40], estimate=True) == [11]
+    assert tokens.truncate_tokens("word " * 20, 2, estimate=True) == "word wor"
+    assert len(attempts) == 1
+
+    # Once the retry time passes, the next count starts a background load
+    monkeypatch.setattr(tokens, "_next_load", 0.0)
+    tokens.count_tokens(["a" * 40], estimate=True)
+    assert loaded.wait(5)
+    deadline = time.monotonic() + 5
+    while tokens._encoding is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert tokens.count_tokens(["two words"], estimate=True) == [2]
@@ -0,0 +1,37 @@
+import os
+import subprocess
+import sys
+
+from flat_index import FlatIndex
+from vectorstore import SharedCollection, SharedFlatIndex, bump_version
+
+WRITER = """
+import sys
+sys.path.insert(0, {backend!r})
+from vectorstore import bump_version, open_client
+open_client({path!r}).get_or_create_collection("pdf_chunks").upsert(
+    ids=["a"], embeddings=[[1.0, 0.0]], documents=["committed by ingest"]
+)
+bump_version({version!r})
+"""
+
+
+def test_shared_collection_sees_commits_from_another_process(tmp_path):
+    path, version = str(tmp_path / "chroma"), str(tmp_path / "version")
+    store = SharedCollection(path=path, version_path=version)
+    assert store.collection.count() == 0
+    backend = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    subprocess.run([sys.executable, "-c", WRITER.format(backend=backend, path=path, version=version)], check=True)
+    results = store.collection.query(query_embeddings=[[1.0, 0.0]], n_results=1)
+    assert results["documents"] == [["committed by ingest"]]
+
+
+def test_shared_flat_index_loads_appends_after_a_version_bump(tmp_path):
+    path, version = str(tmp_path / "flat"), str(tmp_path / "version")
+    store = SharedFlatIndex(path=path, version_path=version)
+    assert store.collection.count() == 0
+    FlatIndex(path).upsert(ids=["a"], embeddings=[[1.0, 0.0]], documents=["committed by ingest"])
+    assert store.collection.count() == 0
+    bump_version(version)
+    results = store.collection.query(query_embeddings=[[1.0, 0.0]], n_results=1)
+    assert results["documents"] == [["committed by ingest"]]
@@ -0,0 +1,140 @@
+"""
+tokens.py: Token counting and token-sized chunking.
+
+Chunks are sized and overlapped in tokens rather than characters, so every
+chunk uses a predictable share of the embedding and prompt budget. The
+tiktoken encoding is loaded once per process and documents are encoded in
+batches (tiktoken's batch encoder uses a thread pool).
+
+Loading the encoding may download it, so the query API never waits for it:
+load_encoding_in_background() starts the load at startup, and counts with
+estimate=True use 4 characters per token until it is loaded (a failed load is
+retried after ENCODING_RETRY_SECONDS). Ingestion keeps exact, blocking counts.
+"""
+import threading
+import time
+from functools import lru_cache
+from typing import Iterable, List, Sequence
+
+import tiktoken
+from langchain_core.documents import Document
+
+
+# Tokenizer used by text-embedding-ada-002, text-embedding-3-* and gpt-4/gpt-3.5
+DEFAULT_ENCODING = "cl100k_base"
+# Chunk size and overlap in tokens
+CHUNK_TOKENS = 200
+CHUNK_OVERLAP_TOKENS = 20
+# Characters per token assumed until the encoding is loaded
+CHARS_PER_TOKEN = 4
+# Seconds to wait before trying again to load an encoding that failed to load
+ENCODING_RETRY_SECONDS = 300
+
+# The default encoding once load_encoding() succeeded
+_encoding = None
+# time.monotonic() before which no new load is started (one in flight, or a recent failure)
+_next_load = 0.0
+_load_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def get_encoding(name: str = DEFAULT_ENCODING) -> tiktoken.Encoding:
+    """Return a process-wide cached tiktoken encoding."""
+    return tiktoken.get_encoding(name)
+
+
+def load_encoding() -> bool:
+    """Load the default encoding (blocking). Returns whether it is available."""
+    global _encoding, _next_load
+    try:
+        _encoding = get_encoding()
+        return True
+    except Exception as e:
+        print(f"tiktoken encoding unavailable, estimating tokens for now: {e}")
+        with _load_lock:
+            _next_load = time.monotonic() + ENCODING_RETRY_SECONDS
+        return False
+
+
+def load_encoding_in_background() -> None:
+    """Start load_encoding() on a thread unless it is loaded, loading, or failed recently."""
+    global _next_load
+    if _encoding is not None:
+        return
+    with _load_lock:
+        if time.monotonic() < _next_load:
+            return
+        # Blocks other attempts until this one finishes (a failure sets the retry time)
+        _next_load = float("inf")
+    threading.Thread(target=load_encoding, name="load-encoding", daemon=True).start()
+
+
+def _loaded_encoding():
+    """The default encoding if loaded; otherwise None, after starting a (re)load if one is due."""
+    if _encoding is None:
+        load_encoding_in_background()
+    return _encoding
+
+
+def count_tokens(texts: Sequence[str], estimate: bool = False) -> List[int]:
+    """
+    Count tokens for many texts in one batched encode call. With estimate=True
+    this never blocks on loading the encoding: until it is loaded, tokens are
+    estimated from the text length.
+    """
+    encoding = _loaded_encoding() if estimate else get_encoding()
+    if encoding is None:
+        return [len(text) // CHARS_PER_TOKEN + 1 for text in texts]
+    return [len(tokens) for tokens in encoding.encode_ordinary_batch(list(texts))]
+
+
+def truncate_tokens(text: str, max_tokens: int, estimate: bool = False) -> str:
+    """The longest prefix of text that is at most max_tokens tokens (estimated, see count_tokens)."""
+    encoding = _loaded_encoding() if estimate else get_encoding()
+    if encoding is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+    return encoding.decode(encoding.encode_ordinary(text)[:max_tokens])
+
+
+class TokenTextSplitter:
+    """
+    Split documents into windows of `chunk_tokens` tokens, each overlapping the
+    previous by `overlap_tokens`. Chunk text is sliced from the original string
+    at token boundaries, and `start_index` records its character offset.
+    """
+
+    def __init__(self, chunk_tokens: int = CHUNK_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+                 encoding_name: str = DEFAULT_ENCODING):
+        if not 0 <= overlap_tokens < chunk_tokens:
+            raise ValueError("overlap_tokens must be at least 0 and smaller than chunk_tokens")
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.encoding_name = encoding_name
+
+    def split_text(self, text: str) -> List[str]:
+        return [chunk for chunk, _ in self._split(text, get_encoding(self.encoding_name).encode_ordinary(text))]
+
+    def split_documents(self, documents: Iterable[Document]) -> List[Document]:
+        documents = list(documents)
+        encoding = get_encoding(self.encoding_name)
+        batch_tokens = encoding.encode_ordinary_batch([document.page_content for document in documents])
+        chunks = []
+        for document, tokens in zip(documents, batch_tokens):
+            for text, start_index in self._split(document.page_content, tokens):
+                chunks.append(Document(page_content=text, metadata={**document.metadata, "start_index": start_index}))
+        return chunks
+
+    def _split(self, text: str, tokens: List[int]):
+        if not tokens:
+            return []
+        _, offsets = get_encoding(self.encoding_name).decode_with_offsets(tokens)
+        step = self.chunk_tokens - self.overlap_tokens
+        windows = []
+        for start in range(0, len(tokens), step):
+            end = start + self.chunk_tokens
+            char_start = offsets[start]
+            char_end = offsets[end] if end < len(tokens) else len(text)
+            windows.append((text[char_start:char_end], char_start))
+            if end >= len(tokens):
+                break
+        return windows
@@ -0,0 +1,149 @@
+"""
+vectorstore.py: On-disk Chroma store shared by ingest.py and the query API.
+
+Both processes open the same persistent directory by path. A Chroma client
+only sees writes made through its own process, so ingestion bumps a version
+file after every commit, and the API-side SharedCollection reopens its client
+when that version changes. Checking the version costs one tiny file read per
+access, and new ingest results are served without restarting the API.
+
+RETRIEVAL_BACKEND=flat swaps Chroma for the in-process NumPy index in
+flat_index.py, and RETRIEVAL_BACKEND=ivfpq searches that same store through
+the approximate index in ann_index.py; both follow ingest commits the same way.
+"""
+import os
+import threading
+import time
+
+import chromadb
+from chromadb.api.client import SharedSystemClient
+
+from ann_index import IVFPQIndex
+from bm25 import BM25Index
+from flat_index import FlatIndex
+
+
+# Resolved relative to this file so ingest.py and main.py agree whatever their cwd
+VECTORSTORE_DIR = os.getenv(
+    "VECTORSTORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "vectorstore")
+)
+CHROMA_PATH = os.path.join(VECTORSTORE_DIR, "chroma")
+# Bumped by ingestion after each commit
+VERSION_PATH = os.path.join(VECTORSTORE_DIR, "version")
+CHROMA_COLLECTION_NAME = "pdf_chunks"
+# "chroma", "flat" (exact search over a memory-mapped NumPy matrix) or
+# "ivfpq" (approximate search over the flat store, for millions of chunks)
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "chroma")
+FLAT_INDEX_PATH = os.path.join(VECTORSTORE_DIR, "flat")
+ANN_INDEX_PATH = os.path.join(VECTORSTORE_DIR, "ivfpq.npz")
+# Lexical index written alongside whichever vector store is configured
+BM25_INDEX_PATH = os.path.join(VECTORSTORE_DIR, "bm25")
+
+
+def open_client(path: str = CHROMA_PATH):
+    return chromadb.PersistentClient(path=path)
+
+
+def read_version(version_path: str = VERSION_PATH) -> str:
+    try:
+        with open(version_path) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return "0"
+
+
+def bump_version(version_path: str = VERSION_PATH) -> str:
+    """Mark the store as changed. Written atomically; readers never see a partial value."""
+    os.makedirs(os.path.dirname(version_path), exist_ok=True)
+    version = str(time.time_ns())
+    tmp_path = f"{version_path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(version)
+    os.replace(tmp_path, version_path)
+    return version
+
+
+class SharedCollection:
+    """Query-side handle that follows ingest commits made by other processes."""
+
+    def __init__(self, path: str = CHROMA_PATH, name: str = CHROMA_COLLECTION_NAME,
+                 version_path: str = VERSION_PATH):
+        self.path = path
+        self.name = name
+        self.version_path = version_path
+        self.version = None
+        self._collection = None
+        self._lock = threading.Lock()
+
+    @property
+    def collection(self):
+        self.refresh()
+        return self._collection
+
+    def refresh(self) -> str:
+        """Reopen the store if ingestion committed since the last access; returns the current version."""
+        version = read_version(self.version_path)
+        if version != self.version:
+            with self._lock:
+                if version != self.version:
+                    self._reopen()
+                    self.version = version
+        return version
+
+    def _reopen(self):
+        if self._collection is not None:
+            # Chroma caches one system per path; drop it to reload segments from disk
+            SharedSystemClient.clear_system_cache()
+        self._collection = open_client(self.path).get_or_create_collection(name=self.name)
+
+
+class SharedFlatIndex(SharedCollection):
+    """SharedCollection over a FlatIndex: a version change loads only the newly appended records."""
+
+    def __init__(self, path: str = FLAT_INDEX_PATH, version_path: str = VERSION_PATH):
+        super().__init__(path, version_path=version_path)
+
+    def _reopen(self):
+        if self._collection is None:
+            self._collection = FlatIndex(self.path)
+        else:
+            self._collection.load()
+
+
+class SharedANNIndex(SharedCollection):
+    """SharedCollection over an IVFPQIndex: a version change encodes the new flat rows."""
+
+    def __init__(self, path: str = FLAT_INDEX_PATH, ann_path: str = ANN_INDEX_PATH,
+                 version_path: str = VERSION_PATH):
+        super().__init__(path, version_path=version_path)
+        self.ann_path = ann_path
+
+    def _reopen(self):
+        if self._collection is None:
+            self._collection = IVFPQIndex(FlatIndex(self.path), self.ann_path)
+        else:
+            self._collection.load()
+
+
+class SharedBM25Index(SharedCollection):
+    """SharedCollection over a BM25Index: a version change loads the new segments."""
+
+    def __init__(self, path: str = BM25_INDEX_PATH, version_path: str = VERSION_PATH):
+        super().__init__(path, version_path=version_path)
+
+    def _reopen(self):
+        if self._collection is None:
+            self._collection = BM25Index(self.path)
+        else:
+            self._collection.load()
+
+
+def open_shared_store(backend: str = RETRIEVAL_BACKEND, name: str = CHROMA_COLLECTION_NAME):
+    """Query-side store for the configured retrieval backend."""
+    if backend == "chroma":
+        return SharedCollection(name=name)
+    if backend == "flat":
+        return SharedFlatIndex()
+    if backend == "ivfpq":
+        return SharedANNIndex()
+    raise ValueError(f"Unknown RETRIEVAL_BACKEND '{backend}'; expected 'chroma', 'flat' or 'ivfpq'")